@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark the merge pipeline on synthetic ledgers, from 1k to 1M rows.
+
+For every size and overlap ratio, ledgers are generated with
+synthetic_ledgers (kept in --data-dir, so later runs reuse them) and
+each stage is timed with merge_profile:
+- read: parse the workbooks (no ledger cache)
+- merge: date conversion, sorting, code index and buckets per source,
+  overlap detection, invoice matching and the k-way merge
+- xlsx_write: the merged workbook, including its k-way merge
+- html_write: the HTML viewer
+
+Each size runs in a fresh process, so the peak RSS figures of one size
+are not inflated by the one before. Prints rows per second and memory
+per stage, and with --report saves every run's profile report as JSON to
+compare against later runs.
+
+Usage: python benchmarks/bench_merge.py [--sizes 1k,10k,100k,1M] [--overlaps 0,0.1,0.5]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from invoice_matching import match_invoices
+from ledger_batch import parse_workbooks
+from merge_excel import (
+    build_partition, find_overlaps, generate_html, merge_sorted_runs, source_label, viewer_rows,
+    write_merged_workbook
+)
+from merge_profile import capture, new_profile, profile_report, stage
+from merge_state import date_keys
+from synthetic_ledgers import generate_ledgers
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'ledger-bench')
+STAGES = ['read', 'merge', 'xlsx_write', 'html_write']
+SIZE_SUFFIXES = {'k': 1000, 'm': 1000000}
+
+
+def parse_size(text):
+    """Row count from 1000, 10k or 1M."""
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def run_benchmark(paths, engine='auto', trace_memory=False, out_dir=None):
+    """Time the merge stages on the given ledgers. Returns the profile."""
+    out_dir = out_dir or tempfile.mkdtemp()
+    profile = new_profile(trace_memory)
+    # The pipeline's progress output is not part of the benchmark
+    with capture(profile), redirect_stdout(io.StringIO()):
+        with stage(profile, 'read') as record:
+            parsed = list(parse_workbooks(paths, engine))
+            record['rows'] = sum(len(data) for _, data, _ in parsed)
+        rows = record['rows']
+
+        with stage(profile, 'merge', rows):
+            partitions = [build_partition(path, source_label(path), workbook) for path, workbook in zip(paths, parsed)]
+            sources = [partition['source'] for partition in partitions]
+            runs = [partition['run'] for partition in partitions]
+            code_index = {}
+            for partition in partitions:
+                for code, entries in partition['codes'].items():
+                    code_index.setdefault(code, []).extend(entries)
+            overlapping = find_overlaps(code_index)
+            _, invoice_groups = match_invoices(
+                pd.concat([run[[4, 5, 6, 7, 8]] for run in runs], ignore_index=True),
+                np.repeat(sources, [len(run) for run in runs])
+            )
+            for _ in merge_sorted_runs(runs, sources):
+                pass
+        del parsed
+
+        with stage(profile, 'xlsx_write', rows):
+            write_merged_workbook(
+                os.path.join(out_dir, 'bench.xlsx'), sources, [partition['company'] for partition in partitions],
+                merge_sorted_runs(runs, sources), overlapping, invoice_groups
+            )
+
+        with stage(profile, 'html_write', rows):
+            merge_order = np.argsort(np.concatenate([date_keys(run) for run in runs]), kind='stable')
+            combined = pd.concat(
+                [run.iloc[:, :10].assign(Source=source) for run, source in zip(runs, sources)],
+                ignore_index=True
+            ).take(merge_order).reset_index(drop=True)
+            generate_html(viewer_rows(combined), sources, overlapping,
+                          html_path=os.path.join(out_dir, 'bench.html'))
+    return profile
+
+
+def print_results(results):
+    """Rows per second and peak RSS growth per stage, one line per run."""
+    print(f"\n{'Rows':>9} {'Overlap':>7}" + ''.join(f" {name + ' r/s':>14}" for name in STAGES)
+          + f" {'Total s':>8} {'Peak MB':>8}")
+    for result in results:
+        stages = {entry['name']: entry for entry in result['stages']}
+        line = f"{result['rows']:>9,} {result['overlap']:>7g}"
+        for name in STAGES:
+            throughput = stages[name]['rows_per_second'] if name in stages else None
+            line += f" {throughput:>14,.0f}" if throughput is not None else f" {'':>14}"
+        peak = result['total']['peak_rss_bytes']
+        line += f" {result['total']['wall_seconds']:>8.2f} {peak / 2 ** 20 if peak else 0:>8.0f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1k,10k,100k', help="comma-separated total rows, e.g. 1k,10k,100k,1M")
+    parser.add_argument('--overlaps', default='0.1', help="comma-separated shares of shared Налог codes")
+    parser.add_argument('--sources', type=int, default=2, help="ledgers per merge")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', default='auto', help="Excel reader engine")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help="where generated ledgers are kept")
+    parser.add_argument('--trace-memory', action='store_true', help="also record tracemalloc peaks (slower)")
+    parser.add_argument('--report', help="save the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for size in [parse_size(size) for size in args.sizes.split(',')]:
+        for overlap in [float(overlap) for overlap in args.overlaps.split(',')]:
+            print(f"{size:,} rows, {args.sources} sources, overlap {overlap:g}")
+            paths = generate_ledgers(args.data_dir, size, args.sources, overlap, args.seed)
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                profile = executor.submit(run_benchmark, paths, args.engine, args.trace_memory).result()
+            result = profile_report(profile, rows=size, sources=args.sources, overlap=overlap, seed=args.seed,
+                                    engine=args.engine)
+            results.append(result)
+            for entry in result['stages']:
+                print(f"  {entry['name']:<12} {entry['wall_seconds']:8.3f} s {entry['rows_per_second'] or 0:12,.0f} rows/s")
+
+    print_results(results)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+        print(f"Report saved to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
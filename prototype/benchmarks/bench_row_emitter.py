@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark the row conversion and writing of the merged sheet.
+Compares the old iterrows() cell loop with the vectorized row emitter
+(output_rows) and the write-only writer, in rows per second.
+
+Usage: python benchmarks/bench_row_emitter.py [--rows 50000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Border, Side, PatternFill
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from merge_excel import output_rows, merge_sorted_runs, write_merged_workbook
+
+
+def make_run(rows, seed):
+    """Date-sorted ledger rows in the merged column layout (0-9)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.to_datetime('2025-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 365, rows)), unit='D')
+    amounts = rng.integers(100, 100000, rows)
+    is_invoice = rng.random(rows) < 0.5
+    run = pd.DataFrame({
+        0: [f"10-{i % 10000:04d}" for i in range(rows)],
+        1: dates,
+        2: 0,
+        3: dates.month,
+        4: [f"Фактура {i}/2025" if inv else f"Извод {i}" for i, inv in enumerate(is_invoice)],
+        5: [f"{i}/2025" for i in range(rows)],
+        6: None,
+        7: np.where(is_invoice, 0, amounts),
+        8: np.where(is_invoice, amounts, 0),
+        9: np.nan,
+    }).astype(object)
+    run[1] = pd.to_datetime(run[1])
+    return run
+
+
+def legacy_rows(combined):
+    """The old conversion: iterrows() with a per-row date check."""
+    for idx, row in combined.iterrows():
+        values = []
+        for col in range(10):
+            value = row.iloc[col]
+            if col == 1 and pd.notna(value):
+                if isinstance(value, pd.Timestamp):
+                    value = value.strftime('%Y-%m-%d')
+            values.append(value)
+        values.append(row['Source'])
+        yield values
+
+
+def legacy_write(combined, path):
+    """The old writer: in-memory workbook, one ws.cell() per value."""
+    wb = Workbook()
+    ws = wb.active
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'),
+                         top=Side(style='thin'), bottom=Side(style='thin'))
+    fills = {source: PatternFill(start_color=color, end_color=color, fill_type="solid")
+             for source, color in zip(['a', 'b'], ["E6F3FF", "FFF3E6"])}
+    row_num = 5
+    for values in legacy_rows(combined):
+        fill = fills[values[-1]]
+        for col, value in enumerate(values, 1):
+            cell = ws.cell(row=row_num, column=col, value=value)
+            cell.border = thin_border
+            cell.fill = fill
+        row_num += 1
+    wb.save(path)
+
+
+def timed(label, rows, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<40} {elapsed:8.2f} s {rows / elapsed:12,.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50000, help="rows per source (two sources)")
+    args = parser.parse_args()
+
+    runs = [make_run(args.rows, 1), make_run(args.rows, 2)]
+    sources = ['a', 'b']
+    combined = pd.concat([run.assign(Source=source) for run, source in zip(runs, sources)], ignore_index=True)
+    total = len(combined)
+    out = os.path.join(tempfile.mkdtemp(), 'bench.xlsx')
+
+    print(f"Row conversion ({total:,} rows)")
+    timed("before: iterrows + per-row date check", total, lambda: sum(1 for _ in legacy_rows(combined)))
+    timed("after: output_rows (vectorized)", total,
+          lambda: sum(1 for run, source in zip(runs, sources) for _ in output_rows(run, source)))
+
+    print(f"Merge + write ({total:,} rows)")
+    timed("before: iterrows + ws.cell per value", total, lambda: legacy_write(combined, out))
+    timed("after: heap merge + write-only sheet", total,
+          lambda: write_merged_workbook(out, sources, [1, 2], merge_sorted_runs(runs, sources), set()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic account cards (Аналитичка картица по конто, 2200).
+
+Each workbook has the layout of the accounting software's export: the
+account and company title rows, a blank row, the header row (Налог,
+Дата, Вал., м.ддв, Опис, Затворање, Забелешка, Долгува, Побарува, Един)
+and one row per entry in date order, starting with the opening balance.
+Entries are invoices (Побарува, "Фактура 00013-25 M.01/25" with the
+invoice number in Затворање) and bank statement payments (Долгува,
+"Извод бр.13" naming a paid invoice in Затворање).
+
+overlap is the share of entries whose Налог code comes from a pool that
+all sources draw from, so roughly that share of codes overlap between
+sources; the other codes are unique to their source. The same arguments
+and seed always give the same workbooks.
+
+Usage: python benchmarks/synthetic_ledgers.py --rows 100000 --sources 2 --overlap 0.1 -d out
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+ACCOUNT = ('2200', 'Обврски спрема добавувачи врз основа на набавка на добра (производи) и услуги во земјата')
+HEADER = ["Налог", "Дата", "Вал.", "м.ддв", "Опис", "Затворање", "Забелешка", "Долгува", "Побарува", "Един"]
+YEAR = 2025
+
+# Налог codes are NN-NNNN: shared codes use prefixes 10-49, the codes of
+# source i prefix 50 + i
+SHARED_PREFIX = 10
+SOURCE_PREFIX = 50
+MAX_SOURCES = 49
+
+INVOICE_SHARE = 0.5
+FULL_PAYMENT_SHARE = 0.7
+
+
+def ledger_codes(rng, rows, source, overlap):
+    """Налог codes of a source's entries; a share of overlap from the shared pool."""
+    shared = rng.random(rows) < overlap
+    # Codes repeat within a ledger, about ten entries per code
+    numbers = rng.integers(0, max(rows // 10, 1), rows)
+    prefixes = np.where(shared, SHARED_PREFIX + numbers // 10000 % (SOURCE_PREFIX - SHARED_PREFIX),
+                        SOURCE_PREFIX + source)
+    return [f"{prefix:02d}-{number % 10000:04d}" for prefix, number in zip(prefixes, numbers)]
+
+
+def generate_ledger(rows, source=0, overlap=0.1, seed=0):
+    """
+    Data rows of one synthetic ledger as a DataFrame with the header
+    columns, in date order; the first row is the opening balance.
+    """
+    if not 0 <= source < MAX_SOURCES:
+        raise ValueError(f"source must be between 0 and {MAX_SOURCES - 1}")
+    rng = np.random.default_rng([seed, source])
+    days = np.sort(rng.integers(0, 365, rows))
+    dates = pd.Timestamp(YEAR, 1, 1) + pd.to_timedelta(days, unit='D')
+    months = dates.month.to_numpy()
+    amounts = rng.integers(100, 200000, rows)
+    is_invoice = rng.random(rows) < INVOICE_SHARE
+    invoice_numbers = np.arange(1, rows + 1)
+
+    # Payments settle a random earlier invoice of the same ledger where
+    # there is one, most of them in full
+    invoices = np.flatnonzero(is_invoice)
+    earlier = np.searchsorted(invoices, np.arange(rows))
+    choice = (rng.random(rows) * earlier).astype(np.int64)
+    paid = np.full(rows, -1)
+    paid[earlier > 0] = invoices[choice[earlier > 0]]
+    in_full = (paid >= 0) & ~is_invoice & (rng.random(rows) < FULL_PAYMENT_SHARE)
+    amounts[in_full] = amounts[paid[in_full]]
+
+    description = []
+    closing = []
+    note = []
+    for i in range(rows):
+        if is_invoice[i]:
+            description.append(f"Фактура {invoice_numbers[i]:05d}-25 M.{months[i]:02d}/25")
+            closing.append(f"{invoice_numbers[i]}/{YEAR}")
+            note.append(f"T {invoice_numbers[i] % 1000}")
+        else:
+            description.append(f"Извод бр.{days[i] + 1}")
+            closing.append(f"{invoice_numbers[paid[i]]}/{YEAR}" if paid[i] >= 0 else '')
+            note.append('')
+
+    data = pd.DataFrame({
+        "Налог": ledger_codes(rng, rows, source, overlap),
+        "Дата": dates.to_pydatetime(),
+        "Вал.": 0,
+        "м.ддв": months,
+        "Опис": description,
+        "Затворање": closing,
+        "Забелешка": note,
+        "Долгува": np.where(is_invoice, 0, amounts),
+        "Побарува": np.where(is_invoice, amounts, 0),
+        "Един": '',
+    }, columns=HEADER)
+    if rows:
+        data.iloc[0, [0, 4]] = ["00-0001", "Почетно салдо"]
+    return data
+
+
+def write_ledger(path, data, company):
+    """Write ledger rows as an account card export; company is (code, name)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet1')
+    ws.append(list(ACCOUNT))
+    ws.append(list(company))
+    ws.append([])
+    ws.append(HEADER)
+    for row in data.itertuples(index=False, name=None):
+        ws.append([value.item() if isinstance(value, np.generic) else value for value in row])
+    wb.save(path)
+
+
+def ledger_path(data_dir, rows, source, overlap, seed):
+    """File name of a generated ledger; it encodes every generator argument."""
+    return os.path.join(data_dir, f"ledger_{rows}_s{source}_o{overlap:g}_seed{seed}.xlsx")
+
+
+def generate_ledgers(data_dir, total_rows, sources=2, overlap=0.1, seed=0):
+    """
+    Synthetic ledgers with total_rows entries split over sources, written
+    to data_dir unless already there. Returns their paths.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    paths = []
+    for source in range(sources):
+        rows = total_rows // sources + (source < total_rows % sources)
+        path = ledger_path(data_dir, rows, source, overlap, seed)
+        if not os.path.exists(path):
+            partial = path + '.tmp'
+            write_ledger(partial, generate_ledger(rows, source, overlap, seed), (source + 1, f"ДОБАВУВАЧ {source + 1} ДОО"))
+            os.replace(partial, path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help="entries over all sources")
+    parser.add_argument('--sources', type=int, default=2, help="ledgers to generate")
+    parser.add_argument('--overlap', type=float, default=0.1, help="share of Налог codes drawn from the shared pool")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-d', '--data-dir', default='.', help="directory to write the ledgers to")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for path in generate_ledgers(args.data_dir, args.rows, args.sources, args.overlap, args.seed):
+        print(path)
+    print(f"Generated in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Out-of-core merge for ledgers larger than memory.
+
+Workbooks are streamed with openpyxl in read-only mode, chunk_rows data
+rows at a time. Each chunk is mapped to the merged columns (as
+ledger_layout.parse_ledger does for a whole sheet), sorted by date and
+spilled to a temporary Arrow IPC file: a sorted run. The final pass is an
+external merge sort: every run is read back one record batch at a time
+and the runs are merged on (Дата, source, sheet row), which is the order
+of the stable in-memory sort. Memory is bounded by one chunk, or one
+batch per run, whatever the size of the ledgers.
+
+Needs pyarrow.
+"""
+
+import heapq
+from itertools import chain, islice, repeat
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from ledger_cache import HAS_PYARROW, table_to_frame, write_frame
+from ledger_layout import LAYOUT_SCAN_ROWS, LEDGER_COLUMNS, detect_layout
+from merge_state import date_keys
+
+if HAS_PYARROW:
+    import pyarrow as pa
+
+DEFAULT_CHUNK_ROWS = 100000
+
+# Rows per record batch of a spilled run, read back one at a time
+RUN_BATCH_ROWS = 10000
+
+
+def sheet_rows(filepath):
+    """
+    Stream the rows of the first sheet as lists; empty strings are None,
+    as in ledger_reader.read_with_openpyxl.
+    """
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield [None if value == '' else value for value in row]
+    finally:
+        wb.close()
+
+
+def read_ledger_chunks(filepath, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Stream the data rows of a ledger. Returns (layout, chunks): the layout
+    found in the first rows (see ledger_layout.detect_layout) and a
+    generator of frames of up to chunk_rows rows with the merged columns
+    0-9, indexed by 0-based sheet row. Blank rows are dropped.
+    """
+    rows = sheet_rows(filepath)
+    head = list(islice(rows, LAYOUT_SCAN_ROWS))
+    layout = detect_layout(pd.DataFrame(head))
+    columns = [layout['columns'][column] for column in LEDGER_COLUMNS]
+    first = layout['header_row'] + 1
+
+    def chunks():
+        body = chain(head[first:], rows)
+        start = first
+        while True:
+            block = list(islice(body, chunk_rows))
+            if not block:
+                return
+            data = pd.DataFrame(
+                {position: [row[column] if column is not None and column < len(row) else None for row in block]
+                 for position, column in enumerate(columns)},
+                index=range(start, start + len(block)), dtype=object
+            ).fillna(np.nan)
+            start += len(block)
+            yield data[data.notna().any(axis=1)]
+
+    return layout, chunks()
+
+
+def spill_run(path, run):
+    """Write a date-sorted run to an Arrow IPC file, with its sheet rows."""
+    write_frame(path, run.assign(row=run.index).reset_index(drop=True), RUN_BATCH_ROWS)
+
+
+def read_run(path):
+    """Frames of a spilled run, one record batch at a time, indexed by sheet row."""
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = pa.Table.from_batches([reader.get_batch(i)], reader.schema)
+            yield table_to_frame(batch).set_index('row').rename_axis(None)
+
+
+def merge_runs(runs, to_rows):
+    """
+    External merge of spilled runs. runs is a list of (source_index, path)
+    with the runs of a source in sheet order; to_rows(frame, source_index)
+    turns a batch of a run into row tuples (e.g. merge_excel.output_rows).
+    Yields (source_index, sheet_row, row) ordered by date, source and sheet
+    row; rows without a date come first.
+    """
+    def stream(source_index, path):
+        for frame in read_run(path):
+            yield from zip(date_keys(frame), repeat(source_index), frame.index, to_rows(frame, source_index))
+
+    for _, source_index, sheet_row, row in heapq.merge(*(stream(source_index, path) for source_index, path in runs)):
+        yield source_index, sheet_row, row
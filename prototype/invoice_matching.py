@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Match invoices (Побарува) to payments (Долгува) by invoice number.
+
+Invoice numbers are extracted and normalized as described in
+docs/invoice-numbers/README.md:
+- 145/2025, 211/25 -> 145/2025, 211/2025
+- F.145/2025, Фактура 101/2025 -> 145/2025, 101/2025
+- Фактура 121/2025 T 187 -> 121/2025 T 187
+- 509231-RK, F.536167-PK PR.79 -> 509231 RK, 536167 PK
+
+Suffix letters are uppercased and Cyrillic ones are transliterated by
+sound (536167-РК -> 536167 RK, 526851-ПК -> 526851 PK), because exports
+mix both spellings for the same invoice. By shape Р would read as P and
+merge the RK invoice codes with the PK payment codes.
+
+Затворање is tried first, then Опис (skipped for Извод bank entries),
+then Забелешка. Extraction runs as vectorized str.extract passes and
+matching is a single groupby, so large ledgers match in linear time.
+Totals and balances are exact int64 cents (see money).
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from money import to_cents
+
+PAID = 'paid'
+PARTIAL = 'partial'
+OUTSTANDING = 'outstanding'
+OVERPAID = 'overpaid'
+
+STATUS_LABELS = {
+    PAID: "Платено",
+    PARTIAL: "Делумно",
+    OUTSTANDING: "Неподмирено",
+    OVERPAID: "Преплатено",
+}
+
+# Invoice number at a word start, or right after an F. prefix. Other
+# dotted prefixes (M.01/25 is a month) are not invoices.
+INVOICE_PATTERN = re.compile(
+    r'(?:(?<=[Ff]\.)|(?<![\w./]))'
+    r'(?:'
+    r'(?P<number>\d+)/(?P<year>\d{4}|\d{2})(?!\d)(?:\s+[TТ]\s*(?P<t>\d+))?'
+    r'|'
+    r'(?P<code>\d+)\s*-\s*(?P<suffix>[^\W\d_]{2})(?!\w)'
+    r')'
+)
+
+# Macedonian Cyrillic capitals in Latin, by sound
+SUFFIX_TRANSLITERATION = str.maketrans({
+    'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Ѓ': 'GJ', 'Е': 'E', 'Ж': 'ZH',
+    'З': 'Z', 'Ѕ': 'DZ', 'И': 'I', 'Ј': 'J', 'К': 'K', 'Л': 'L', 'Љ': 'LJ', 'М': 'M',
+    'Н': 'N', 'Њ': 'NJ', 'О': 'O', 'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'Ќ': 'KJ',
+    'У': 'U', 'Ф': 'F', 'Х': 'H', 'Ц': 'C', 'Ч': 'CH', 'Џ': 'DZH', 'Ш': 'SH',
+})
+
+# Bank statement entries name the statement in Опис, not the invoice
+BANK_STATEMENT_PATTERN = re.compile(r'извод', re.IGNORECASE)
+
+
+def extract_invoice_numbers(text):
+    """
+    Normalized invoice number found in each value of a Series, or NaN.
+    """
+    text = text.astype('string')
+    parts = text.str.extract(INVOICE_PATTERN)
+
+    year = parts['year'].where(parts['year'].str.len() == 4, '20' + parts['year'])
+    number_year = parts['number'] + '/' + year
+    number_year = number_year.where(parts['t'].isna(), number_year + ' T ' + parts['t'])
+    code_suffix = parts['code'] + ' ' + parts['suffix'].str.upper().str.translate(SUFFIX_TRANSLITERATION)
+
+    invoice = number_year.fillna(code_suffix)
+    return invoice.astype(object).where(invoice.notna(), np.nan)
+
+
+def find_invoice_numbers(data):
+    """
+    Invoice number per row of a ledger with the merged columns (4 Опис,
+    5 Затворање, 6 Забелешка), using the source field priority. Lower
+    priority fields are only scanned for rows still without a number.
+    """
+    invoice = extract_invoice_numbers(data[5])
+
+    missing = invoice.isna()
+    description = data[4][missing].astype('string')
+    is_bank_statement = description.str.contains(BANK_STATEMENT_PATTERN, na=False).to_numpy(dtype=bool)
+    invoice[missing] = extract_invoice_numbers(description.mask(is_bank_statement))
+
+    missing = invoice.isna()
+    invoice[missing] = extract_invoice_numbers(data[6][missing])
+    return invoice
+
+
+def match_status(total_credit, total_debit):
+    """
+    Match status per group from credit (invoiced) and debit (paid) totals
+    in cents; totals are exact, so only a zero balance is settled.
+    """
+    balance = total_credit - total_debit
+    return np.select(
+        [balance == 0, balance < 0, total_debit > 0],
+        [PAID, OVERPAID, PARTIAL],
+        default=OUTSTANDING,
+    )
+
+
+def join_sources(invoice, source):
+    """
+    Comma-separated distinct sources per invoice number, in order of
+    first appearance. Returns a Series indexed by invoice number.
+    """
+    pairs = pd.DataFrame({'invoice': invoice, 'source': source}).drop_duplicates()
+    if pairs.empty:
+        # Ledgers without invoice numbers, like balance sheets
+        return pd.Series(dtype=object)
+    pairs = pairs.sort_values('invoice', kind='stable')
+    invoices = pairs['invoice'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, invoices[1:] != invoices[:-1]])
+    chunks = np.split(pairs['source'].to_numpy(), starts[1:])
+    return pd.Series([', '.join(chunk) for chunk in chunks], index=invoices[starts])
+
+
+def invoice_totals(invoice, data, sources=None):
+    """
+    Credit and debit counts and totals in cents per invoice number of
+    some ledger rows, with invoice the rows' invoice numbers (find_invoice_numbers).
+    Returns (totals, pairs): totals is indexed by invoice number, pairs
+    are the distinct (invoice, source) pairs when sources are given.
+    Totals of the parts of a ledger combine with settle_invoices.
+    """
+    credit = to_cents(data[8])
+    debit = to_cents(data[7])
+
+    matched = pd.DataFrame({
+        'invoice': invoice,
+        'credit': credit,
+        'debit': debit,
+        'is_credit': credit > 0,
+        'is_debit': debit > 0,
+    })
+    if sources is not None:
+        matched['source'] = np.asarray(sources)
+    matched = matched[matched['invoice'].notna()]
+
+    totals = matched.groupby('invoice', sort=False)[['is_credit', 'is_debit', 'credit', 'debit']].sum()
+    pairs = matched[['invoice', 'source']].drop_duplicates() if sources is not None else None
+    return totals, pairs
+
+
+def settle_invoices(parts):
+    """
+    One row per invoice number from invoice_totals parts, in order of
+    invoice number: credit and debit counts and totals, balance, status
+    and, when the parts have sources, the sources.
+    """
+    totals = pd.concat([part_totals for part_totals, _ in parts])
+    grouped = totals.groupby(level=0, sort=True).sum()
+    groups = pd.DataFrame({
+        'credit_count': grouped['is_credit'],
+        'debit_count': grouped['is_debit'],
+        'total_credit': grouped['credit'],
+        'total_debit': grouped['debit'],
+    })
+    groups['balance'] = groups['total_credit'] - groups['total_debit']
+    groups['status'] = match_status(groups['total_credit'].to_numpy(), groups['total_debit'].to_numpy())
+    if all(pairs is not None for _, pairs in parts):
+        pairs = pd.concat([pairs for _, pairs in parts])
+        groups['sources'] = join_sources(pairs['invoice'].to_numpy(), pairs['source'].to_numpy())
+
+    return groups.rename_axis('invoice').reset_index().rename(columns={'invoice': 'invoice_number'})
+
+
+def match_invoices(data, sources=None):
+    """
+    Group ledger rows by invoice number and settle invoices against payments.
+
+    data has the merged columns (see ledger_layout.LEDGER_COLUMNS); sources,
+    if given, is the source label of each row. Returns (rows, groups):
+    rows is a Series with the invoice number of every row (NaN when none
+    was found), groups has one row per invoice number with credit and
+    debit counts and totals and balance in cents, status and sources.
+    """
+    invoice = find_invoice_numbers(data)
+    return invoice, settle_invoices([invoice_totals(invoice, data, sources)])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Parse many ledger workbooks in parallel.
+
+Workbooks are read and their layout detected in a ProcessPoolExecutor.
+Each worker sends its data rows back as an Arrow IPC buffer (see
+ledger_cache.frame_to_table), one contiguous block per workbook, rather
+than a pickled DataFrame with one Python object per cell. Workbooks are
+handed to the workers chunk_size at a time and results come back in
+input order.
+
+With one worker, or without pyarrow, workbooks are parsed in this
+process.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ledger_cache import DEFAULT_MAX_BYTES, HAS_PYARROW, frame_to_table, table_to_frame
+from ledger_layout import parse_ledger
+from ledger_reader import read_excel_with_structure
+
+if HAS_PYARROW:
+    import pyarrow as pa
+
+
+def parse_workbook(path, engine='auto', cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Read a workbook and split it into layout and data rows (see
+    ledger_layout.parse_ledger). Returns (layout, data, attrs) with the
+    reader's engine and parse time in attrs.
+    """
+    df, _ = read_excel_with_structure(path, None, engine, cache_dir, cache_max_bytes)
+    layout, data = parse_ledger(df)
+    return layout, data, dict(df.attrs)
+
+
+def parse_to_buffer(path, engine, cache_dir, cache_max_bytes):
+    """Worker: parse_workbook with the data rows as an Arrow IPC buffer."""
+    layout, data, attrs = parse_workbook(path, engine, cache_dir, cache_max_bytes)
+    # The index (sheet row) travels as a column
+    table = frame_to_table(data.assign(row=data.index))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return layout, sink.getvalue(), attrs
+
+
+def buffer_to_data(buffer):
+    """Data rows from a parse_to_buffer buffer, indexed by sheet row."""
+    data = table_to_frame(pa.ipc.open_stream(buffer).read_all())
+    return data.set_index('row').rename_axis(None)
+
+
+def parse_workbooks(paths, engine='auto', cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+                    workers=1, chunk_size=1):
+    """
+    Parse workbooks with up to workers processes (0 for one per CPU).
+    Yields (layout, data, attrs) per path, in the order of paths.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count()
+    if workers <= 1 or len(paths) <= 1 or not HAS_PYARROW:
+        for path in paths:
+            yield parse_workbook(path, engine, cache_dir, cache_max_bytes)
+        return
+
+    count = len(paths)
+    with ProcessPoolExecutor(max_workers=min(workers, count)) as executor:
+        results = executor.map(
+            parse_to_buffer, paths, [engine] * count, [cache_dir] * count, [cache_max_bytes] * count,
+            chunksize=chunk_size
+        )
+        for layout, buffer, attrs in results:
+            yield layout, buffer_to_data(buffer), attrs
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of parsed ledger sheets.
+
+Sheets are stored as Arrow IPC files named by the SHA-256 of the workbook
+and PARSER_VERSION, and are memory-mapped when loaded, so a workbook that
+has not changed is never parsed twice. The least recently used entries
+are evicted once the cache grows past its size limit.
+
+Needs pyarrow; without it the cache is disabled and every read parses
+the workbook.
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Bump when the reader output changes, so old entries are not reused
+PARSER_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'accounting-ledgers')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Mixed-type columns are stored as text plus a type tag per cell
+TAG_STR, TAG_INT, TAG_FLOAT, TAG_DATE, TAG_BOOL = 's', 'i', 'f', 'd', 'b'
+
+
+def file_sha256(filepath):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(filepath):
+    """Cache key of a workbook: content hash and parser version."""
+    return f"{file_sha256(filepath)}-v{PARSER_VERSION}"
+
+
+def encode_mixed(values):
+    """Split an object column into (text, tags) string arrays."""
+    text = []
+    tags = []
+    for value in values:
+        if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+            text.append(None)
+            tags.append(None)
+        elif isinstance(value, str):
+            text.append(value)
+            tags.append(TAG_STR)
+        elif isinstance(value, (bool, np.bool_)):
+            text.append(str(bool(value)))
+            tags.append(TAG_BOOL)
+        elif isinstance(value, (int, np.integer)):
+            text.append(str(int(value)))
+            tags.append(TAG_INT)
+        elif isinstance(value, (float, np.floating)):
+            text.append(repr(float(value)))
+            tags.append(TAG_FLOAT)
+        elif isinstance(value, datetime):
+            text.append(value.isoformat())
+            tags.append(TAG_DATE)
+        else:
+            text.append(str(value))
+            tags.append(TAG_STR)
+    return pa.array(text, pa.string()), pa.array(tags, pa.string())
+
+
+def decode_mixed(text, tags):
+    """Rebuild an object column from the arrays written by encode_mixed."""
+    values = np.full(len(text), np.nan, dtype=object)
+
+    for tag, convert in (
+        (TAG_STR, lambda v: v),
+        (TAG_INT, lambda v: v.astype(np.int64).tolist()),
+        (TAG_FLOAT, lambda v: v.astype(np.float64).tolist()),
+        # isoformat() drops the fraction of whole seconds, so one column
+        # can mix 2025-01-14T00:00:00 and 2025-01-14T10:15:30.250000
+        (TAG_DATE, lambda v: list(pd.to_datetime(v, format='ISO8601').to_numpy(dtype=object))),
+        (TAG_BOOL, lambda v: (v == 'True').tolist()),
+    ):
+        # Masks are computed in Arrow, and only the matching text is
+        # converted to Python strings
+        mask = pc.equal(tags, tag).fill_null(False)
+        if pc.any(mask).as_py():
+            values[mask.to_numpy(zero_copy_only=False)] = convert(text.filter(mask).to_numpy(zero_copy_only=False))
+    return values
+
+
+def frame_to_table(df):
+    """Arrow table for a raw sheet. Object columns are tag-encoded."""
+    arrays = []
+    names = []
+    dtypes = {}
+    for col in df.columns:
+        series = df[col]
+        dtypes[str(col)] = str(series.dtype)
+        if series.dtype == object:
+            text, tags = encode_mixed(series.to_numpy())
+            arrays += [text, tags]
+            names += [f"{col}", f"{col}:tag"]
+        else:
+            arrays.append(pa.array(series, from_pandas=True))
+            names.append(f"{col}")
+    table = pa.Table.from_arrays(arrays, names=names)
+    return table.replace_schema_metadata({'dtypes': json.dumps(dtypes)})
+
+
+def table_to_frame(table):
+    """Inverse of frame_to_table. Numeric column names come back as ints."""
+    dtypes = json.loads(table.schema.metadata[b'dtypes'])
+    columns = {}
+    for name, dtype in dtypes.items():
+        key = int(name) if name.isdigit() else name
+        if dtype == 'object':
+            columns[key] = decode_mixed(table.column(name), table.column(f"{name}:tag"))
+        else:
+            columns[key] = table.column(name).to_pandas().astype(dtype)
+    return pd.DataFrame(columns)
+
+
+def write_frame(path, df, batch_rows=None):
+    """
+    Write a frame as an Arrow IPC file (see frame_to_table), in record
+    batches of at most batch_rows rows.
+    """
+    table = frame_to_table(df)
+    # Write under a temporary name so concurrent readers never see half a file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=batch_rows)
+    os.replace(tmp_path, path)
+
+
+def read_frame(path):
+    """Memory-map a frame written by write_frame."""
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table_to_frame(table)
+
+
+def load_cached_sheet(cache_dir, key):
+    """Memory-map a cached sheet, or return None on a cache miss."""
+    path = os.path.join(cache_dir, f"{key}.arrow")
+    if not os.path.exists(path):
+        return None
+    df = read_frame(path)
+    # Mark as recently used for LRU eviction
+    os.utime(path)
+    return df
+
+
+def store_cached_sheet(cache_dir, key, df, max_bytes=DEFAULT_MAX_BYTES):
+    """Write a sheet to the cache and evict old entries over max_bytes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.arrow")
+    write_frame(path, df)
+    evict_cache(cache_dir, max_bytes, keep=os.path.basename(path))
+
+
+def evict_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES, keep=None):
+    """
+    Delete least recently used entries until the cache fits in max_bytes.
+    The entry named keep is never deleted.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.arrow') and name != keep:
+            # Another process may evict the same entries concurrently
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    if keep and os.path.exists(os.path.join(cache_dir, keep)):
+        total += os.path.getsize(os.path.join(cache_dir, keep))
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def clear_cache(cache_dir=DEFAULT_CACHE_DIR):
+    """Delete every cached sheet. Returns the number of entries removed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name.endswith('.arrow') or name.endswith('.tmp'):
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
+
+
+def read_cached(filepath, read, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Return the sheet for filepath from the cache, or call read(filepath)
+    and store the result. Cache hits have df.attrs['engine'] == 'cache'
+    and the load time in df.attrs['parse_seconds'].
+    """
+    if not HAS_PYARROW:
+        return read(filepath)
+
+    start = time.perf_counter()
+    key = cache_key(filepath)
+    df = load_cached_sheet(cache_dir, key)
+    if df is not None:
+        df.attrs['engine'] = 'cache'
+        df.attrs['parse_seconds'] = time.perf_counter() - start
+        return df
+
+    df = read(filepath)
+    store_cached_sheet(cache_dir, key, df, max_bytes)
+    return df
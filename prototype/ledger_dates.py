@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Ledger dates: Дата cells as datetime64.
+
+Exports hold dates in several forms, often mixed in one column:
+- date cells, read as datetimes
+- Excel serial numbers (days since 1899-12-30, with the time of day as
+  the fraction), when a cell lost its date format
+- text in the Macedonian format, day first: 05.03.2025, 5.3.2025,
+  05.03.25, 05.03.2025 14:30, with an optional trailing dot or г.; also
+  05/03/2025 and ISO 2025-03-05
+pd.to_datetime on such a column falls back to guessing per element: it
+reads serial numbers as nanoseconds since 1970 and 05.03.2025 as May 3.
+parse_dates instead splits the cells by kind and converts each kind in
+one vectorized pass; text is factorized so each distinct text is parsed
+once, with the first of TEXT_FORMATS that matches it. Cells that are not
+dates become NaT (see count_unparsed).
+"""
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+DATE_DTYPE = 'datetime64[us]'
+
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+# Serial numbers of 1900-03-01 (Excel counts a 29 February 1900 before
+# it) to 9999-12-31
+MIN_SERIAL = 61
+MAX_SERIAL = 2958466
+SECONDS_PER_DAY = 86400
+
+# pandas.api.types.infer_dtype kinds of columns of dates only
+DATE_KINDS = {'datetime', 'datetime64', 'date'}
+
+# Text formats, each with the pattern of the text it reads
+TEXT_FORMATS = [
+    (r'\d{1,2}\.\d{1,2}\.\d{4}', '%d.%m.%Y'),
+    (r'\d{1,2}\.\d{1,2}\.\d{4} \d{1,2}:\d{2}', '%d.%m.%Y %H:%M'),
+    (r'\d{1,2}\.\d{1,2}\.\d{4} \d{1,2}:\d{2}:\d{2}', '%d.%m.%Y %H:%M:%S'),
+    (r'\d{1,2}\.\d{1,2}\.\d{2}', '%d.%m.%y'),
+    (r'\d{1,2}/\d{1,2}/\d{4}', '%d/%m/%Y'),
+    (r'\d{4}-\d{2}-\d{2}', '%Y-%m-%d'),
+    (r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', '%Y-%m-%d %H:%M:%S'),
+]
+
+# Spaces around the date and a trailing dot or year mark (г.)
+NOISE = r'^\s+|\s*(?:г\.?|\.)?\s*$'
+
+
+def cell_kind(cell_type):
+    """'date', 'number', 'text' or 'other' for the type of a cell."""
+    if issubclass(cell_type, str):
+        return 'text'
+    if issubclass(cell_type, (datetime.date, np.datetime64)):
+        return 'date'
+    if issubclass(cell_type, (int, float, np.number)) and not issubclass(cell_type, (bool, np.bool_)):
+        return 'number'
+    return 'other'
+
+
+def parse_date_text(text):
+    """Dates of a Series of str, as datetime64 with NaT for text that is not a date."""
+    text = text.str.replace(NOISE, '', regex=True).str.replace('T', ' ', regex=False)
+    dates = pd.Series(pd.NaT, index=text.index, dtype=DATE_DTYPE)
+    left = pd.Series(True, index=text.index)
+    for pattern, date_format in TEXT_FORMATS:
+        match = left & text.str.fullmatch(pattern).fillna(False).astype(bool)
+        if match.any():
+            dates[match] = pd.to_datetime(text[match], format=date_format, errors='coerce')
+            left &= ~match
+    return dates
+
+
+def parse_serials(numbers):
+    """Dates of Excel serial numbers (float Series), NaT outside MIN_SERIAL to MAX_SERIAL."""
+    numbers = numbers.where((numbers >= MIN_SERIAL) & (numbers < MAX_SERIAL))
+    seconds = (numbers * SECONDS_PER_DAY).round()
+    return (EXCEL_EPOCH + pd.to_timedelta(seconds, unit='s')).astype(DATE_DTYPE)
+
+
+def parse_dates(values):
+    """
+    Dates of a Series of cells (datetimes, serial numbers, date text or
+    empty cells), as datetime64 with NaT for empty cells and cells that
+    are not dates.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_dtype(values.dtype):
+        return values.astype(DATE_DTYPE)
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind == 'empty':
+        return pd.Series(pd.NaT, index=values.index, dtype=DATE_DTYPE)
+    if kind in DATE_KINDS:
+        return pd.to_datetime(values, errors='coerce').astype(DATE_DTYPE)
+
+    # Mixed kinds: each kind of cell is converted on its own
+    types = values.map(type)
+    kinds = types.map({cell_type: cell_kind(cell_type) for cell_type in types.unique()})
+    dates = pd.Series(pd.NaT, index=values.index, dtype=DATE_DTYPE)
+    is_date = kinds.eq('date')
+    if is_date.any():
+        dates[is_date] = pd.to_datetime(values[is_date], errors='coerce')
+    is_number = kinds.eq('number')
+    if is_number.any():
+        dates[is_number] = parse_serials(values[is_number].astype(np.float64))
+    is_text = kinds.eq('text')
+    if is_text.any():
+        # Dates repeat, so each distinct text is parsed once
+        codes, uniques = pd.factorize(values[is_text])
+        dates[is_text] = parse_date_text(pd.Series(uniques, dtype=str)).to_numpy()[codes]
+    return dates
+
+
+def count_unparsed(values, dates):
+    """Cells of values that hold something, not blank text, but have no date in dates."""
+    # As objects, so a column that is already datetime64 counts too
+    missing = values.to_numpy(dtype=object)[dates.isna().to_numpy() & values.notna().to_numpy()]
+    return int(np.count_nonzero([not (isinstance(cell, str) and not cell.strip()) for cell in missing]))
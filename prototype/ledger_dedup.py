@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Duplicate entries across sources.
+
+The same transaction can be in two exports, e.g. the analytic card of a
+partner and the card of its account, and the merged output then counts
+it twice. Shared Налог codes (see merge_excel.find_overlaps) only hint at
+that: one document has many entries. An entry is identified instead by
+a 64-bit fingerprint of its Налог, Дата, Долгува, Побарува and Опис,
+with Опис lowercased and reduced to its words, so spacing and
+punctuation do not matter.
+
+Within a source, identical entries are separate transactions (two equal
+payments on one day). Across sources, the n-th entry with a fingerprint
+in one source is taken to be the n-th entry with that fingerprint in the
+first source that has it; that source's entry is kept and the others are
+duplicates. All steps are vectorized hashing and hash-based grouping, so
+the time is linear in the number of rows.
+
+Policies for the merge (see merge_excel):
+- report: the duplicates are counted and written to
+  <output>.duplicates.json
+- mark: also notes in each duplicate's Забелешка which entry it repeats
+- drop: also leaves the duplicates out of the merged output, the totals,
+  the invoice matching and the viewer
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from ledger_model import TEXT_DTYPE, to_text
+from merge_state import date_keys
+from money import to_cents
+from search_index import WORD_PATTERN
+
+DEDUP_POLICIES = ['report', 'mark', 'drop']
+
+NOTE_COLUMN = 6
+
+
+def key_text(values):
+    """Налог codes as text: 2200.0 and '2200' are the same code; empty cells are ''."""
+    if values.dtype == object:
+        values = values.map(lambda value: int(value) if isinstance(value, float) and value.is_integer() else value)
+    return values.astype(TEXT_DTYPE).str.strip().fillna('')
+
+
+def normalize_description(values):
+    """Опис lowercased, as its words separated by single spaces."""
+    # Descriptions repeat, so each distinct one is normalized once
+    codes, uniques = pd.factorize(values.astype(TEXT_DTYPE))
+    words = pd.Series(uniques, dtype=TEXT_DTYPE).str.lower().str.findall(WORD_PATTERN).str.join(' ')
+    return pd.Series(np.append(words.to_numpy(dtype=object), '')[codes], index=values.index, dtype=TEXT_DTYPE)
+
+
+def entry_fingerprints(run):
+    """64-bit fingerprint of each entry of a typed ledger (see ledger_model)."""
+    keys = pd.DataFrame({
+        'nalog': key_text(run[0]).to_numpy(),
+        'day': date_keys(run),
+        'debit': to_cents(run[7]),
+        'credit': to_cents(run[8]),
+        'description': normalize_description(run[4]).to_numpy(),
+    })
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def find_duplicates(runs):
+    """
+    Entries of the typed runs whose fingerprint is in more than one
+    source, as a frame with the source index, position in the run, sheet
+    row (1-based), fingerprint, whether the entry is a duplicate and the
+    source index and sheet row of the entry it repeats (its own for kept
+    entries).
+    """
+    entries = pd.DataFrame({
+        'source': np.repeat(np.arange(len(runs)), [len(run) for run in runs]),
+        'position': np.concatenate([np.arange(len(run)) for run in runs]),
+        'row': np.concatenate([run.index.to_numpy(dtype=np.int64) + 1 for run in runs]),
+        'fingerprint': np.concatenate([entry_fingerprints(run) for run in runs]),
+    })
+    shared = entries.groupby('fingerprint', sort=False)['source'].transform('nunique') > 1
+    entries = entries[shared.to_numpy()].reset_index(drop=True)
+
+    entries['occurrence'] = entries.groupby(['fingerprint', 'source'], sort=False).cumcount()
+    first = entries.groupby(['fingerprint', 'occurrence'], sort=False)['source'].transform('idxmin').to_numpy()
+    entries['first_source'] = entries['source'].to_numpy()[first]
+    entries['first_row'] = entries['row'].to_numpy()[first]
+    entries['duplicate'] = entries['source'] != entries['first_source']
+    return entries.drop(columns='occurrence')
+
+
+def duplicate_masks(entries, runs):
+    """For each run, a boolean array that is True for its duplicate entries."""
+    masks = [np.zeros(len(run), dtype=bool) for run in runs]
+    duplicates = entries[entries['duplicate']]
+    for source, positions in duplicates.groupby('source')['position']:
+        masks[source][positions.to_numpy()] = True
+    return masks
+
+
+def mark_duplicates(run, source, entries, sources):
+    """
+    Copy of the run of sources[source] with a note in the Забелешка of
+    each duplicate naming the entry it repeats.
+    """
+    duplicates = entries[entries['duplicate'] & (entries['source'] == source)]
+    if duplicates.empty:
+        return run
+    positions = duplicates['position'].to_numpy()
+    notes = run[NOTE_COLUMN].to_numpy(dtype=object).copy()
+    for position, first_source, first_row in zip(positions, duplicates['first_source'], duplicates['first_row']):
+        note = f"Дупликат: {sources[first_source]}, ред {first_row}"
+        notes[position] = note if pd.isna(notes[position]) else f"{notes[position]}; {note}"
+    run = run.copy()
+    run[NOTE_COLUMN] = to_text(pd.Series(notes, index=run.index))
+    return run
+
+
+def write_duplicate_index(path, entries, sources):
+    """
+    Save the entries with shared fingerprints as JSON:
+    {fingerprint (hex): [{"source": ..., "row": ..., "duplicate": ...}]}.
+    """
+    groups = {}
+    for entry in entries.sort_values(['fingerprint', 'source', 'row'], kind='stable').itertuples(index=False):
+        groups.setdefault(f"{entry.fingerprint:016x}", []).append(
+            {'source': sources[entry.source], 'row': int(entry.row), 'duplicate': bool(entry.duplicate)}
+        )
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(groups, f, ensure_ascii=False)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Detect the layout of ledger exports and extract their data rows.
+
+The accounting software exports three kinds of sheets (see
+docs/invoice-numbers/README.md):
+- account card (Аналитичка картица по конто): header on row 3
+- company card (Аналитичка картица по фирма): header on row 2, with extra
+  Конто and Име на контото columns
+- balance sheet (Заклучна листа / ЗЛ): header on row 1, one row per account
+
+The document type and header row are found from the column labels in the
+first rows of the sheet. The data rows below the header are mapped to the
+ten columns of the account card, which is the layout of the merged output.
+"""
+
+import pandas as pd
+
+LEDGER_COLUMNS = ["Налог", "Дата", "Вал.", "м.ддв", "Опис", "Затворање", "Забелешка", "Долгува", "Побарува", "Един"]
+
+ACCOUNT_CARD = 'account_card'
+COMPANY_CARD = 'company_card'
+BALANCE_SHEET = 'balance_sheet'
+
+# Rows scanned for the header row
+LAYOUT_SCAN_ROWS = 20
+
+# Labels that identify the header row of each document type, checked in
+# order (a company card header also has every account card label)
+LAYOUT_SIGNATURES = [
+    (COMPANY_CARD, {'налог', 'дата', 'конто', 'опис', 'долгува', 'побарува'}),
+    (ACCOUNT_CARD, {'налог', 'дата', 'опис', 'долгува', 'побарува'}),
+    (BALANCE_SHEET, {'име на конто', 'конто', 'долгува', 'побарува', 'салдо'}),
+]
+
+# Header labels that feed each merged column, in order of preference
+CARD_COLUMNS = {column: [column] for column in LEDGER_COLUMNS}
+CARD_COLUMNS['Затворање'] = ['Затворање', 'Заворање']
+
+BALANCE_SHEET_COLUMNS = {
+    'Налог': ['Конто'],
+    'Опис': ['Име на конто'],
+    'Затворање': ['Конто'],
+    'Забелешка': ['Салдо'],
+    'Долгува': ['Долгува'],
+    'Побарува': ['Побарува'],
+    'Един': ['Дел.един'],
+}
+
+COLUMN_SOURCES = {
+    ACCOUNT_CARD: CARD_COLUMNS,
+    COMPANY_CARD: CARD_COLUMNS,
+    BALANCE_SHEET: BALANCE_SHEET_COLUMNS,
+}
+
+
+def normalize_label(value):
+    """Header label for matching: trimmed, lowercase, no trailing dot."""
+    if not isinstance(value, str):
+        return None
+    return value.strip().rstrip('.').lower()
+
+
+def detect_layout(df, scan_rows=LAYOUT_SCAN_ROWS):
+    """
+    Find the document type and header row of a raw sheet.
+    Only the first scan_rows rows are inspected. Returns a dict with
+    doc_type, header_row, columns (merged column -> sheet column or None),
+    account and company ((code, name) from the title rows, or None).
+    """
+    head = df.head(scan_rows)
+    for header_row, row in enumerate(head.itertuples(index=False, name=None)):
+        labels = {normalize_label(value): col for col, value in enumerate(row) if normalize_label(value)}
+        for doc_type, signature in LAYOUT_SIGNATURES:
+            if signature <= labels.keys():
+                break
+        else:
+            continue
+
+        columns = {}
+        for column, candidates in COLUMN_SOURCES[doc_type].items():
+            found = [labels[normalize_label(label)] for label in candidates if normalize_label(label) in labels]
+            columns[column] = found[0] if found else None
+        for column in LEDGER_COLUMNS:
+            columns.setdefault(column, None)
+
+        # Account code + name and company code + name sit above the header
+        title_rows = [(row[0], row[1]) for row in head.iloc[:header_row].itertuples(index=False, name=None)
+                      if pd.notna(row[0])]
+        account = company = None
+        if doc_type == ACCOUNT_CARD and len(title_rows) >= 2:
+            account, company = title_rows[0], title_rows[1]
+        elif doc_type == COMPANY_CARD and title_rows:
+            company = title_rows[0]
+
+        return {
+            'doc_type': doc_type,
+            'header_row': header_row,
+            'columns': columns,
+            'account': account,
+            'company': company,
+        }
+
+    raise ValueError(f"Could not find a ledger header in the first {scan_rows} rows")
+
+
+def parse_ledger(df, scan_rows=LAYOUT_SCAN_ROWS):
+    """
+    Split a raw sheet into its layout and data rows.
+    The data rows have the merged columns 0-9 (LEDGER_COLUMNS); columns the
+    document does not have are empty, and blank rows are dropped. The index
+    is the 0-based row of each entry in the sheet.
+    """
+    layout = detect_layout(df, scan_rows)
+    body = df.iloc[layout['header_row'] + 1:]
+
+    data = pd.DataFrame(index=body.index)
+    for position, column in enumerate(LEDGER_COLUMNS):
+        source = layout['columns'][column]
+        data[position] = body[source] if source is not None else pd.Series(float('nan'), index=body.index, dtype=object)
+
+    data = data[data.notna().any(axis=1)]
+    return layout, data
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Typed ledger model.
+
+Sheets are read with header=None, so the data rows from
+ledger_layout.parse_ledger are object columns that mix numbers, dates and
+text. type_ledger converts them once, when a ledger is read, to the types
+every later stage works with:
+- Дата: datetime64, NaT for cells that are not dates (see ledger_dates);
+  the number of cells that are not empty but not dates either is in the
+  typed frame's attrs['unparsed_dates']
+- Долгува, Побарува: int64 cents, NA for empty cells (see money), unless
+  a cell holds text that is not an amount; the column is then kept as is
+  (object)
+- Вал., м.ддв: categorical
+- Налог, Опис, Затворање, Забелешка, Един: text (string dtype, NaN when
+  empty). Columns that also hold numbers, like the account codes and
+  balances of balance sheets, stay object, so the numbers are written
+  back as numbers.
+
+concat_ledgers combines typed ledgers with the source as a categorical
+column, which the merged output and the HTML viewer share.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ledger_dates import count_unparsed, parse_dates
+from money import to_money
+
+DATE_COLUMN = 1
+AMOUNT_COLUMNS = [7, 8]
+CATEGORY_COLUMNS = [2, 3]
+TEXT_COLUMNS = [0, 4, 5, 6, 9]
+
+# pandas' own text dtype, with NaN for missing values like object columns
+TEXT_DTYPE = pd.StringDtype(na_value=np.nan)
+
+
+def to_text(values):
+    """Text column, or the values unchanged if they are not all text."""
+    if values.dtype == TEXT_DTYPE:
+        return values
+    present = values.dropna()
+    if not present.map(type).eq(str).all():
+        return values
+    return values.astype(TEXT_DTYPE)
+
+
+def type_ledger(data):
+    """
+    Typed frame of ledger data rows (columns 0-9, see
+    ledger_layout.LEDGER_COLUMNS), with the same index.
+    """
+    columns = {}
+    unparsed = 0
+    for column in data.columns:
+        values = data[column]
+        if column == DATE_COLUMN:
+            values = parse_dates(values)
+            unparsed = count_unparsed(data[column], values)
+        elif column in AMOUNT_COLUMNS:
+            values = to_money(values)
+        elif column in CATEGORY_COLUMNS:
+            values = values.astype('category')
+        elif column in TEXT_COLUMNS:
+            values = to_text(values)
+        columns[column] = values
+    typed = pd.DataFrame(columns, index=data.index)
+    typed.attrs['unparsed_dates'] = unparsed
+    return typed
+
+
+def concat_ledgers(ledgers, sources=None):
+    """
+    Concatenate typed ledgers, keeping the index. Categorical columns
+    stay categorical when their categories differ. With sources, a
+    categorical Source column names each row's source.
+    """
+    combined = pd.concat([ledger.iloc[:, :10] for ledger in ledgers])
+    for column in CATEGORY_COLUMNS:
+        if combined[column].dtype != 'category':
+            combined[column] = combined[column].astype('category')
+    if sources is not None:
+        codes = np.repeat(np.arange(len(ledgers)), [len(ledger) for ledger in ledgers])
+        if len(set(sources)) == len(sources):
+            combined['Source'] = pd.Categorical.from_codes(codes, categories=list(sources))
+        else:
+            # Files with the same name in different folders
+            combined['Source'] = np.asarray(sources, dtype=object)[codes]
+    return combined
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Read Excel ledger exports into raw DataFrames.
+
+Two engines are available:
+- calamine: Rust parser (python-calamine), much faster on large exports
+- openpyxl: read-only streaming mode, always available
+
+The "auto" engine uses calamine for large files when it is installed and
+openpyxl otherwise. Every read records which engine ran and how long the
+parse took in df.attrs.
+"""
+
+import os
+import time
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from ledger_cache import DEFAULT_MAX_BYTES, read_cached
+
+try:
+    import python_calamine  # noqa: F401
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+ENGINES = ('auto', 'calamine', 'openpyxl')
+
+# Smaller files parse in milliseconds with openpyxl, so calamine is only
+# worth loading above this size
+CALAMINE_MIN_BYTES = 256 * 1024
+
+
+def read_with_openpyxl(filepath):
+    """Read the first sheet with openpyxl in read-only mode."""
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        # Empty strings are missing values, as in pd.read_excel
+        rows = [[None if value == '' else value for value in row]
+                for row in wb.worksheets[0].iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+    # Drop trailing empty cells and rows, as pandas does for the same sheet
+    for row in rows:
+        while row and row[-1] is None:
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return pd.DataFrame(rows).fillna(float('nan'))
+
+
+def read_with_calamine(filepath):
+    """Read the first sheet with calamine."""
+    return pd.read_excel(filepath, header=None, engine='calamine')
+
+
+def select_engine(filepath, engine='auto'):
+    """Pick the engine for a file: calamine for large files when installed."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+    if engine == 'calamine' and not HAS_CALAMINE:
+        raise ImportError("The calamine engine needs python-calamine (pip install python-calamine)")
+    if engine != 'auto':
+        return engine
+    if HAS_CALAMINE and os.path.getsize(filepath) >= CALAMINE_MIN_BYTES:
+        return 'calamine'
+    return 'openpyxl'
+
+
+READERS = {
+    'calamine': read_with_calamine,
+    'openpyxl': read_with_openpyxl,
+}
+
+
+def read_ledger_sheet(filepath, engine='auto'):
+    """
+    Read the first sheet of a ledger with no header handling.
+    The engine used and the parse time are stored in df.attrs as 'engine'
+    and 'parse_seconds'.
+    """
+    engine = select_engine(filepath, engine)
+    start = time.perf_counter()
+    df = READERS[engine](filepath)
+    df.attrs['engine'] = engine
+    df.attrs['parse_seconds'] = time.perf_counter() - start
+    return df
+
+
+def read_excel_with_structure(filepath, source_name, engine='auto', cache_dir=None,
+                              cache_max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Read Excel file and preserve structure, adding source identifier.
+    With cache_dir, parsed sheets are reused from the ledger cache.
+    """
+    if cache_dir:
+        df = read_cached(filepath, lambda path: read_ledger_sheet(path, engine), cache_dir, cache_max_bytes)
+    else:
+        df = read_ledger_sheet(filepath, engine)
+    return df, source_name
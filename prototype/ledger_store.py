@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Local ledger store: parsed ledgers in an SQLite database, queried without
+reading the workbooks again.
+
+The records table mirrors the records table of the design catalog
+(design-catalog/data/erd.md): nalog, data, valuta, m_ddv, opis, zatvoranje,
+zabeleska, dolguja, pobaruva and edin, plus the row's source and sheet
+row. Dates are YYYY-MM-DD text and amounts are INTEGER cents (see money),
+so totals are exact, like DECIMAL(15,2). The files table has one row per
+workbook, keyed by its resolved path (as merge_state.source_id), with its
+source label and SHA-256: loading a workbook that did not change is a
+no-op, and a changed one replaces that workbook's records. Workbooks with
+the same file name in different folders are stored side by side. Records are indexed on nalog, data, source and file.
+
+Loading:
+
+    ledger_store.py load "real data/*.xlsx"
+
+or merge with merge_excel.py --store ledger.db, which stores the ledgers
+it has already parsed. Queries (also as query_records, query_totals and
+query_overlaps):
+
+    ledger_store.py records --nalog 10-0014
+    ledger_store.py totals --by month --source "Hami stam" --from 2025-03-01
+    ledger_store.py overlaps --search фактура
+"""
+
+import argparse
+import glob
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from ledger_batch import parse_workbooks
+from ledger_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, file_sha256
+from ledger_model import AMOUNT_COLUMNS, DATE_COLUMN, type_ledger
+from ledger_reader import ENGINES
+from merge_state import source_id
+from money import format_money, parse_money
+
+DEFAULT_STORE = 'ledger.db'
+
+# Stores with another version are rebuilt
+STORE_VERSION = 4
+
+SCHEMA = """
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,           -- source label, the file name without extension
+    file_path TEXT NOT NULL UNIQUE, -- resolved path of the workbook
+    sha256 TEXT NOT NULL,
+    doc_type TEXT,
+    company TEXT,
+    record_count INTEGER NOT NULL,
+    loaded_at TEXT NOT NULL
+);
+CREATE TABLE records (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    sheet_row INTEGER NOT NULL,     -- 1-based row in the workbook
+    nalog TEXT,                     -- Налог
+    data TEXT,                      -- Дата, YYYY-MM-DD
+    valuta INTEGER,                 -- Вал.
+    m_ddv INTEGER,                  -- м.ддв
+    opis TEXT,                      -- Опис
+    zatvoranje TEXT,                -- Затворање
+    zabeleska TEXT,                 -- Забелешка
+    dolguja INTEGER,                -- Долгува, in cents
+    pobaruva INTEGER,               -- Побарува, in cents
+    edin TEXT,                      -- Един
+    source TEXT NOT NULL
+);
+CREATE INDEX idx_records_file ON records(file_id);
+CREATE INDEX idx_records_nalog ON records(nalog);
+CREATE INDEX idx_records_data ON records(data);
+CREATE INDEX idx_records_source ON records(source, data);
+"""
+
+# Record columns in the order of the merged columns 0-9 (see
+# ledger_layout.LEDGER_COLUMNS)
+RECORD_COLUMNS = ['nalog', 'data', 'valuta', 'm_ddv', 'opis', 'zatvoranje', 'zabeleska', 'dolguja', 'pobaruva', 'edin']
+
+# Merged order: by date (undated rows first), then source and sheet row
+RECORD_ORDER = 'data, file_id, sheet_row'
+
+# Groupings of query_totals
+TOTAL_KEYS = {'source': 'source', 'month': 'm_ddv', 'day': 'data', 'nalog': 'nalog', 'all': "'all'"}
+
+# Columns matched by the search filter
+SEARCH_COLUMNS = ['nalog', 'opis', 'zatvoranje', 'zabeleska']
+
+
+def casefold(value):
+    """SQL function: text casefolded, for searches in any script (LIKE only folds ASCII)."""
+    return value.casefold() if isinstance(value, str) else value
+
+
+def open_store(path=DEFAULT_STORE):
+    """Open the store at path, creating or rebuilding its tables as needed."""
+    conn = sqlite3.connect(path, timeout=60)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.create_function('casefold', 1, casefold, deterministic=True)
+
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version != STORE_VERSION:
+        with conn:
+            if version:
+                print(f"Rebuilding ledger store {path}: version {version} is not {STORE_VERSION}")
+            conn.execute('DROP TABLE IF EXISTS records')
+            conn.execute('DROP TABLE IF EXISTS files')
+            conn.executescript(SCHEMA)
+            conn.execute(f'PRAGMA user_version={STORE_VERSION}')
+    return conn
+
+
+def column_values(values):
+    """Values of a column as Python scalars, None for empty cells."""
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def record_values(data, file_id, source):
+    """Parameter rows of typed ledger rows (see ledger_model) for the records table."""
+    columns = []
+    for column in range(len(RECORD_COLUMNS)):
+        values = data[column]
+        if column == DATE_COLUMN:
+            values = values.dt.strftime('%Y-%m-%d')
+        elif column in AMOUNT_COLUMNS:
+            # Text that is not an amount is not stored
+            values = parse_money(values)
+        columns.append(column_values(values))
+    sheet_rows = (data.index.to_numpy() + 1).tolist()
+    return zip([file_id] * len(data), sheet_rows, *columns, [source] * len(data))
+
+
+def stored_hashes(conn):
+    """SHA-256 of each stored workbook, by resolved path."""
+    return dict(conn.execute('SELECT file_path, sha256 FROM files'))
+
+
+def store_ledger(conn, source, path, sha256, doc_type, company, data):
+    """
+    Replace the records of the workbook at path with typed ledger rows,
+    in one transaction. Returns the number of records stored.
+    """
+    file_path = source_id(path)
+    columns = ', '.join(['file_id', 'sheet_row'] + RECORD_COLUMNS + ['source'])
+    placeholders = ', '.join('?' * (len(RECORD_COLUMNS) + 3))
+    with conn:
+        conn.execute('DELETE FROM records WHERE file_id IN (SELECT id FROM files WHERE file_path = ?)', (file_path,))
+        conn.execute('DELETE FROM files WHERE file_path = ?', (file_path,))
+        file_id = conn.execute(
+            'INSERT INTO files (source, file_path, sha256, doc_type, company, record_count, loaded_at)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (source, file_path, sha256, doc_type, None if company is None else str(company), len(data),
+             datetime.now().isoformat(timespec='seconds'))
+        ).lastrowid
+        conn.executemany(f'INSERT INTO records ({columns}) VALUES ({placeholders})',
+                         record_values(data, file_id, source))
+    return len(data)
+
+
+def load_ledgers(conn, file_paths, engine='auto', cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+                 workers=1, chunk_size=1):
+    """
+    Parse workbooks and store their records, skipping workbooks stored
+    with the same SHA-256 (see ledger_batch.parse_workbooks for the
+    parsing options). Returns {source: number of records stored}, 0 for
+    unchanged sources; workbooks with the same label add up.
+    """
+    stored = stored_hashes(conn)
+    # Source labels as in merge_excel.source_label
+    labels = [Path(path).stem for path in file_paths]
+    hashes = [file_sha256(path) for path in file_paths]
+    changed = [stored.get(source_id(path)) != sha256 for path, sha256 in zip(file_paths, hashes)]
+    parsed = parse_workbooks([path for path, is_changed in zip(file_paths, changed) if is_changed],
+                             engine, cache_dir, cache_max_bytes, workers, chunk_size)
+
+    counts = {}
+    for path, label, sha256, is_changed in zip(file_paths, labels, hashes, changed):
+        if not is_changed:
+            print(f"Unchanged: {label}")
+            counts.setdefault(label, 0)
+            continue
+        layout, data, _ = next(parsed)
+        data = type_ledger(data)
+        count = store_ledger(conn, label, path, sha256, layout['doc_type'],
+                             layout['company'][0] if layout['company'] else None, data)
+        counts[label] = counts.get(label, 0) + count
+        print(f"Stored: {label} ({count} records, {layout['doc_type']})")
+        if data.attrs['unparsed_dates']:
+            print(f"  {data.attrs['unparsed_dates']} Дата cells are not dates; stored without a date")
+    return counts
+
+
+def store_partitions(path, partitions):
+    """
+    Store the sorted runs of merge partitions (see
+    merge_excel.build_partition) in the store at path, skipping workbooks
+    stored with the same SHA-256. Returns the number of records stored.
+    """
+    conn = open_store(path)
+    try:
+        stored = stored_hashes(conn)
+        total = 0
+        for partition in partitions:
+            sha256 = partition['sha256'] or file_sha256(partition['path'])
+            if stored.get(source_id(partition['path'])) != sha256:
+                total += store_ledger(conn, partition['source'], partition['path'], sha256, partition['doc_type'],
+                                      partition['company'], partition['run'])
+        return total
+    finally:
+        conn.close()
+
+
+def record_filter(nalog=None, date_from=None, date_to=None, sources=None, month=None, search=None):
+    """
+    WHERE clause and parameters of record filters: Налог code, dates
+    from/to (YYYY-MM-DD, inclusive), source labels, м.ддв month and a
+    case-insensitive search of Налог, Опис, Затворање and Забелешка.
+    """
+    clauses = []
+    params = []
+    if nalog is not None:
+        clauses.append('nalog = ?')
+        params.append(str(nalog))
+    if date_from:
+        clauses.append('data >= ?')
+        params.append(date_from)
+    if date_to:
+        clauses.append('data <= ?')
+        params.append(date_to)
+    if sources:
+        clauses.append(f"source IN ({', '.join('?' * len(sources))})")
+        params.extend(sources)
+    if month is not None:
+        clauses.append('m_ddv = ?')
+        params.append(month)
+    if search:
+        clauses.append('(' + ' OR '.join(f'instr(casefold({column}), ?) > 0' for column in SEARCH_COLUMNS) + ')')
+        params.extend([search.casefold()] * len(SEARCH_COLUMNS))
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def query_records(conn, limit=None, **filters):
+    """
+    Records matching the filters (see record_filter) in merged order, as a
+    DataFrame with the record columns, source and sheet_row; amounts in
+    cents.
+    """
+    where, params = record_filter(**filters)
+    sql = f"SELECT {', '.join(RECORD_COLUMNS)}, source, sheet_row FROM records{where} ORDER BY {RECORD_ORDER}"
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def query_totals(conn, by='source', **filters):
+    """
+    Totals of the records matching the filters, grouped by source, month,
+    day, nalog or all: record count, Долгува and Побарува sums and
+    balance (Побарува - Долгува) in cents, and payment (Долгува > 0) and
+    invoice (Побарува > 0) counts.
+    """
+    key = TOTAL_KEYS[by]
+    where, params = record_filter(**filters)
+    return pd.read_sql_query(
+        f"SELECT {key} AS \"{by}\", COUNT(*) AS count,"
+        " COALESCE(SUM(dolguja), 0) AS dolguja, COALESCE(SUM(pobaruva), 0) AS pobaruva,"
+        " COALESCE(SUM(pobaruva), 0) - COALESCE(SUM(dolguja), 0) AS saldo,"
+        " SUM(dolguja > 0) AS payments, SUM(pobaruva > 0) AS invoices"
+        f" FROM records{where} GROUP BY 1 ORDER BY {'MIN(file_id)' if by == 'source' else '1'}",
+        conn, params=params
+    )
+
+
+def query_overlaps(conn, **filters):
+    """
+    Налог codes of the records matching the filters that occur in more
+    than one workbook, in code order, as {code: [(source, row), ...]} like
+    merge_excel.find_overlaps.
+    """
+    where, params = record_filter(**filters)
+    rows = conn.execute(
+        f"WITH matching AS (SELECT nalog, source, sheet_row, data, file_id FROM records{where}),"
+        " shared AS (SELECT nalog FROM matching WHERE nalog IS NOT NULL"
+        "  GROUP BY nalog HAVING COUNT(DISTINCT file_id) > 1)"
+        " SELECT nalog, source, sheet_row FROM matching WHERE nalog IN (SELECT nalog FROM shared)"
+        f" ORDER BY nalog, {RECORD_ORDER}",
+        params
+    )
+    overlaps = {}
+    for code, source, row in rows:
+        overlaps.setdefault(code, []).append((source, row))
+    return overlaps
+
+
+def money_columns(frame, columns):
+    """Copy of a query result with the cent columns formatted as denars, for printing."""
+    return frame.assign(**{column: frame[column].map(lambda cents: '' if pd.isna(cents) else format_money(cents))
+                           for column in columns})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load ledgers into a local SQLite store and query it.")
+    parser.add_argument('--db', default=DEFAULT_STORE, help="ledger store database")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help="parse workbooks into the store (unchanged ones are skipped)")
+    load.add_argument('files', nargs='+', help="ledger workbooks or glob patterns")
+    load.add_argument('--engine', choices=ENGINES, default='auto', help="Excel reader engine")
+    load.add_argument('--no-cache', action='store_true', help="parse every workbook, bypassing the ledger cache")
+    load.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="ledger cache directory")
+    load.add_argument('--workers', type=int, default=1, help="processes that parse workbooks in parallel")
+
+    for name, help_text in (('records', "list matching records"), ('totals', "sum matching records"),
+                            ('overlaps', "Налог codes of matching records in more than one workbook")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--nalog', help="Налог code")
+        command.add_argument('--from', dest='date_from', help="first date, YYYY-MM-DD")
+        command.add_argument('--to', dest='date_to', help="last date, YYYY-MM-DD")
+        command.add_argument('--source', dest='sources', action='append', help="source label (repeatable)")
+        command.add_argument('--month', type=int, help="м.ддв month")
+        command.add_argument('--search', help="text in Налог, Опис, Затворање or Забелешка")
+        if name == 'records':
+            command.add_argument('--limit', type=int, default=100, help="records to show (0: all)")
+        if name == 'totals':
+            command.add_argument('--by', choices=TOTAL_KEYS, default='source', help="grouping")
+    args = parser.parse_args(argv)
+
+    conn = open_store(args.db)
+    try:
+        if args.command == 'load':
+            paths = [path for pattern in args.files for path in (sorted(glob.glob(pattern)) or [pattern])]
+            counts = load_ledgers(conn, paths, args.engine, None if args.no_cache else args.cache_dir,
+                                  workers=args.workers)
+            print(f"{sum(counts.values())} records stored in {args.db}")
+            return counts
+
+        filters = {name: getattr(args, name) for name in ('nalog', 'date_from', 'date_to', 'sources', 'month', 'search')}
+        with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', None):
+            if args.command == 'records':
+                records = query_records(conn, args.limit or None, **filters)
+                print(money_columns(records, ['dolguja', 'pobaruva']).to_string(index=False))
+                return records
+            if args.command == 'totals':
+                totals = query_totals(conn, args.by, **filters)
+                print(money_columns(totals, ['dolguja', 'pobaruva', 'saldo']).to_string(index=False))
+                return totals
+            overlaps = query_overlaps(conn, **filters)
+            for code, entries in overlaps.items():
+                print(f"{code}: " + ", ".join(f"{source} row {row}" for source, row in entries))
+            print(f"{len(overlaps)} overlapping Налог codes")
+            return overlaps
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
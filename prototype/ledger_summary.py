@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Pre-aggregated summary buckets for the HTML viewer.
+
+Rows are grouped by source, month (м.ддв) and day (Дата). Each bucket
+holds the row count, the Долгува and Побарува sums, and the count, sum,
+min and max of the payments (Долгува > 0) and invoices (Побарува > 0).
+Amounts are int64 cents (see money), so sums over buckets are exact.
+Buckets combine by adding counts and sums and taking the min of mins and
+max of maxes, so the per-source, per-month and per-day totals for any
+source/date/month filter are a single pass over the buckets instead of
+over every row.
+"""
+
+import pandas as pd
+
+from money import MONEY_DTYPE, to_cents
+
+BUCKET_KEYS = ['source', 'month', 'day']
+
+
+def summary_buckets(data, sources):
+    """
+    Summary buckets for viewer rows (columns Извор, м_ддв, Дата, Долгува,
+    Побарува). source is the index of the row's source in sources.
+    Amounts that are not numbers count as 0, as in the viewer.
+    """
+    debit = pd.Series(to_cents(data['Долгува']), index=data.index, dtype=MONEY_DTYPE)
+    credit = pd.Series(to_cents(data['Побарува']), index=data.index, dtype=MONEY_DTYPE)
+
+    frame = pd.DataFrame({
+        'source': data['Извор'].map({source: i for i, source in enumerate(sources)}),
+        'month': data['м_ддв'],
+        'day': data['Дата'],
+        'debit': debit,
+        'credit': credit,
+        # Only positive amounts are payments and invoices
+        'payment': debit.where(debit > 0),
+        'invoice': credit.where(credit > 0),
+    })
+
+    buckets = frame.groupby(BUCKET_KEYS, dropna=False, sort=False).agg(
+        count=('debit', 'size'),
+        debit_sum=('debit', 'sum'),
+        credit_sum=('credit', 'sum'),
+        payment_count=('payment', 'count'),
+        payment_sum=('payment', 'sum'),
+        payment_min=('payment', 'min'),
+        payment_max=('payment', 'max'),
+        invoice_count=('invoice', 'count'),
+        invoice_sum=('invoice', 'sum'),
+        invoice_min=('invoice', 'min'),
+        invoice_max=('invoice', 'max'),
+    )
+    return buckets.reset_index()
+
+
+def combine_buckets(buckets):
+    """
+    Merge bucket tables, e.g. saved buckets and those of new rows: counts
+    and sums add up, min and max combine.
+    """
+    combined = pd.concat(buckets, ignore_index=True)
+    aggregations = {column: 'sum' for column in combined.columns if column.endswith(('count', 'sum'))}
+    aggregations.update({column: 'min' for column in combined.columns if column.endswith('_min')})
+    aggregations.update({column: 'max' for column in combined.columns if column.endswith('_max')})
+    return combined.groupby(BUCKET_KEYS, dropna=False, sort=False).agg(aggregations).reset_index()
@@ -1,191 +1,677 @@
 #!/usr/bin/env python3
 """
-Merge two Excel accounting ledger files into one combined file.
+Merge Excel accounting ledger files into one combined file.
 Preserves original layout and adds a source column to identify origin.
 """
 
+import argparse
+import heapq
+import html
+import json
+import os
+import tempfile
+from copy import copy
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils.dataframe import dataframe_to_rows
 
+from external_merge import DEFAULT_CHUNK_ROWS, merge_runs, read_ledger_chunks, spill_run
+from invoice_matching import STATUS_LABELS, find_invoice_numbers, invoice_totals, match_invoices, settle_invoices
+from ledger_batch import parse_workbooks
+from ledger_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, HAS_PYARROW, clear_cache, file_sha256
+from ledger_dedup import DEDUP_POLICIES, duplicate_masks, find_duplicates, mark_duplicates, write_duplicate_index
+from ledger_model import AMOUNT_COLUMNS, concat_ledgers, type_ledger
+from ledger_reader import ENGINES
+from ledger_store import store_partitions
+from ledger_summary import combine_buckets, summary_buckets
+from merge_profile import capture, new_profile, print_profile, stage, write_profile
+from merge_state import (
+    ADDED, APPENDED, CHANGED, UNCHANGED, date_keys, diff_rows, insertion_order, load_state,
+    outputs_unchanged, row_fingerprints, save_state, source_id, state_dir_for
+)
+from money import CENTS, format_money, to_cents, to_denars
+from viewer_payload import PART_ROWS, SHARD_COLUMNS, payload_parts, script_literal, shard_rows, sort_ranks
+
+
+# Row colours per input file, reused in order when there are more sources
+SOURCE_COLORS = ["E6F3FF", "FFF3E6", "E8F8EC", "F3E8FB", "FDF9E1", "E6F7F7", "FCE8EE", "EEEEEE"]
+
+# Column headers and widths of the merged sheet
+MERGED_HEADERS = ["Налог", "Дата", "Вал.", "м.ддв", "Опис", "Затворање", "Забелешка", "Долгува", "Побарува", "Един", "Извор"]
+COLUMN_WIDTHS = {'A': 12, 'B': 15, 'C': 8, 'D': 8, 'E': 30, 'F': 20, 'G': 15, 'H': 12, 'I': 12, 'J': 8, 'K': 15}
+
+# Column names of the rows embedded in the HTML viewer
+VIEWER_COLUMNS = ["Налог", "Дата", "Вал", "м_ддв", "Опис", "Затворање", "Забелешка", "Долгува", "Побарува", "Един", "Извор"]
+
+# Columns of the invoice matching sheet
+INVOICE_HEADERS = ["Број на фактура", "Фактурирано", "Платено", "Салдо", "Статус", "Фактури", "Плаќања", "Извори"]
+INVOICE_WIDTHS = {'A': 18, 'B': 14, 'C': 14, 'D': 14, 'E': 14, 'F': 9, 'G': 9, 'H': 30}
+
+# Height of a table row in the HTML viewer, in pixels; rows are fixed
+# height so the visible window can be computed from the scroll position
+VIEWER_ROW_HEIGHT = 37
+
+# HTML viewer colours per source: (row, row hover, accent, stat box)
+HTML_SOURCE_COLORS = [
+    ("#e8f4fc", "#d4e9f7", "#3498db", "#eaf2f8"),
+    ("#fef5e7", "#fdebd0", "#e67e22", "#fef5e7"),
+    ("#eafaf1", "#d5f5e3", "#27ae60", "#eafaf1"),
+    ("#f5eef8", "#ebdef0", "#9b59b6", "#f5eef8"),
+    ("#e8f8f5", "#d1f2eb", "#16a085", "#e8f8f5"),
+    ("#fdedec", "#fadbd8", "#c0392b", "#fdedec"),
+    ("#fef9e7", "#fcf3cf", "#f1c40f", "#fef9e7"),
+    ("#f2f3f4", "#e5e7e9", "#7f8c8d", "#f2f3f4"),
+]
+
+
+def source_label(filepath):
+    """Source name shown in the merged output, taken from the file name."""
+    return Path(filepath).stem
+
+
+def sort_ledger_rows(data):
+    """
+    Sort the typed data rows of one ledger (see ledger_model.type_ledger)
+    by date. Rows without a valid date come first, as in the merged
+    output. The index keeps the row of each entry in its sheet.
+    """
+    return data.sort_values(by=1, kind='stable', na_position='first')
 
-def read_excel_with_structure(filepath, source_name):
-    """Read Excel file and preserve structure, adding source identifier."""
-    df = pd.read_excel(filepath, header=None)
-    return df, source_name
 
+def build_code_index(runs, sources):
+    """
+    Index the Налог codes of all sources in one pass.
+    Returns {code: [(source, row), ...]}, where row is the 1-based row of
+    the entry in its workbook.
+    """
+    index = {}
+    for run, source in zip(runs, sources):
+        codes = run[0]
+        present = codes.notna().to_numpy()
+        for code, row in zip(codes.to_numpy()[present], run.index.to_numpy()[present] + 1):
+            index.setdefault(code, []).append((source, int(row)))
+    return index
+
+
+def find_overlaps(code_index):
+    """Entries of the code index whose code occurs in more than one source."""
+    return {
+        code: entries for code, entries in code_index.items()
+        if len({source for source, _ in entries}) > 1
+    }
+
+
+def write_overlap_index(path, overlaps):
+    """Save overlapping codes as JSON: {code: [{"source": ..., "row": ...}]}."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(
+            {str(code): [{'source': source, 'row': row} for source, row in entries]
+             for code, entries in overlaps.items()},
+            f, ensure_ascii=False
+        )
+
+
+def output_rows(run, source):
+    """
+    Convert a sorted ledger into plain row tuples for the merged sheet.
+    The date column is formatted and the amounts are converted back to
+    denars in vectorized passes, empty cells become None and the source
+    label is added as the last column.
+    """
+    rows = run.iloc[:, :10].astype(object)
+    rows[1] = run[1].dt.strftime('%Y-%m-%d')
+    for column in AMOUNT_COLUMNS:
+        rows[column] = to_denars(run[column]).astype(object)
+    rows = rows.where(rows.notna(), None)
+    rows['Source'] = source
+    return rows.itertuples(index=False, name=None)
 
-def merge_accounting_files(file1_path, file2_path, output_path):
+
+def merge_sorted_runs(runs, sources):
     """
-    Merge two accounting Excel files into one.
-    Adds a 'Source' column to identify which file each record came from.
+    K-way merge of date-sorted ledgers.
+    Yields (source_index, row) in date order, with rows as produced by
+    output_rows. Rows with equal dates keep the order of the inputs, the
+    same as a stable sort of the concatenated data.
     """
-    # Read both files
-    df1 = pd.read_excel(file1_path, header=None)
-    df2 = pd.read_excel(file2_path, header=None)
-
-    # Extract company names from file paths
-    source1 = file1_path.replace('.xlsx', '').split('/')[-1]
-    source2 = file2_path.replace('.xlsx', '').split('/')[-1]
-
-    print(f"Reading: {source1} ({len(df1)} rows)")
-    print(f"Reading: {source2} ({len(df2)} rows)")
-
-    # Add source column to both dataframes
-    df1['Source'] = source1
-    df2['Source'] = source2
-
-    # Get header rows (first 3 rows contain account info and column headers)
-    # Row 0: Account code + description
-    # Row 1: Company code + name
-    # Row 2: Empty row
-    # Row 3: Column headers (Налог, Дата, etc.)
-    # Row 4+: Actual data
-
-    # Get data rows (from row 4 onwards, skipping the header row at index 3)
-    data1 = df1.iloc[4:].copy()
-    data2 = df2.iloc[4:].copy()
-
-    # Reset index for data
-    data1 = data1.reset_index(drop=True)
-    data2 = data2.reset_index(drop=True)
-
-    # Combine data rows
-    combined_data = pd.concat([data1, data2], ignore_index=True)
-
-    # Sort by date (column 1 contains dates)
-    combined_data[1] = pd.to_datetime(combined_data[1], errors='coerce')
-    combined_data = combined_data.sort_values(by=1, na_position='first').reset_index(drop=True)
-
-    # Create output workbook with formatting
-    from openpyxl import Workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Merged Data"
-
-    # Define styles
-    header_font = Font(bold=True)
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    header_fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-    source1_fill = PatternFill(start_color="E6F3FF", end_color="E6F3FF", fill_type="solid")  # Light blue
-    source2_fill = PatternFill(start_color="FFF3E6", end_color="FFF3E6", fill_type="solid")  # Light orange
-
-    # Write merged header
-    ws.cell(row=1, column=1, value="2200")
-    ws.cell(row=1, column=2, value="Обврски спрема добавувачи врз основа на набавка на добра (производи) и услуги во земјата")
-    ws.cell(row=1, column=11, value="Извор")
-
-    # Write company info
-    ws.cell(row=2, column=1, value=f"{source1} (6) + {source2} (40)")
-    ws.cell(row=2, column=2, value="ТП БИЛАНС ЕЛИТ - COMBINED")
-
-    # Write column headers
-    headers = ["Налог", "Дата", "Вал.", "м.ддв", "Опис", "Затворање", "Забелешка", "Долгува", "Побарува", "Един", "Извор"]
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = thin_border
-
-    # Write data rows
-    row_num = 5
-    for idx, row in combined_data.iterrows():
-        source = row['Source']
-        fill = source1_fill if source == source1 else source2_fill
-
-        for col in range(10):  # Original columns
-            value = row.iloc[col]
-            # Format date
-            if col == 1 and pd.notna(value):
-                if isinstance(value, pd.Timestamp):
-                    value = value.strftime('%Y-%m-%d')
-            cell = ws.cell(row=row_num, column=col+1, value=value)
-            cell.border = thin_border
-            cell.fill = fill
-
-        # Source column
-        cell = ws.cell(row=row_num, column=11, value=source)
-        cell.border = thin_border
-        cell.fill = fill
-
-        row_num += 1
-
-    # Add summary section
-    row_num += 2
-    ws.cell(row=row_num, column=1, value="SUMMARY")
-    ws.cell(row=row_num, column=1).font = header_font
-
-    row_num += 1
-    ws.cell(row=row_num, column=1, value=f"Total records from {source1}:")
-    ws.cell(row=row_num, column=2, value=len(data1))
-
-    row_num += 1
-    ws.cell(row=row_num, column=1, value=f"Total records from {source2}:")
-    ws.cell(row=row_num, column=2, value=len(data2))
-
-    row_num += 1
-    ws.cell(row=row_num, column=1, value="Combined total:")
-    ws.cell(row=row_num, column=2, value=len(combined_data))
-
-    # Find overlapping Налог codes
-    nalog1 = set(data1.iloc[:, 0].dropna().unique())
-    nalog2 = set(data2.iloc[:, 0].dropna().unique())
-    overlapping = nalog1.intersection(nalog2)
-
-    row_num += 2
-    ws.cell(row=row_num, column=1, value="Overlapping Налог codes:")
-    ws.cell(row=row_num, column=1).font = header_font
-    row_num += 1
+    streams = []
+    for source_index, (run, source) in enumerate(zip(runs, sources)):
+        streams.append(zip(date_keys(run), [source_index] * len(run), output_rows(run, source)))
+
+    for _, source_index, row in heapq.merge(*streams, key=lambda item: item[0]):
+        yield source_index, row
+
+
+def add_merged_styles(wb, source_count):
+    """
+    Register the named styles of the merged workbook once.
+    Returns the style name used for the rows of each source.
+    """
+    thin = Side(style='thin')
+    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+
+    wb.add_named_style(NamedStyle(name="merged_bold", font=Font(bold=True)))
+    wb.add_named_style(NamedStyle(
+        name="merged_header",
+        font=Font(bold=True),
+        fill=PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid"),
+        border=thin_border
+    ))
+
+    source_styles = []
+    for i in range(source_count):
+        color = SOURCE_COLORS[i % len(SOURCE_COLORS)]
+        style = NamedStyle(
+            name=f"merged_source_{i}",
+            font=copy(DEFAULT_FONT),
+            fill=PatternFill(start_color=color, end_color=color, fill_type="solid"),
+            border=thin_border
+        )
+        wb.add_named_style(style)
+        source_styles.append(style.name)
+    return source_styles
+
+
+def styled_cell(ws, value, style):
+    """Write-only cell with a named style."""
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def write_invoice_sheet(wb, invoice_groups):
+    """Add the invoice matching sheet: one row per invoice number, amounts in denars."""
+    ws = wb.create_sheet("Фактури")
+    for column, width in INVOICE_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+    ws.append([styled_cell(ws, header, "merged_header") for header in INVOICE_HEADERS])
+    for group in invoice_groups.itertuples(index=False):
+        ws.append([
+            group.invoice_number, group.total_credit / CENTS, group.total_debit / CENTS, group.balance / CENTS,
+            STATUS_LABELS[group.status], group.credit_count, group.debit_count, group.sources
+        ])
+
+
+def write_merged_workbook(output_path, sources, company_codes, merged_rows, overlapping, invoice_groups=None):
+    """
+    Write the merged ledger with a write-only worksheet.
+    Rows from merged_rows, (source_index, row) pairs in output order with
+    the values ready to write, are streamed to disk as they arrive, so
+    memory does not grow with the row count. overlapping is only read
+    after the last row, so it can be filled in while merged_rows is
+    consumed. With invoice_groups (see invoice_matching.match_invoices) a
+    second sheet lists the invoice matches. Returns the number of rows
+    written per source.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Merged Data")
+    source_styles = add_merged_styles(wb, len(sources))
+
+    # Column widths must be set before the first row is written
+    for column, width in COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+
+    # Merged header
+    ws.append(["2200", "Обврски спрема добавувачи врз основа на набавка на добра (производи) и услуги во земјата"]
+              + [None] * 8 + ["Извор"])
+
+    # Company info
+    ws.append([" + ".join(f"{source} ({code})" if code is not None else source
+                          for source, code in zip(sources, company_codes)),
+               "ТП БИЛАНС ЕЛИТ - COMBINED"])
+    ws.append([])
+
+    # Column headers
+    ws.append([styled_cell(ws, header, "merged_header") for header in MERGED_HEADERS])
+
+    # Data rows. Each source gets one styled cell per column, reused for
+    # every row: a write-only sheet serializes cells as soon as they are
+    # appended.
+    row_cells = [[styled_cell(ws, None, style) for _ in MERGED_HEADERS] for style in source_styles]
+    source_counts = [0] * len(sources)
+    for source_index, row in merged_rows:
+        cells = row_cells[source_index]
+        for cell, value in zip(cells, row):
+            cell.value = value
+        ws.append(cells)
+        source_counts[source_index] += 1
+
+    # Summary section
+    ws.append([])
+    ws.append([])
+    ws.append([styled_cell(ws, "SUMMARY", "merged_bold")])
+    for source, count in zip(sources, source_counts):
+        ws.append([f"Total records from {source}:", count])
+    ws.append(["Combined total:", sum(source_counts)])
+
+    ws.append([])
+    ws.append([styled_cell(ws, "Overlapping Налог codes:", "merged_bold")])
     for code in sorted(overlapping):
-        ws.cell(row=row_num, column=1, value=code)
-        row_num += 1
-
-    # Adjust column widths
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 8
-    ws.column_dimensions['D'].width = 8
-    ws.column_dimensions['E'].width = 30
-    ws.column_dimensions['F'].width = 20
-    ws.column_dimensions['G'].width = 15
-    ws.column_dimensions['H'].width = 12
-    ws.column_dimensions['I'].width = 12
-    ws.column_dimensions['J'].width = 8
-    ws.column_dimensions['K'].width = 15
-
-    # Save workbook
+        ws.append([code])
+
+    if invoice_groups is not None:
+        write_invoice_sheet(wb, invoice_groups)
+
     wb.save(output_path)
+    return source_counts
+
+
+def print_source_totals(sources, debit_totals, credit_totals):
+    """Print the Долгува and Побарува totals and balance of each source, given in cents."""
+    for source, debit, credit in zip(sources, debit_totals, credit_totals):
+        print(f"  {source}: Долгува {format_money(debit)}, Побарува {format_money(credit)}, "
+              f"Салдо {format_money(credit - debit)}")
+
+
+def viewer_rows(combined):
+    """Rows for the HTML viewer: the viewer column names and Дата as text."""
+    rows = combined.set_axis(VIEWER_COLUMNS, axis=1)
+    return rows.assign(Дата=rows['Дата'].dt.strftime('%Y-%m-%d'))
+
+
+def run_buckets(run, source):
+    """Summary buckets of one source's rows, with source index 0."""
+    return summary_buckets(viewer_rows(concat_ledgers([run], [source])), [source])
+
+
+def build_partition(path, source, parsed, sha256=None, previous=None, profile=None):
+    """
+    Build the partition of one source: a dict with its sorted run, Налог
+    code index entries, summary buckets, document type and company code.
+    parsed is (layout, data, attrs) from ledger_batch.parse_workbooks, or
+    None for a workbook that is unchanged since previous, the source's
+    saved partition (see merge_state), which is then reused. With sha256
+    (incremental merges) row fingerprints are kept too, and previous is
+    extended when rows were only appended. Stage timings are recorded in
+    profile (see merge_profile).
+    """
+    if parsed is None:
+        print(f"Reading: {source} (unchanged, {len(previous['run'])} rows from merge state)")
+        return dict(previous, path=path, status=UNCHANGED)
+
+    layout, data, attrs = parsed
+    print(f"Reading: {source} ({len(data)} rows, {layout['doc_type']}, "
+          f"{attrs['engine']} {attrs['parse_seconds']:.3f}s)")
+    with stage(profile, 'typing', len(data)):
+        data = type_ledger(data)
+    if data.attrs['unparsed_dates']:
+        print(f"  {data.attrs['unparsed_dates']} Дата cells are not dates; their rows sort first")
+    with stage(profile, 'sort', len(data)):
+        run = sort_ledger_rows(data)
+
+    # Fingerprints, change detection, code index and buckets
+    with stage(profile, 'index', len(data)):
+        partition = {
+            'source': source,
+            'path': path,
+            'sha256': sha256,
+            'doc_type': layout['doc_type'],
+            'company': layout['company'][0] if layout['company'] else None,
+            'status': ADDED if previous is None else CHANGED,
+            'fingerprints': row_fingerprints(run) if sha256 else None,
+        }
+
+        if previous is not None:
+            sheet_order = np.argsort(run.index.to_numpy(), kind='stable')
+            status, inserted, removed = diff_rows(previous, partition['fingerprints'][sheet_order],
+                                                  run.index.to_numpy()[sheet_order])
+            print(f"  {status} since last merge: {inserted} rows inserted, {removed} removed")
+            if status == APPENDED:
+                # Only the appended rows are sorted in, bucketed and indexed
+                is_new = np.zeros(len(run), dtype=bool)
+                is_new[sheet_order[len(previous['run']):]] = True
+                new_rows = run[is_new]
+                order = insertion_order(previous['run'], new_rows)
+                run = concat_ledgers([previous['run'], new_rows]).iloc[order]
+                # Codes of the new rows list their entries in run order,
+                # as build_code_index of the whole run would
+                position = np.empty(run.index.max() + 2, dtype=np.int64)
+                position[run.index.to_numpy() + 1] = np.arange(len(run))
+                codes = dict(previous['codes'])
+                new_codes = build_code_index([new_rows], [source])
+                for code, entries in new_codes.items():
+                    codes[code] = sorted(codes.get(code, []) + entries, key=lambda entry: position[entry[1]])
+                if not new_codes.keys() <= previous['codes'].keys():
+                    codes = dict(sorted(codes.items(), key=lambda item: position[item[1][0][1]]))
+                partition.update(
+                    status=APPENDED,
+                    run=run,
+                    fingerprints=np.concatenate([previous['fingerprints'], partition['fingerprints'][is_new]])[order],
+                    codes=codes,
+                    buckets=combine_buckets([previous['buckets'], run_buckets(new_rows, source)]),
+                )
+                return partition
+
+        partition.update(
+            run=run,
+            codes=build_code_index([run], [source]),
+            buckets=run_buckets(run, source),
+        )
+        return partition
+
+
+def merge_accounting_files(file_paths, output_path, engine='auto', cache_dir=None,
+                           cache_max_bytes=DEFAULT_MAX_BYTES,
+                           compress_viewer=False, incremental=False, workers=1, chunk_size=1, html_path=None,
+                           profile=None, store_path=None, shard_viewer=None, dedup=None):
+    """
+    Merge any number of accounting Excel files into one.
+    Each file is sorted by date on its own and the sorted runs are merged
+    row by row into the output, instead of concatenating and re-sorting
+    everything. Adds a 'Source' column to identify which file each record
+    came from. engine selects the Excel reader (see ledger_reader); with
+    cache_dir, parsed workbooks are reused from the ledger cache;
+    compress_viewer gzips the rows embedded in the HTML viewer. Workbooks
+    are parsed by up to workers processes, handed out chunk_size at a time
+    (see ledger_batch).
+
+    With incremental, the merge state is saved in <output>.state and the
+    next incremental merge only reads workbooks that changed, applies
+    appended rows to the saved runs and summary buckets, rebuilds a
+    source with removed or edited rows from its workbook, and rewrites
+    nothing when no source changed (see merge_state).
+
+    Returns the combined data and the overlapping Налог codes as
+    {code: [(source, row), ...]}, which is also saved next to the output
+    as <output>.overlaps.json. The HTML viewer is written to html_path,
+    by default accounting_viewer.html next to the output.
+
+    With a profile (see merge_profile.new_profile), the time, memory and
+    rows of each stage of the merge are recorded in it. With store_path,
+    the parsed ledgers are also loaded into the ledger store there (see
+    ledger_store), unless it already has them. With shard_viewer, 'month'
+    or 'source', the viewer is written as an index page and shards of
+    the rows that it loads when needed (see write_sharded_viewer). With
+    dedup, one of ledger_dedup.DEDUP_POLICIES, entries that repeat an
+    entry of another source are reported in <output>.duplicates.json,
+    and also marked or dropped (see ledger_dedup).
+    """
+    if html_path is None:
+        html_path = os.path.join(os.path.dirname(output_path), 'accounting_viewer.html')
+    overlap_path = os.path.splitext(output_path)[0] + '.overlaps.json'
+    duplicate_path = os.path.splitext(output_path)[0] + '.duplicates.json' if dedup is not None else None
+    outputs = [path for path in (output_path, overlap_path, duplicate_path, html_path) if path is not None]
+    # Options that change the outputs; an incremental re-run with other
+    # outputs or options writes them again even if no source changed
+    options = {'compress_viewer': compress_viewer, 'shard_viewer': shard_viewer, 'dedup': dedup}
+
+    state_dir = state_dir_for(output_path) if incremental else None
+    saved, saved_outputs, saved_options = load_state(state_dir) if incremental else ({}, {}, {})
+
+    labels = [source_label(path) for path in file_paths]
+    hashes = [file_sha256(path) if incremental else None for path in file_paths]
+    ids = [source_id(path) for path in file_paths]
+    # Workbooks with the hash saved in the merge state are not read again
+    unchanged = [key in saved and saved[key]['sha256'] == sha256 for key, sha256 in zip(ids, hashes)]
+    parsed = parse_workbooks(
+        [path for path, is_unchanged in zip(file_paths, unchanged) if not is_unchanged],
+        engine, cache_dir, cache_max_bytes, workers, chunk_size
+    )
+    partitions = []
+    for path, key, label, sha256, is_unchanged in zip(file_paths, ids, labels, hashes, unchanged):
+        workbook = None
+        if not is_unchanged:
+            with stage(profile, 'read') as record:
+                workbook = next(parsed)
+                record['rows'] = len(workbook[1])
+        partitions.append(build_partition(path, label, workbook, sha256, saved.get(key), profile))
+    sources = [partition['source'] for partition in partitions]
+    company_codes = [partition['company'] for partition in partitions]
+    runs = [partition['run'] for partition in partitions]
+
+    if store_path is not None:
+        with stage(profile, 'store') as record:
+            record['rows'] = store_partitions(store_path, partitions)
+        print(f"Ledger store {store_path}: {record['rows']} records stored")
+
+    # Entries that repeat an entry of another source; dropped ones are
+    # left out of the runs and of their code index and buckets
+    source_codes = [partition['codes'] for partition in partitions]
+    source_buckets = [partition['buckets'] for partition in partitions]
+    duplicates = None
+    if dedup is not None:
+        with stage(profile, 'dedup', sum(len(run) for run in runs)):
+            duplicates = find_duplicates(runs)
+            if dedup == 'drop':
+                for i, is_duplicate in enumerate(duplicate_masks(duplicates, runs)):
+                    if is_duplicate.any():
+                        runs[i] = runs[i][~is_duplicate]
+                        source_codes[i] = build_code_index([runs[i]], [sources[i]])
+                        source_buckets[i] = run_buckets(runs[i], sources[i])
+        print(f"Duplicate entries across sources: {int(duplicates['duplicate'].sum())} ({dedup})")
+
+    # Find Налог codes that occur in more than one source, and where
+    with stage(profile, 'overlaps') as record:
+        code_index = {}
+        for codes in source_codes:
+            for code, entries in codes.items():
+                code_index.setdefault(code, []).extend(entries)
+        overlapping = find_overlaps(code_index)
+        record['rows'] = sum(len(entries) for entries in code_index.values())
+
+    if (incremental and list(saved) == ids and saved_options == options
+            and {os.path.abspath(path) for path in saved_outputs} == {os.path.abspath(path) for path in outputs}
+            and outputs_unchanged(saved_outputs)
+            and all(partition['status'] == UNCHANGED for partition in partitions)):
+        print(f"\nNo source changed since the last merge; {output_path} is up to date")
+        merge_order = np.argsort(np.concatenate([date_keys(run) for run in runs]), kind='stable')
+        combined_data = concat_ledgers(runs, sources).take(merge_order).reset_index(drop=True)
+        return combined_data, overlapping
+
+    # Match invoices (Побарува) to payments (Долгува) across all sources
+    total_rows = sum(len(run) for run in runs)
+    with stage(profile, 'invoices', total_rows):
+        _, invoice_groups = match_invoices(
+            pd.concat([run[[4, 5, 6, 7, 8]] for run in runs], ignore_index=True),
+            np.repeat(sources, [len(run) for run in runs])
+        )
+    if dedup == 'mark':
+        runs = [mark_duplicates(run, i, duplicates, sources) for i, run in enumerate(runs)]
+
+    # Remember where each merged row came from, so the combined table for
+    # the HTML viewer can be built after the rows are written
+    offsets = [0]
+    for run in runs[:-1]:
+        offsets.append(offsets[-1] + len(run))
+    positions = [0] * len(runs)
+    merge_order = []
+
+    def track_order(merged_rows):
+        for source_index, row in merged_rows:
+            merge_order.append(offsets[source_index] + positions[source_index])
+            positions[source_index] += 1
+            yield source_index, row
+
+    # Includes the k-way merge, which feeds the writer row by row
+    with stage(profile, 'xlsx_write', total_rows):
+        write_merged_workbook(
+            output_path, sources, company_codes, track_order(merge_sorted_runs(runs, sources)), overlapping,
+            invoice_groups
+        )
+
     print(f"\nMerged file saved to: {output_path}")
-    print(f"Total combined records: {len(combined_data)}")
+    print(f"Total combined records: {total_rows}")
+    print_source_totals(sources, [buckets['debit_sum'].sum() for buckets in source_buckets],
+                        [buckets['credit_sum'].sum() for buckets in source_buckets])
     print(f"Overlapping Налог codes: {len(overlapping)}")
     if overlapping:
         print(f"Codes: {sorted(overlapping)}")
 
-    # Prepare data for HTML
-    csv_columns = ["Налог", "Дата", "Вал", "м_ддв", "Опис", "Затворање", "Забелешка", "Долгува", "Побарува", "Един", "Извор"]
-    html_data = combined_data.copy()
-    html_data.columns = csv_columns
-    html_data['Дата'] = pd.to_datetime(html_data['Дата'], errors='coerce').dt.strftime('%Y-%m-%d')
+    status_counts = invoice_groups['status'].value_counts()
+    print(f"Invoices matched: {len(invoice_groups)} ("
+          + ", ".join(f"{STATUS_LABELS[status]}: {status_counts.get(status, 0)}" for status in STATUS_LABELS) + ")")
+
+    with stage(profile, 'json_write', len(overlapping)):
+        write_overlap_index(overlap_path, overlapping)
+    print(f"Overlap index saved to: {overlap_path}")
+
+    if duplicates is not None:
+        with stage(profile, 'json_write', len(duplicates)):
+            write_duplicate_index(duplicate_path, duplicates, sources)
+        print(f"Duplicate index saved to: {duplicate_path}")
+
+    with stage(profile, 'concat', total_rows):
+        # Combined table in merged order, for the HTML viewer and the caller
+        combined_data = concat_ledgers(runs, sources).take(merge_order).reset_index(drop=True)
 
-    # Generate HTML file in prototype folder
-    generate_html(html_data, source1, source2, overlapping)
+        # Summary buckets of all sources, from the per-source partitions
+        buckets = pd.concat(
+            [buckets.assign(source=i) for i, buckets in enumerate(source_buckets)],
+            ignore_index=True
+        )
+
+    with stage(profile, 'html_write', total_rows):
+        generate_html(viewer_rows(combined_data), sources, overlapping, compress_viewer, buckets, html_path,
+                      shard_by=shard_viewer)
+
+    if incremental:
+        with stage(profile, 'state_save', total_rows):
+            save_state(state_dir, partitions, outputs, options)
+        print(f"Merge state saved to: {state_dir}")
 
     return combined_data, overlapping
 
 
-def generate_html(data, source1, source2, overlapping):
-    """Generate interactive HTML file for accountants."""
+def merge_out_of_core(file_paths, output_path, chunk_rows=DEFAULT_CHUNK_ROWS, spill_dir=None, profile=None):
+    """
+    Merge ledgers too large for memory (see external_merge).
+    Each workbook is read chunk_rows rows at a time; every chunk is sorted
+    by date, its invoice and per-source totals are added up and it is
+    spilled as a sorted run to a temporary directory in spill_dir. The runs
+    are then merged straight into the output workbook, and the Налог code
+    index is gathered during that pass. The rows come out in
+    the same order as with merge_accounting_files.
+
+    Writes the merged workbook and <output>.overlaps.json, but no HTML
+    viewer, which embeds every row. Returns the number of rows written per
+    source and the overlapping Налог codes as {code: [(source, row), ...]}.
+    """
+    sources = [source_label(path) for path in file_paths]
+    company_codes = []
+    runs = []
+    invoice_parts = []
+    debit_totals = [0] * len(sources)
+    credit_totals = [0] * len(sources)
+
+    with tempfile.TemporaryDirectory(prefix='ledger-runs-', dir=spill_dir) as run_dir:
+        for source_index, (path, source) in enumerate(zip(file_paths, sources)):
+            layout, chunks = read_ledger_chunks(path, chunk_rows)
+            company_codes.append(layout['company'][0] if layout['company'] else None)
+            rows = 0
+            source_runs = 0
+            unparsed = 0
+            while True:
+                with stage(profile, 'read') as record:
+                    chunk = next(chunks, None)
+                    record['rows'] = 0 if chunk is None else len(chunk)
+                if chunk is None:
+                    break
+                with stage(profile, 'typing', len(chunk)):
+                    chunk = type_ledger(chunk)
+                unparsed += chunk.attrs['unparsed_dates']
+                with stage(profile, 'sort', len(chunk)):
+                    run = sort_ledger_rows(chunk)
+                with stage(profile, 'invoices', len(run)):
+                    invoice_parts.append(invoice_totals(find_invoice_numbers(run), run, np.repeat(source, len(run))))
+                    debit_totals[source_index] += int(to_cents(run[7]).sum())
+                    credit_totals[source_index] += int(to_cents(run[8]).sum())
+                with stage(profile, 'spill', len(run)):
+                    run_path = os.path.join(run_dir, f"{len(runs)}.arrow")
+                    spill_run(run_path, run)
+                runs.append((source_index, run_path))
+                rows += len(run)
+                source_runs += 1
+            print(f"Reading: {source} ({rows} rows, {layout['doc_type']}, {source_runs} sorted runs)")
+            if unparsed:
+                print(f"  {unparsed} Дата cells are not dates; their rows sort first")
+
+        with stage(profile, 'invoices'):
+            invoice_groups = settle_invoices(invoice_parts)
+
+        # Code index, filled in as the merged rows are written. Index entries
+        # are (source index, position in the source's sorted rows, sheet
+        # row), so they sort into the order of build_code_index.
+        code_index = {}
+        overlapping = {}
+        positions = [0] * len(sources)
+
+        def merged_rows():
+            for source_index, sheet_row, row in merge_runs(runs, lambda run, i: output_rows(run, sources[i])):
+                if row[0] is not None:
+                    code_index.setdefault(row[0], []).append((source_index, positions[source_index], int(sheet_row) + 1))
+                positions[source_index] += 1
+                yield source_index, row
+            shared = [(min(entries), code) for code, entries in code_index.items()
+                      if len({source_index for source_index, _, _ in entries}) > 1]
+            for _, code in sorted(shared):
+                overlapping[code] = [(sources[source_index], row) for source_index, _, row in sorted(code_index[code])]
+
+        with stage(profile, 'xlsx_write') as record:
+            source_counts = write_merged_workbook(
+                output_path, sources, company_codes, merged_rows(), overlapping, invoice_groups
+            )
+            record['rows'] = sum(source_counts)
+
+    print(f"\nMerged file saved to: {output_path}")
+    print(f"Total combined records: {sum(source_counts)}")
+    print_source_totals(sources, debit_totals, credit_totals)
+    print(f"Overlapping Налог codes: {len(overlapping)}")
+
+    status_counts = invoice_groups['status'].value_counts()
+    print(f"Invoices matched: {len(invoice_groups)} ("
+          + ", ".join(f"{STATUS_LABELS[status]}: {status_counts.get(status, 0)}" for status in STATUS_LABELS) + ")")
+
+    overlap_path = os.path.splitext(output_path)[0] + '.overlaps.json'
+    with stage(profile, 'json_write', len(overlapping)):
+        write_overlap_index(overlap_path, overlapping)
+    print(f"Overlap index saved to: {overlap_path}")
+    print("HTML viewer skipped: out-of-core merges do not hold the rows it embeds")
+    return source_counts, overlapping
 
-    # Convert data to JSON for JavaScript
-    data_json = data.to_json(orient='records', force_ascii=False)
 
-    html_content = f'''<!DOCTYPE html>
+def viewer_page(sources, overlap_count):
+    """
+    Static part of the HTML viewer, from the document head to the end of
+    the table, with the per-source styles, cards and filter options.
+    """
+    # Per-source styles and blocks, one per input file
+    source_css = ""
+    source_cards = ""
+    source_boxes = ""
+    source_options = ""
+    # Source labels are file names, which may hold < or &
+    labels = [html.escape(source) for source in sources]
+    for i, source in enumerate(labels):
+        row_bg, row_hover, accent, box_bg = HTML_SOURCE_COLORS[i % len(HTML_SOURCE_COLORS)]
+        source_css += f'''
+        tr.source-{i} {{ background: {row_bg}; }}
+        tr.source-{i}:hover {{ background: {row_hover}; }}
+        .badge-source-{i} {{ background: {accent}; color: white; }}
+        .card.source-card-{i} {{ border-left: 4px solid {accent}; }}
+        .stat-box.source-box-{i} {{ border-left-color: {accent}; background: {box_bg}; }}'''
+        source_cards += f'''
+        <div class="card source-card-{i}">
+            <h3>Записи од {source}</h3>
+            <div class="value" id="count-source-{i}">0</div>
+            <div class="subtitle">Побарува: <span id="sum-source-{i}">0</span> | Долгува: <span id="sum-dolgува-source-{i}">0</span></div>
+        </div>'''
+        source_boxes += f'''
+            <div class="stat-box source-box-{i}">
+                <div class="stat-label">Салдо {source}</div>
+                <div class="stat-value" id="balance-source-{i}">0</div>
+                <div class="stat-detail">Фактури: <span id="inv-source-{i}">0</span> | Плаќања: <span id="pay-source-{i}">0</span></div>
+            </div>'''
+        source_options += f'''
+                    <option value="{source}">{source}</option>'''
+
+    return f'''<!DOCTYPE html>
 <html lang="mk">
 <head>
     <meta charset="UTF-8">
@@ -280,7 +766,8 @@ def generate_html(data, source1, source2, overlapping):
             background: white;
             border-radius: 8px;
             box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            overflow: hidden;
+            overflow: auto;
+            max-height: 75vh;
         }}
         table {{
             width: 100%;
@@ -312,20 +799,19 @@ def generate_html(data, source1, source2, overlapping):
             border-bottom: 1px solid #eee;
             font-size: 13px;
         }}
-        tr:hover {{
-            background: #f8f9fa;
-        }}
-        tr.source-hami {{
-            background: #e8f4fc;
-        }}
-        tr.source-zubeks {{
-            background: #fef5e7;
+        tbody td {{
+            height: {VIEWER_ROW_HEIGHT}px;
+            max-width: 320px;
+            white-space: nowrap;
+            overflow: hidden;
+            text-overflow: ellipsis;
         }}
-        tr.source-hami:hover {{
-            background: #d4e9f7;
+        tr.spacer td {{
+            padding: 0;
+            border: none;
         }}
-        tr.source-zubeks:hover {{
-            background: #fdebd0;
+        tr:hover {{
+            background: #f8f9fa;
         }}
         .number {{
             text-align: right;
@@ -338,6 +824,9 @@ def generate_html(data, source1, source2, overlapping):
         }}
         .totals-row td {{
             border-bottom: none;
+            position: sticky;
+            bottom: 0;
+            background: #2c3e50;
         }}
         .badge {{
             display: inline-block;
@@ -346,14 +835,6 @@ def generate_html(data, source1, source2, overlapping):
             font-size: 11px;
             font-weight: 600;
         }}
-        .badge-hami {{
-            background: #3498db;
-            color: white;
-        }}
-        .badge-zubeks {{
-            background: #e67e22;
-            color: white;
-        }}
         .overlap-indicator {{
             color: #e74c3c;
             font-weight: bold;
@@ -363,6 +844,14 @@ def generate_html(data, source1, source2, overlapping):
             padding: 40px;
             color: #999;
         }}
+        .shard-status {{
+            margin-bottom: 10px;
+            color: #7f8c8d;
+            font-size: 13px;
+        }}
+        .shard-status:empty {{
+            display: none;
+        }}
         .export-btn {{
             background: #27ae60;
             color: white;
@@ -417,14 +906,6 @@ def generate_html(data, source1, source2, overlapping):
             border-left-color: #9b59b6;
             background: #f5eef8;
         }}
-        .stat-box.source1-box {{
-            border-left-color: #3498db;
-            background: #eaf2f8;
-        }}
-        .stat-box.source2-box {{
-            border-left-color: #e67e22;
-            background: #fef5e7;
-        }}
         .stat-label {{
             font-size: 12px;
             color: #666;
@@ -452,26 +933,16 @@ def generate_html(data, source1, source2, overlapping):
         }}
         .stat-value.negative {{
             color: #e74c3c;
-        }}
+        }}{source_css}
     </style>
 </head>
 <body>
     <div class="header">
         <h1>Сметководствена книга - Споени податоци</h1>
-        <p>Конто 2200: Обврски спрема добавувачи | {source1} + {source2}</p>
+        <p>Конто 2200: Обврски спрема добавувачи | {' + '.join(labels)}</p>
     </div>
 
-    <div class="summary-cards">
-        <div class="card blue">
-            <h3>Записи од {source1}</h3>
-            <div class="value" id="count-source1">0</div>
-            <div class="subtitle">Побарува: <span id="sum-source1">0</span> | Долгува: <span id="sum-dolgува-source1">0</span></div>
-        </div>
-        <div class="card orange">
-            <h3>Записи од {source2}</h3>
-            <div class="value" id="count-source2">0</div>
-            <div class="subtitle">Побарува: <span id="sum-source2">0</span> | Долгува: <span id="sum-dolgува-source2">0</span></div>
-        </div>
+    <div class="summary-cards">{source_cards}
         <div class="card green">
             <h3>Вкупно прикажани</h3>
             <div class="value" id="count-total">0</div>
@@ -479,8 +950,8 @@ def generate_html(data, source1, source2, overlapping):
         </div>
         <div class="card red">
             <h3>Преклопени кодови</h3>
-            <div class="value">{len(overlapping)}</div>
-            <div class="subtitle">Записи кои се појавуваат во двете датотеки</div>
+            <div class="value">{overlap_count}</div>
+            <div class="subtitle">Записи кои се појавуваат во повеќе датотеки</div>
         </div>
     </div>
 
@@ -508,17 +979,7 @@ def generate_html(data, source1, source2, overlapping):
                 <div class="stat-detail">Број на месеци: <span id="month-count">0</span></div>
             </div>
         </div>
-        <div class="stats-grid" style="margin-top: 15px;">
-            <div class="stat-box source1-box">
-                <div class="stat-label">Салдо {source1}</div>
-                <div class="stat-value" id="balance-source1">0</div>
-                <div class="stat-detail">Фактури: <span id="inv-source1">0</span> | Плаќања: <span id="pay-source1">0</span></div>
-            </div>
-            <div class="stat-box source2-box">
-                <div class="stat-label">Салдо {source2}</div>
-                <div class="stat-value" id="balance-source2">0</div>
-                <div class="stat-detail">Фактури: <span id="inv-source2">0</span> | Плаќања: <span id="pay-source2">0</span></div>
-            </div>
+        <div class="stats-grid" style="margin-top: 15px;">{source_boxes}
             <div class="stat-box">
                 <div class="stat-label">Просечна фактура</div>
                 <div class="stat-value" id="avg-invoice">0</div>
@@ -535,15 +996,13 @@ def generate_html(data, source1, source2, overlapping):
     <div class="controls">
         <div class="filters">
             <div class="filter-group">
-                <label>Пребарај (Налог, Опис)</label>
+                <label>Пребарај (Налог, Опис, Затворање, Забелешка)</label>
                 <input type="text" id="searchInput" placeholder="Внесете текст...">
             </div>
             <div class="filter-group">
                 <label>Извор</label>
                 <select id="sourceFilter">
-                    <option value="">Сите извори</option>
-                    <option value="{source1}">{source1}</option>
-                    <option value="{source2}">{source2}</option>
+                    <option value="">Сите извори</option>{source_options}
                 </select>
             </div>
             <div class="filter-group">
@@ -573,7 +1032,8 @@ def generate_html(data, source1, source2, overlapping):
         <button class="reset-btn" onclick="resetFilters()">Ресетирај филтри</button>
     </div>
 
-    <div class="table-container">
+    <div class="shard-status" id="shardStatus"></div>
+    <div class="table-container" id="tableContainer">
         <table id="dataTable">
             <thead>
                 <tr>
@@ -601,13 +1061,198 @@ def generate_html(data, source1, source2, overlapping):
         </table>
     </div>
 
-    <script>
-        const rawData = {data_json};
-        const overlappingCodes = {list(overlapping)};
-        const source1 = "{source1}";
-        const source2 = "{source2}";
+'''
+
+
+def write_viewer_data(f, sources, overlapping, buckets, manifest=None):
+    """
+    Write the script block with the viewer's sources, overlap index,
+    summary buckets and shard manifest (null unless sharded); the overlap
+    index is written one code at a time.
+    """
+    f.write('''    <script>
+        // Overlapping code -> [[source, row], ...]; lookups are O(1)
+        const overlapIndex = {''')
+    for i, (code, entries) in enumerate(overlapping.items()):
+        f.write((',' if i else '') + script_literal(str(code)) + ':'
+                + script_literal([[source, row] for source, row in entries]))
+    buckets_json = buckets.to_json(orient='records', force_ascii=False).replace('</', '<\\/')
+    f.write(f'''}};
+        const sources = {script_literal(sources)};
+        // Totals per (source, м.ддв, day), precomputed in Python
+        const summaryBuckets = {buckets_json};
+        // Shards of a sharded viewer: {{by, rows, shards: [{{key, file, rows}}, ...]}}
+        const shardManifest = {script_literal(manifest)};
+    </script>
+''')
+
+
+def viewer_script():
+    """The viewer's code: the last script block and the end of the page."""
+    return f'''    <script>
+        const overlappingCodes = new Set(Object.keys(overlapIndex));
+
+        function isOverlap(code) {{
+            return code !== null && code !== undefined && overlappingCodes.has(String(code));
+        }}
+
+        function overlapTitle(code) {{
+            return overlapIndex[String(code)].map(([source, row]) => source + ': ред ' + row).join(', ');
+        }}
+        const sourceIndex = Object.fromEntries(sources.map((s, i) => [s, i]));
+
+        const NUMBER_ARRAYS = {{ uint8: Uint8Array, uint16: Uint16Array, int32: Int32Array }};
+
+        function decodeBase64(text) {{
+            const binary = atob(text);
+            const bytes = new Uint8Array(binary.length);
+            for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+            return bytes;
+        }}
+
+        // A payload part as is, or unpacked from gzipped base64
+        async function decodePart(part) {{
+            if (typeof part !== 'string') return part;
+            const stream = new Blob([decodeBase64(part)]).stream().pipeThrough(new DecompressionStream('gzip'));
+            return JSON.parse(await new Response(stream).text());
+        }}
+
+        function loadPayload() {{
+            return Promise.all(payloadParts.map(decodePart));
+        }}
+
+        // Column access by name over payload parts; each column is decoded
+        // and joined the first time it is used. total is the number of rows
+        // of all parts, loaded or not, of a sharded viewer.
+        function makeTable(parts, total) {{
+            const starts = [];
+            let length = 0;
+            for (const part of parts) {{
+                starts.push(length);
+                length += part.length;
+            }}
+            const decoded = {{}};
+            const orders = {{}};
+
+            // Table rows ordered by a rank per row over all rows: each row
+            // goes in its rank's slot, then the empty slots are skipped
+            function placeRows(field, name) {{
+                const slots = new Int32Array(total === undefined ? length : total).fill(-1);
+                parts.forEach((part, i) => {{
+                    const ranks = new Int32Array(decodeBase64(name ? part[field][name] : part[field]).buffer);
+                    for (let r = 0; r < ranks.length; r++) slots[ranks[r]] = starts[i] + r;
+                }});
+                const order = new Int32Array(length);
+                let k = 0;
+                for (let slot = 0; slot < slots.length; slot++) {{
+                    if (slots[slot] >= 0) order[k++] = slots[slot];
+                }}
+                return order;
+            }}
+
+            return {{
+                length,
+                // Ascending row order of a column, or null if not precomputed
+                sortOrder(name) {{
+                    if (!parts.every(part => part.ranks[name])) return null;
+                    if (!(name in orders)) orders[name] = placeRows('ranks', name);
+                    return orders[name];
+                }},
+                // Rows in merged order, or null if the parts are in it
+                mergedOrder() {{
+                    if (!parts.some(part => part.rows)) return null;
+                    if (!orders.merged) orders.merged = placeRows('rows');
+                    return orders.merged;
+                }},
+                col(name) {{
+                    if (!(name in decoded)) {{
+                        if (parts.some(part => part.columns[name].kind === 'number')) {{
+                            const values = new Float64Array(length);
+                            parts.forEach((part, i) => values.set(new Float64Array(decodeBase64(part.columns[name].data).buffer), starts[i]));
+                            decoded[name] = values;
+                        }} else {{
+                            const values = [];
+                            for (const part of parts) {{
+                                const spec = part.columns[name];
+                                if (spec.kind === 'dictionary') {{
+                                    const codes = new NUMBER_ARRAYS[spec.type](decodeBase64(spec.codes).buffer);
+                                    for (const code of codes) values.push(spec.values[code]);
+                                }} else {{
+                                    for (const value of spec.values) values.push(value);
+                                }}
+                            }}
+                            decoded[name] = values;
+                        }}
+                    }}
+                    return decoded[name];
+                }},
+                // Search index per part: its first row, sorted terms, byte
+                // offsets and varint postings
+                searchIndex() {{
+                    if (!decoded.searchIndex) {{
+                        decoded.searchIndex = parts.map((part, i) => ({{
+                            start: starts[i],
+                            terms: part.search.terms,
+                            offsets: new Int32Array(decodeBase64(part.search.offsets).buffer),
+                            postings: decodeBase64(part.search.postings),
+                        }}));
+                    }}
+                    return decoded.searchIndex;
+                }},
+            }};
+        }}
 
-        let filteredData = [...rawData];
+        // Rows that have a word starting with every word of the query, as a
+        // 0/1 mask, or null if the query has no words
+        function searchMatches(query) {{
+            const words = query.toLowerCase().match(WORD_PATTERN);
+            if (!words) return null;
+            const index = table.searchIndex();
+
+            let matches = null;
+            for (const word of words) {{
+                const hits = new Uint8Array(table.length);
+                for (const {{ start, terms, offsets, postings }} of index) {{
+                    // First term >= word; the terms starting with word follow it
+                    let lo = 0, hi = terms.length;
+                    while (lo < hi) {{
+                        const mid = (lo + hi) >> 1;
+                        if (terms[mid] < word) lo = mid + 1; else hi = mid;
+                    }}
+                    for (let t = lo; t < terms.length && terms[t].startsWith(word); t++) {{
+                        let row = start;
+                        for (let p = offsets[t]; p < offsets[t + 1]; ) {{
+                            let delta = 0, shift = 0, byte;
+                            do {{
+                                byte = postings[p++];
+                                delta |= (byte & 0x7f) << shift;
+                                shift += 7;
+                            }} while (byte & 0x80);
+                            row += delta;
+                            hits[row] = 1;
+                        }}
+                    }}
+                }}
+                if (matches) {{
+                    for (let i = 0; i < matches.length; i++) matches[i] &= hits[i];
+                }} else {{
+                    matches = hits;
+                }}
+            }}
+            return matches;
+        }}
+
+        const ROW_HEIGHT = {VIEWER_ROW_HEIGHT};
+        // Rows rendered above and below the visible ones
+        const ROW_BUFFER = 20;
+        const SEARCH_DELAY_MS = 200;
+
+        // Words of a query, split and lowercased as in search_index.py
+        const WORD_PATTERN = /[\\p{{L}}\\p{{N}}]+/gu;
+
+        let table = null;
+        // Row numbers into table, in display order
+        let filteredData = [];
         let sortCol = 'Дата';
         let sortAsc = true;
 
@@ -616,13 +1261,20 @@ def generate_html(data, source1, source2, overlapping):
             return Number(num).toLocaleString('en-US');
         }}
 
+        // Долгува, Побарува and their sums are whole cents (see money.py),
+        // which add up exactly; they are shown in denars
+        function formatMoney(cents) {{
+            if (cents === null || cents === undefined) return '';
+            return formatNumber(cents / 100);
+        }}
+
         function parseNumber(val) {{
             if (val === null || val === undefined || val === '') return 0;
             return Number(val) || 0;
         }}
 
         function populateMonthFilter() {{
-            const months = [...new Set(rawData.map(r => r['м_ддв']).filter(m => m))].sort((a,b) => a-b);
+            const months = [...new Set(summaryBuckets.map(b => b.month).filter(m => m))].sort((a,b) => a-b);
             const select = document.getElementById('monthFilter');
             months.forEach(m => {{
                 const opt = document.createElement('option');
@@ -632,44 +1284,193 @@ def generate_html(data, source1, source2, overlapping):
             }});
         }}
 
+        function readFilters() {{
+            return {{
+                search: document.getElementById('searchInput').value.toLowerCase(),
+                source: document.getElementById('sourceFilter').value,
+                dateFrom: document.getElementById('dateFrom').value,
+                dateTo: document.getElementById('dateTo').value,
+                month: document.getElementById('monthFilter').value,
+                overlap: document.getElementById('overlapFilter').value,
+            }};
+        }}
+
+        // Source, date and month filters; these also select summary buckets
+        function matchesBucket(f, source, day, month) {{
+            if (f.source && source !== f.source) return false;
+            if (f.dateFrom && day < f.dateFrom) return false;
+            if (f.dateTo && day > f.dateTo) return false;
+            if (f.month && month != f.month) return false;
+            return true;
+        }}
+
+        // Sharded viewer (see shard_rows in viewer_payload.py): each shard's
+        // script calls shardLoaded with its payload parts. Without search or
+        // overlap filters and in date order, the rows of the shards loaded so
+        // far are shown and the next shard is loaded when the table is
+        // scrolled to its end; otherwise every shard the filters can match
+        // is loaded first, so that rows and totals are complete. The summary
+        // cards come from the buckets and need no shard.
+        const shardParts = shardManifest ? shardManifest.shards.map(() => null) : [];
+        const shardLoads = {{}};
+        let tableShards = '';
+        let shardRequest = 0;
+
+        function shardLoaded(index, parts) {{
+            shardLoads[index].resolve(parts);
+        }}
+
+        function loadShard(index) {{
+            if (!shardLoads[index]) {{
+                const load = {{}};
+                load.promise = new Promise(resolve => {{ load.resolve = resolve; }})
+                    .then(parts => Promise.all(parts.map(decodePart)))
+                    .then(parts => {{ shardParts[index] = parts; }});
+                shardLoads[index] = load;
+                const script = document.createElement('script');
+                script.src = shardManifest.shards[index].file;
+                script.onerror = () => {{
+                    document.getElementById('shardStatus').textContent = 'Не може да се вчита ' + script.src;
+                }};
+                document.body.appendChild(script);
+            }}
+            return shardLoads[index].promise;
+        }}
+
+        // Shards with rows the source, date and month filters match, by the summary buckets
+        function candidateShards(f) {{
+            const keys = new Set();
+            summaryBuckets.forEach(b => {{
+                if (matchesBucket(f, sources[b.source], b.day, b.month)) {{
+                    keys.add(String(shardManifest.by === 'month' ? b.month : b.source));
+                }}
+            }});
+            return shardManifest.shards.map((shard, i) => i).filter(i => keys.has(String(shardManifest.shards[i].key)));
+        }}
+
+        function showsAllRows(f) {{
+            return Boolean(f.search || f.overlap) || sortCol !== 'Дата' || !sortAsc;
+        }}
+
+        // Table of all loaded shards, rebuilt when a shard was added
+        function useLoadedShards() {{
+            const loaded = shardParts.map((parts, i) => i).filter(i => shardParts[i]);
+            if (loaded.join() === tableShards) return;
+            tableShards = loaded.join();
+            table = makeTable(loaded.flatMap(i => shardParts[i]), shardManifest.rows);
+        }}
+
+        function showShardStatus(f, loading) {{
+            const candidates = candidateShards(f);
+            const loaded = candidates.filter(i => shardParts[i]).length;
+            document.getElementById('shardStatus').textContent = loading ? 'Се вчитуваат записите…'
+                : loaded < candidates.length
+                ? `Прикажани се записите од ${{loaded}} од ${{candidates.length}} делови; лизгајте надолу за повеќе` : '';
+        }}
+
+        // Whether the shards the filters need are loaded; if not, they are
+        // loaded and the filters applied again, and only the summary cards
+        // are updated meanwhile
+        function shardsLoaded(f) {{
+            const candidates = candidateShards(f);
+            let needed = candidates;
+            if (!showsAllRows(f)) needed = candidates.some(i => shardParts[i]) ? [] : candidates.slice(0, 1);
+            const missing = needed.filter(i => !shardParts[i]);
+            const request = ++shardRequest;
+            if (missing.length === 0) {{
+                useLoadedShards();
+                return true;
+            }}
+            showShardStatus(f, true);
+            if (!f.search && !f.overlap) updateSummary(f);
+            Promise.all(missing.map(loadShard)).then(() => {{
+                if (request === shardRequest) applyFilters();
+            }});
+            return false;
+        }}
+
+        // Load the next shard once the rows shown from part of the shards
+        // are scrolled to their end
+        function loadMoreRows() {{
+            const f = readFilters();
+            const container = document.getElementById('tableContainer');
+            if (showsAllRows(f)) return;
+            if (container.scrollTop + container.clientHeight < (filteredData.length - ROW_BUFFER) * ROW_HEIGHT) return;
+            const next = candidateShards(f).find(i => !shardParts[i]);
+            if (next === undefined || shardLoads[next]) return;
+            const request = shardRequest;
+            loadShard(next).then(() => {{
+                if (request !== shardRequest) return;
+                useLoadedShards();
+                showRows(readFilters(), true);
+            }});
+        }}
+
         function applyFilters() {{
-            const search = document.getElementById('searchInput').value.toLowerCase();
-            const source = document.getElementById('sourceFilter').value;
-            const dateFrom = document.getElementById('dateFrom').value;
-            const dateTo = document.getElementById('dateTo').value;
-            const month = document.getElementById('monthFilter').value;
-            const overlap = document.getElementById('overlapFilter').value;
-
-            filteredData = rawData.filter(row => {{
+            const f = readFilters();
+            if (shardManifest && !shardsLoaded(f)) return;
+            showRows(f, false);
+        }}
+
+        // Filter, sort and show the rows of the table; keepScroll keeps the
+        // scroll position, when rows of another shard were added
+        function showRows(f, keepScroll) {{
+            const nalogs = table.col('Налог');
+            const matches = f.search ? searchMatches(f.search) : null;
+            // Queries without letters or digits fall back to a substring scan
+            const descriptions = f.search && !matches ? table.col('Опис') : null;
+            const sourceCol = table.col('Извор');
+            const days = table.col('Дата');
+            const months = table.col('м_ддв');
+
+            const merged = table.mergedOrder();
+
+            filteredData = [];
+            for (let k = 0; k < table.length; k++) {{
+                const row = merged ? merged[k] : k;
                 // Search filter
-                if (search) {{
-                    const nalog = (row['Налог'] || '').toLowerCase();
-                    const opis = (row['Опис'] || '').toLowerCase();
-                    if (!nalog.includes(search) && !opis.includes(search)) return false;
+                if (matches) {{
+                    if (!matches[row]) continue;
+                }} else if (f.search) {{
+                    const nalog = String(nalogs[row] || '').toLowerCase();
+                    const opis = String(descriptions[row] || '').toLowerCase();
+                    if (!nalog.includes(f.search) && !opis.includes(f.search)) continue;
                 }}
-                // Source filter
-                if (source && row['Извор'] !== source) return false;
-                // Date filters
-                if (dateFrom && row['Дата'] < dateFrom) return false;
-                if (dateTo && row['Дата'] > dateTo) return false;
-                // Month filter
-                if (month && row['м_ддв'] != month) return false;
+                if (!matchesBucket(f, sourceCol[row], days[row], months[row])) continue;
                 // Overlap filter
-                if (overlap === 'yes' && !overlappingCodes.includes(row['Налог'])) return false;
-                if (overlap === 'no' && overlappingCodes.includes(row['Налог'])) return false;
+                if (f.overlap === 'yes' && !isOverlap(nalogs[row])) continue;
+                if (f.overlap === 'no' && isOverlap(nalogs[row])) continue;
 
-                return true;
-            }});
+                filteredData.push(row);
+            }}
 
             sortData();
+            if (!keepScroll) document.getElementById('tableContainer').scrollTop = 0;
             renderTable();
-            updateSummary();
+            updateSummary(f);
+            if (shardManifest) showShardStatus(f, false);
         }}
 
         function sortData() {{
+            // Precomputed orders: keep the filtered rows in that order
+            const order = table.sortOrder(sortCol);
+            if (order) {{
+                const keep = new Uint8Array(table.length);
+                for (const row of filteredData) keep[row] = 1;
+                const sorted = [];
+                if (sortAsc) {{
+                    for (let k = 0; k < order.length; k++) if (keep[order[k]]) sorted.push(order[k]);
+                }} else {{
+                    for (let k = order.length - 1; k >= 0; k--) if (keep[order[k]]) sorted.push(order[k]);
+                }}
+                filteredData = sorted;
+                return;
+            }}
+
+            const values = table.col(sortCol);
             filteredData.sort((a, b) => {{
-                let valA = a[sortCol];
-                let valB = b[sortCol];
+                let valA = values[a];
+                let valB = values[b];
 
                 // Handle numbers
                 if (sortCol === 'Долгува' || sortCol === 'Побарува' || sortCol === 'м_ддв') {{
@@ -683,7 +1484,17 @@ def generate_html(data, source1, source2, overlapping):
             }});
         }}
 
-        function renderTable() {{
+        function escapeHtml(value) {{
+            return String(value).replace(/[&<>"]/g, c => ({{ '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;' }})[c]);
+        }}
+
+        function spacerRow(height) {{
+            return height > 0 ? `<tr class="spacer"><td colspan="9" style="height: ${{height}}px"></td></tr>` : '';
+        }}
+
+        // Render only the rows in view plus ROW_BUFFER on each side; spacer
+        // rows keep the scroll height of the full list
+        function renderRows() {{
             const tbody = document.getElementById('tableBody');
 
             if (filteredData.length === 0) {{
@@ -691,25 +1502,40 @@ def generate_html(data, source1, source2, overlapping):
                 return;
             }}
 
-            tbody.innerHTML = filteredData.map(row => {{
-                const isOverlap = overlappingCodes.includes(row['Налог']);
-                const sourceClass = row['Извор'] === source1 ? 'source-hami' : 'source-zubeks';
-                const badgeClass = row['Извор'] === source1 ? 'badge-hami' : 'badge-zubeks';
+            const container = document.getElementById('tableContainer');
+            const first = Math.max(0, Math.floor(container.scrollTop / ROW_HEIGHT) - ROW_BUFFER);
+            const last = Math.min(filteredData.length,
+                Math.ceil((container.scrollTop + container.clientHeight) / ROW_HEIGHT) + ROW_BUFFER);
+
+            const col = Object.fromEntries(
+                ['Налог', 'Дата', 'м_ддв', 'Опис', 'Затворање', 'Забелешка', 'Долгува', 'Побарува', 'Извор'].map(name => [name, table.col(name)])
+            );
+            const cell = value => escapeHtml(value || '');
+            tbody.innerHTML = spacerRow(first * ROW_HEIGHT) + filteredData.slice(first, last).map(i => {{
+                const row = name => col[name][i];
+                const overlapMark = isOverlap(row('Налог'))
+                    ? `<span class="overlap-indicator" title="${{escapeHtml(overlapTitle(row('Налог')))}}">*</span>` : '';
+                const sourceClass = 'source-' + sourceIndex[row('Извор')];
+                const badgeClass = 'badge-source-' + sourceIndex[row('Извор')];
 
                 return `
                     <tr class="${{sourceClass}}">
-                        <td>${{row['Налог'] || ''}} ${{isOverlap ? '<span class="overlap-indicator">*</span>' : ''}}</td>
-                        <td>${{row['Дата'] || ''}}</td>
-                        <td>${{row['м_ддв'] || ''}}</td>
-                        <td>${{row['Опис'] || ''}}</td>
-                        <td>${{row['Затворање'] || ''}}</td>
-                        <td>${{row['Забелешка'] || ''}}</td>
-                        <td class="number">${{formatNumber(row['Долгува'])}}</td>
-                        <td class="number">${{formatNumber(row['Побарува'])}}</td>
-                        <td><span class="badge ${{badgeClass}}">${{row['Извор']}}</span></td>
+                        <td>${{cell(row('Налог'))}} ${{overlapMark}}</td>
+                        <td>${{cell(row('Дата'))}}</td>
+                        <td>${{cell(row('м_ддв'))}}</td>
+                        <td title="${{cell(row('Опис'))}}">${{cell(row('Опис'))}}</td>
+                        <td>${{cell(row('Затворање'))}}</td>
+                        <td>${{cell(row('Забелешка'))}}</td>
+                        <td class="number">${{formatMoney(row('Долгува'))}}</td>
+                        <td class="number">${{formatMoney(row('Побарува'))}}</td>
+                        <td><span class="badge ${{badgeClass}}">${{cell(row('Извор'))}}</span></td>
                     </tr>
                 `;
-            }}).join('');
+            }}).join('') + spacerRow((filteredData.length - last) * ROW_HEIGHT);
+        }}
+
+        function renderTable() {{
+            renderRows();
 
             // Update column header styles
             document.querySelectorAll('th').forEach(th => {{
@@ -723,83 +1549,126 @@ def generate_html(data, source1, source2, overlapping):
             }});
         }}
 
-        function updateSummary() {{
-            const source1Data = filteredData.filter(r => r['Извор'] === source1);
-            const source2Data = filteredData.filter(r => r['Извор'] === source2);
+        // Summary totals, filled from buckets (or rows, see rowBucket)
+        function emptyTotals() {{
+            return {{
+                count: 0, debitSum: 0, creditSum: 0,
+                paymentCount: 0, paymentSum: 0, paymentMin: Infinity, paymentMax: -Infinity,
+                invoiceCount: 0, invoiceSum: 0, invoiceMin: Infinity, invoiceMax: -Infinity,
+                firstDay: null, lastDay: null, months: new Set(),
+                bySource: sources.map(() => ({{ count: 0, debitSum: 0, creditSum: 0, paymentCount: 0, invoiceCount: 0 }})),
+            }};
+        }}
 
-            // Basic counts
-            document.getElementById('count-source1').textContent = source1Data.length;
-            document.getElementById('count-source2').textContent = source2Data.length;
-            document.getElementById('count-total').textContent = filteredData.length;
+        function addBucket(t, b) {{
+            t.count += b.count;
+            t.debitSum += b.debit_sum;
+            t.creditSum += b.credit_sum;
+            if (b.payment_count > 0) {{
+                t.paymentCount += b.payment_count;
+                t.paymentSum += b.payment_sum;
+                t.paymentMin = Math.min(t.paymentMin, b.payment_min);
+                t.paymentMax = Math.max(t.paymentMax, b.payment_max);
+            }}
+            if (b.invoice_count > 0) {{
+                t.invoiceCount += b.invoice_count;
+                t.invoiceSum += b.invoice_sum;
+                t.invoiceMin = Math.min(t.invoiceMin, b.invoice_min);
+                t.invoiceMax = Math.max(t.invoiceMax, b.invoice_max);
+            }}
+            if (b.day) {{
+                if (t.firstDay === null || b.day < t.firstDay) t.firstDay = b.day;
+                if (t.lastDay === null || b.day > t.lastDay) t.lastDay = b.day;
+            }}
+            if (b.month) t.months.add(b.month);
+
+            const s = t.bySource[b.source];
+            s.count += b.count;
+            s.debitSum += b.debit_sum;
+            s.creditSum += b.credit_sum;
+            s.paymentCount += b.payment_count;
+            s.invoiceCount += b.invoice_count;
+        }}
 
-            // Calculate sums
-            const sumDolgува = filteredData.reduce((sum, r) => sum + parseNumber(r['Долгува']), 0);
-            const sumPobarува = filteredData.reduce((sum, r) => sum + parseNumber(r['Побарува']), 0);
-            const sumSource1Pob = source1Data.reduce((sum, r) => sum + parseNumber(r['Побарува']), 0);
-            const sumSource2Pob = source2Data.reduce((sum, r) => sum + parseNumber(r['Побарува']), 0);
-            const sumSource1Dol = source1Data.reduce((sum, r) => sum + parseNumber(r['Долгува']), 0);
-            const sumSource2Dol = source2Data.reduce((sum, r) => sum + parseNumber(r['Долгува']), 0);
+        // A single row as a bucket, for filters the buckets cannot answer
+        function rowBucket(row) {{
+            const debit = parseNumber(table.col('Долгува')[row]);
+            const credit = parseNumber(table.col('Побарува')[row]);
+            return {{
+                source: sourceIndex[table.col('Извор')[row]], month: table.col('м_ддв')[row], day: table.col('Дата')[row],
+                count: 1, debit_sum: debit, credit_sum: credit,
+                payment_count: debit > 0 ? 1 : 0, payment_sum: debit, payment_min: debit, payment_max: debit,
+                invoice_count: credit > 0 ? 1 : 0, invoice_sum: credit, invoice_min: credit, invoice_max: credit,
+            }};
+        }}
+
+        function summaryTotals(f) {{
+            const totals = emptyTotals();
+            if (f.search || f.overlap) {{
+                filteredData.forEach(row => addBucket(totals, rowBucket(row)));
+            }} else {{
+                summaryBuckets.forEach(b => {{
+                    if (matchesBucket(f, sources[b.source], b.day, b.month)) addBucket(totals, b);
+                }});
+            }}
+            return totals;
+        }}
+
+        function updateSummary(f) {{
+            const t = summaryTotals(f);
+            document.getElementById('count-total').textContent = t.count;
+
+            // Per-source counts, sums and balances
+            sources.forEach((source, i) => {{
+                const s = t.bySource[i];
+                const balanceSource = s.creditSum - s.debitSum;
+
+                document.getElementById('count-source-' + i).textContent = s.count;
+                document.getElementById('sum-source-' + i).textContent = formatMoney(s.creditSum);
+                document.getElementById('sum-dolgува-source-' + i).textContent = formatMoney(s.debitSum);
+
+                const balEl = document.getElementById('balance-source-' + i);
+                balEl.textContent = formatMoney(balanceSource);
+                balEl.className = 'stat-value ' + (balanceSource > 0 ? 'negative' : balanceSource < 0 ? 'positive' : '');
+
+                document.getElementById('inv-source-' + i).textContent = s.invoiceCount;
+                document.getElementById('pay-source-' + i).textContent = s.paymentCount;
+            }});
 
             // Update card summaries
-            document.getElementById('sum-dolgува').textContent = formatNumber(sumDolgува);
-            document.getElementById('sum-pobarува').textContent = formatNumber(sumPobarува);
-            document.getElementById('sum-source1').textContent = formatNumber(sumSource1Pob);
-            document.getElementById('sum-source2').textContent = formatNumber(sumSource2Pob);
-            document.getElementById('sum-dolgува-source1').textContent = formatNumber(sumSource1Dol);
-            document.getElementById('sum-dolgува-source2').textContent = formatNumber(sumSource2Dol);
-            document.getElementById('total-dolgува').textContent = formatNumber(sumDolgува);
-            document.getElementById('total-pobarува').textContent = formatNumber(sumPobarува);
+            document.getElementById('sum-dolgува').textContent = formatMoney(t.debitSum);
+            document.getElementById('sum-pobarува').textContent = formatMoney(t.creditSum);
+            document.getElementById('total-dolgува').textContent = formatMoney(t.debitSum);
+            document.getElementById('total-pobarува').textContent = formatMoney(t.creditSum);
 
             // Invoices (Побарува > 0) and Payments (Долгува > 0)
-            const invoices = filteredData.filter(r => parseNumber(r['Побарува']) > 0);
-            const payments = filteredData.filter(r => parseNumber(r['Долгува']) > 0);
-
-            document.getElementById('total-invoices').textContent = formatNumber(sumPobarува);
-            document.getElementById('invoice-count').textContent = invoices.length;
-            document.getElementById('total-payments').textContent = formatNumber(sumDolgува);
-            document.getElementById('payment-count').textContent = payments.length;
+            document.getElementById('total-invoices').textContent = formatMoney(t.creditSum);
+            document.getElementById('invoice-count').textContent = t.invoiceCount;
+            document.getElementById('total-payments').textContent = formatMoney(t.debitSum);
+            document.getElementById('payment-count').textContent = t.paymentCount;
 
             // Balance
-            const balance = sumPobarува - sumDolgува;
+            const balance = t.creditSum - t.debitSum;
             const balanceEl = document.getElementById('balance');
-            balanceEl.textContent = formatNumber(balance);
+            balanceEl.textContent = formatMoney(balance);
             balanceEl.className = 'stat-value ' + (balance > 0 ? 'negative' : balance < 0 ? 'positive' : '');
             document.getElementById('balance-status').textContent = balance > 0 ? 'Неподмирено задолжување' : balance < 0 ? 'Преплата' : 'Подмирено';
 
-            // Source balances
-            const balanceSource1 = sumSource1Pob - sumSource1Dol;
-            const balanceSource2 = sumSource2Pob - sumSource2Dol;
-            const bal1El = document.getElementById('balance-source1');
-            const bal2El = document.getElementById('balance-source2');
-            bal1El.textContent = formatNumber(balanceSource1);
-            bal2El.textContent = formatNumber(balanceSource2);
-            bal1El.className = 'stat-value ' + (balanceSource1 > 0 ? 'negative' : balanceSource1 < 0 ? 'positive' : '');
-            bal2El.className = 'stat-value ' + (balanceSource2 > 0 ? 'negative' : balanceSource2 < 0 ? 'positive' : '');
-
-            // Invoice/payment counts per source
-            document.getElementById('inv-source1').textContent = source1Data.filter(r => parseNumber(r['Побарува']) > 0).length;
-            document.getElementById('pay-source1').textContent = source1Data.filter(r => parseNumber(r['Долгува']) > 0).length;
-            document.getElementById('inv-source2').textContent = source2Data.filter(r => parseNumber(r['Побарува']) > 0).length;
-            document.getElementById('pay-source2').textContent = source2Data.filter(r => parseNumber(r['Долгува']) > 0).length;
-
             // Average, min, max for invoices
-            const invAmounts = invoices.map(r => parseNumber(r['Побарува'])).filter(v => v > 0);
-            const payAmounts = payments.map(r => parseNumber(r['Долгува'])).filter(v => v > 0);
-
-            if (invAmounts.length > 0) {{
-                document.getElementById('avg-invoice').textContent = formatNumber(Math.round(invAmounts.reduce((a,b) => a+b, 0) / invAmounts.length));
-                document.getElementById('min-invoice').textContent = formatNumber(Math.min(...invAmounts));
-                document.getElementById('max-invoice').textContent = formatNumber(Math.max(...invAmounts));
+            if (t.invoiceCount > 0) {{
+                document.getElementById('avg-invoice').textContent = formatNumber(Math.round(t.invoiceSum / t.invoiceCount / 100));
+                document.getElementById('min-invoice').textContent = formatMoney(t.invoiceMin);
+                document.getElementById('max-invoice').textContent = formatMoney(t.invoiceMax);
             }} else {{
                 document.getElementById('avg-invoice').textContent = '0';
                 document.getElementById('min-invoice').textContent = '0';
                 document.getElementById('max-invoice').textContent = '0';
             }}
 
-            if (payAmounts.length > 0) {{
-                document.getElementById('avg-payment').textContent = formatNumber(Math.round(payAmounts.reduce((a,b) => a+b, 0) / payAmounts.length));
-                document.getElementById('min-payment').textContent = formatNumber(Math.min(...payAmounts));
-                document.getElementById('max-payment').textContent = formatNumber(Math.max(...payAmounts));
+            if (t.paymentCount > 0) {{
+                document.getElementById('avg-payment').textContent = formatNumber(Math.round(t.paymentSum / t.paymentCount / 100));
+                document.getElementById('min-payment').textContent = formatMoney(t.paymentMin);
+                document.getElementById('max-payment').textContent = formatMoney(t.paymentMax);
             }} else {{
                 document.getElementById('avg-payment').textContent = '0';
                 document.getElementById('min-payment').textContent = '0';
@@ -807,16 +1676,14 @@ def generate_html(data, source1, source2, overlapping):
             }}
 
             // Date range
-            const dates = filteredData.map(r => r['Дата']).filter(d => d).sort();
-            if (dates.length > 0) {{
-                document.getElementById('date-range').textContent = dates[0] + ' - ' + dates[dates.length - 1];
+            if (t.firstDay !== null) {{
+                document.getElementById('date-range').textContent = t.firstDay + ' - ' + t.lastDay;
             }} else {{
                 document.getElementById('date-range').textContent = '-';
             }}
 
             // Month count
-            const months = [...new Set(filteredData.map(r => r['м_ддв']).filter(m => m))];
-            document.getElementById('month-count').textContent = months.length;
+            document.getElementById('month-count').textContent = t.months.size;
         }}
 
         function resetFilters() {{
@@ -830,12 +1697,28 @@ def generate_html(data, source1, source2, overlapping):
         }}
 
         function exportFiltered() {{
+            // Rows of shards not loaded yet are loaded first
+            if (shardManifest) {{
+                const f = readFilters();
+                const missing = candidateShards(f).filter(i => !shardParts[i]);
+                if (missing.length) {{
+                    showShardStatus(f, true);
+                    Promise.all(missing.map(loadShard)).then(() => {{
+                        useLoadedShards();
+                        showRows(f, true);
+                        exportFiltered();
+                    }});
+                    return;
+                }}
+            }}
             const headers = ['Налог', 'Дата', 'Вал', 'м_ддв', 'Опис', 'Затворање', 'Забелешка', 'Долгува', 'Побарува', 'Един', 'Извор'];
+            const money = ['Долгува', 'Побарува'];
             const csvContent = [
                 headers.join(','),
                 ...filteredData.map(row =>
                     headers.map(h => {{
-                        let val = row[h] || '';
+                        let val = table.col(h)[row] || '';
+                        if (val !== '' && money.includes(h)) val = val / 100;
                         if (typeof val === 'string' && (val.includes(',') || val.includes('"'))) {{
                             val = '"' + val.replace(/"/g, '""') + '"';
                         }}
@@ -851,46 +1734,245 @@ def generate_html(data, source1, source2, overlapping):
             link.click();
         }}
 
-        // Event listeners
-        document.getElementById('searchInput').addEventListener('input', applyFilters);
-        document.getElementById('sourceFilter').addEventListener('change', applyFilters);
-        document.getElementById('dateFrom').addEventListener('change', applyFilters);
-        document.getElementById('dateTo').addEventListener('change', applyFilters);
-        document.getElementById('monthFilter').addEventListener('change', applyFilters);
-        document.getElementById('overlapFilter').addEventListener('change', applyFilters);
+        function init() {{
+            // Event listeners; typing only filters once it pauses
+            let searchTimer = null;
+            document.getElementById('searchInput').addEventListener('input', () => {{
+                clearTimeout(searchTimer);
+                searchTimer = setTimeout(applyFilters, SEARCH_DELAY_MS);
+            }});
+            document.getElementById('sourceFilter').addEventListener('change', applyFilters);
+            document.getElementById('dateFrom').addEventListener('change', applyFilters);
+            document.getElementById('dateTo').addEventListener('change', applyFilters);
+            document.getElementById('monthFilter').addEventListener('change', applyFilters);
+            document.getElementById('overlapFilter').addEventListener('change', applyFilters);
+
+            // Re-render the visible window at most once per frame while scrolling
+            let renderPending = false;
+            document.getElementById('tableContainer').addEventListener('scroll', () => {{
+                if (renderPending) return;
+                renderPending = true;
+                requestAnimationFrame(() => {{
+                    renderPending = false;
+                    renderRows();
+                    if (shardManifest) loadMoreRows();
+                }});
+            }});
 
-        document.querySelectorAll('th[data-col]').forEach(th => {{
-            th.addEventListener('click', () => {{
-                const col = th.dataset.col;
-                if (sortCol === col) {{
-                    sortAsc = !sortAsc;
-                }} else {{
-                    sortCol = col;
-                    sortAsc = true;
-                }}
-                sortData();
-                renderTable();
+            document.querySelectorAll('th[data-col]').forEach(th => {{
+                th.addEventListener('click', () => {{
+                    const col = th.dataset.col;
+                    if (sortCol === col) {{
+                        sortAsc = !sortAsc;
+                    }} else {{
+                        sortCol = col;
+                        sortAsc = true;
+                    }}
+                    // A sharded viewer may need more shards for the new order
+                    if (shardManifest) {{
+                        applyFilters();
+                        return;
+                    }}
+                    sortData();
+                    renderTable();
+                }});
             }});
-        }});
 
-        // Initialize
-        populateMonthFilter();
-        applyFilters();
+            populateMonthFilter();
+            applyFilters();
+        }}
+
+        loadPayload().then(parts => {{
+            table = makeTable(parts);
+            init();
+        }});
     </script>
 </body>
 </html>
 '''
 
-    with open('accounting_viewer.html', 'w', encoding='utf-8') as f:
-        f.write(html_content)
-    print(f"HTML viewer saved to: accounting_viewer.html")
 
+def write_viewer(f, data, sources, overlapping, compress=False, buckets=None, part_rows=PART_ROWS):
+    """
+    Stream the HTML viewer to the text file f: the static page, then the
+    rows as payload parts of up to part_rows rows (see viewer_payload),
+    each in its own script block and encoded just before it is written,
+    then the viewer data and code. Memory for the page stays at about one
+    part, whatever the number of rows.
+    """
+    if buckets is None:
+        buckets = summary_buckets(data, sources)
+    f.write(viewer_page(sources, len(overlapping)))
+    f.write(f'''    <script>
+        // Columnar rows (see viewer_payload.py) in parts of up to {part_rows}
+        // rows; each a JSON object, or a base64 string of the gzipped JSON
+        const payloadParts = [];
+    </script>
+''')
+    for part in payload_parts(data, compress, part_rows):
+        f.write('    <script>payloadParts.push(')
+        f.write(part)
+        f.write(');</script>\n')
+    write_viewer_data(f, sources, overlapping, buckets)
+    f.write(viewer_script())
 
-if __name__ == "__main__":
-    # Define file paths (source files are in source data folder)
-    file1 = "source data/Hami stam.xlsx"
-    file2 = "source data/Zubeks.xlsx"
-    output = "Merged_Accounting.xlsx"
 
-    # Run merge
-    combined, overlaps = merge_accounting_files(file1, file2, output)
+def write_sharded_viewer(html_path, data, sources, overlapping, shard_by, compress=False, buckets=None,
+                         part_rows=PART_ROWS):
+    """
+    Write a sharded HTML viewer: an index page at html_path with the
+    summary buckets and a manifest of the shards, and one script per
+    shard of the rows by shard_by, 'month' (м.ддв) or 'source' (see
+    viewer_payload.shard_rows), in <html_path stem>_shards next to it.
+    The viewer loads a shard's script only when a filter or scrolling
+    needs its rows. Returns the shard directory.
+    """
+    if buckets is None:
+        buckets = summary_buckets(data, sources)
+    shard_dir = os.path.splitext(html_path)[0] + '_shards'
+    os.makedirs(shard_dir, exist_ok=True)
+    for name in os.listdir(shard_dir):
+        if name.startswith('shard-') and name.endswith('.js'):
+            os.remove(os.path.join(shard_dir, name))
+
+    # Ranks are over all rows, so the viewer can order rows of any shards
+    ranks = sort_ranks(data)
+    manifest = {'by': shard_by, 'rows': len(data), 'shards': []}
+    for i, (key, rows) in enumerate(shard_rows(data, sources, shard_by)):
+        name = f'shard-{i}.js'
+        with open(os.path.join(shard_dir, name), 'w', encoding='utf-8') as f:
+            f.write(f'shardLoaded({i}, [\n')
+            parts = payload_parts(data.take(rows), compress, part_rows,
+                                  {column: rank[rows] for column, rank in ranks.items()}, rows)
+            for j, part in enumerate(parts):
+                f.write(',\n' if j else '')
+                f.write(part)
+            f.write('\n]);\n')
+        manifest['shards'].append({
+            'key': key, 'file': f'{os.path.basename(shard_dir)}/{name}', 'rows': len(rows),
+        })
+
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(viewer_page(sources, len(overlapping)))
+        f.write('''    <script>
+        // Rows are in the shards of shardManifest
+        const payloadParts = [];
+    </script>
+''')
+        write_viewer_data(f, sources, overlapping, buckets, manifest)
+        f.write(viewer_script())
+    return shard_dir
+
+
+def generate_html(data, sources, overlapping, compress=False, buckets=None, html_path='accounting_viewer.html',
+                  part_rows=PART_ROWS, shard_by=None):
+    """
+    Generate interactive HTML file for accountants at html_path, a path
+    or a text file object, streamed by write_viewer. The rows are
+    embedded as a columnar payload (see viewer_payload), gzip compressed
+    with compress. buckets are the summary buckets of the rows (see
+    ledger_summary), computed here when not given. With shard_by,
+    'month' or 'source', html_path must be a path and the rows go to
+    shards next to it instead (see write_sharded_viewer).
+    """
+    if shard_by is not None:
+        if hasattr(html_path, 'write'):
+            raise ValueError("A sharded viewer needs a path, not a file object")
+        shard_dir = write_sharded_viewer(html_path, data, sources, overlapping, shard_by, compress, buckets,
+                                         part_rows)
+        print(f"HTML viewer saved to: {html_path} (shards by {shard_by} in {shard_dir})")
+        return
+    if hasattr(html_path, 'write'):
+        write_viewer(html_path, data, sources, overlapping, compress, buckets, part_rows)
+        return
+    with open(html_path, 'w', encoding='utf-8') as f:
+        write_viewer(f, data, sources, overlapping, compress, buckets, part_rows)
+    print(f"HTML viewer saved to: {html_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge accounting ledger Excel files into one workbook.")
+    # Source files are in the source data folder by default
+    parser.add_argument('files', nargs='*', default=["source data/Hami stam.xlsx", "source data/Zubeks.xlsx"],
+                        help="ledger workbooks to merge")
+    parser.add_argument('-o', '--output', default="Merged_Accounting.xlsx", help="merged workbook to write")
+    parser.add_argument('--html', help="HTML viewer to write (default: accounting_viewer.html next to the output)")
+    parser.add_argument('--engine', choices=ENGINES, default='auto', help="Excel reader engine")
+    parser.add_argument('--no-cache', action='store_true', help="parse every workbook, bypassing the ledger cache")
+    parser.add_argument('--clear-cache', action='store_true', help="delete the ledger cache before merging")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="ledger cache directory")
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="evict least recently used cache entries above this size")
+    parser.add_argument('--compress-viewer', action='store_true',
+                        help="gzip the rows embedded in the HTML viewer (needs a browser with DecompressionStream)")
+    parser.add_argument('--dedup', choices=DEDUP_POLICIES,
+                        help="find entries repeated across sources and report, mark or drop them (see ledger_dedup.py)")
+    parser.add_argument('--shard-viewer', choices=sorted(SHARD_COLUMNS),
+                        help="write the HTML viewer as an index page plus per-month or per-source row shards, "
+                             "loaded when needed (for very large merges)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes that parse workbooks in parallel (0: one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=1, help="workbooks handed to a worker at a time")
+    parser.add_argument('--incremental', action='store_true',
+                        help="keep the merge state next to the output and only re-read changed workbooks; "
+                             "appended rows are applied to the state, other edits re-read the whole workbook")
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="merge through sorted runs spilled to disk, for ledgers larger than memory (no HTML viewer)")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="rows read and sorted at a time with --out-of-core")
+    parser.add_argument('--spill-dir', help="directory for the sorted runs of --out-of-core (default: system temp)")
+    parser.add_argument('--store', metavar='DB',
+                        help="also load the parsed ledgers into this ledger store (see ledger_store.py)")
+    parser.add_argument('--profile', metavar='REPORT',
+                        help="time each stage of the merge and write the JSON report to REPORT")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="with --profile, also record Python allocation peaks (tracemalloc, slower)")
+    parser.add_argument('--profile-cpu', metavar='STATS', help="save cProfile stats of the merge to STATS")
+    args = parser.parse_args(argv)
+    if args.out_of_core and not HAS_PYARROW:
+        parser.error("--out-of-core needs pyarrow")
+    if args.out_of_core and args.incremental:
+        parser.error("--out-of-core and --incremental cannot be combined")
+    if args.out_of_core and args.store:
+        parser.error("--out-of-core merges do not hold the rows to --store; use ledger_store.py load")
+    if args.out_of_core and args.dedup:
+        parser.error("--out-of-core and --dedup cannot be combined")
+
+    if args.clear_cache:
+        print(f"Cleared ledger cache: {clear_cache(args.cache_dir)} entries removed")
+    if not args.no_cache and not HAS_PYARROW:
+        print("Ledger cache disabled: pyarrow is not installed")
+    if args.incremental and not HAS_PYARROW:
+        print("Incremental merge disabled: pyarrow is not installed")
+
+    profile = new_profile(args.profile_memory) if args.profile else None
+    with capture(profile, args.profile_cpu):
+        if args.out_of_core:
+            result = merge_out_of_core(args.files, args.output, args.chunk_rows, args.spill_dir, profile)
+        else:
+            result = merge_accounting_files(
+                args.files, args.output, args.engine,
+                cache_dir=None if args.no_cache else args.cache_dir,
+                cache_max_bytes=args.cache_size_mb * 1024 * 1024,
+                compress_viewer=args.compress_viewer,
+                incremental=args.incremental and HAS_PYARROW,
+                workers=args.workers,
+                chunk_size=args.chunk_size,
+                html_path=args.html,
+                profile=profile,
+                store_path=args.store,
+                shard_viewer=args.shard_viewer,
+                dedup=args.dedup
+            )
+
+    if profile is not None:
+        print_profile(profile)
+        write_profile(args.profile, profile, files=args.files, engine=args.engine, workers=args.workers)
+        print(f"Profile saved to: {args.profile}")
+    if args.profile_cpu:
+        print(f"cProfile stats saved to: {args.profile_cpu}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
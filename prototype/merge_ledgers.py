@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+merge-ledgers: run ledger merges from the command line or a scheduler.
+
+A merge job takes ledger workbooks (paths or glob patterns) and writes
+the merged workbook, its overlaps JSON, the HTML viewer and the job's log
+to its own output directory, so jobs never overwrite each other.
+
+One job from the command line:
+
+    merge_ledgers.py "real data/*.xlsx" -d out/all
+
+Many jobs from a manifest (JSON, or YAML with PyYAML installed):
+
+    {
+      "defaults": {"engine": "calamine", "incremental": true},
+      "jobs": [
+        {"name": "hami", "inputs": ["source data/Hami*.xlsx"]},
+        {"name": "jzu", "inputs": ["real data/*.xlsx"], "output_dir": "/srv/reports/jzu"}
+      ]
+    }
+
+    merge_ledgers.py --manifest nightly.json -d out --jobs 2
+
+A job's output_dir defaults to <output dir>/<name>; relative inputs,
+output directories and stores in a manifest are relative to the
+manifest's folder.
+Jobs run in up to --jobs processes. Each job reports its wall time and
+row counts, optionally as a JSON report, and the exit status is 1 if any
+job failed. A job with profile set also saves its stage timings (see
+merge_profile) as profile.json in its output directory, and one with
+out_of_core merges through sorted runs on disk (see external_merge),
+without an HTML viewer. A job with store loads its parsed ledgers into
+that ledger store database (see ledger_store); jobs may share a store.
+A job with shard_viewer, month or source, writes its HTML viewer as an
+index page plus row shards in accounting_viewer_shards (see
+merge_excel.write_sharded_viewer). A job with dedup, report, mark or
+drop, handles entries repeated across its sources that way (see
+ledger_dedup).
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+from external_merge import DEFAULT_CHUNK_ROWS
+from ledger_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, HAS_PYARROW
+from ledger_dedup import DEDUP_POLICIES
+from ledger_reader import ENGINES
+from merge_excel import merge_accounting_files, merge_out_of_core
+from merge_profile import capture, new_profile, write_profile
+from viewer_payload import SHARD_COLUMNS
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+# Files written to every job's output directory
+OUTPUT_FILE = 'Merged_Accounting.xlsx'
+HTML_FILE = 'accounting_viewer.html'
+LOG_FILE = 'merge.log'
+PROFILE_FILE = 'profile.json'
+
+# Job settings a manifest may give, per job or in its defaults
+JOB_OPTIONS = {
+    'engine': 'auto',
+    'cache': True,
+    'compress_viewer': False,
+    'incremental': False,
+    'workers': 1,
+    'chunk_size': 1,
+    'profile': False,
+    'out_of_core': False,
+    'chunk_rows': DEFAULT_CHUNK_ROWS,
+    'store': None,
+    'shard_viewer': None,
+    'dedup': None,
+}
+
+
+def expand_inputs(patterns, base_dir='.'):
+    """
+    Workbook paths of glob patterns, in pattern order and sorted within a
+    pattern, without duplicates. Raises ValueError for a pattern that
+    matches nothing.
+    """
+    paths = []
+    for pattern in patterns:
+        pattern = os.path.join(base_dir, os.path.expanduser(pattern))
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        matches = [path for path in matches if os.path.isfile(path)]
+        if not matches:
+            raise ValueError(f"No workbooks match {pattern}")
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+def load_manifest(path):
+    """Jobs of a JSON or YAML manifest: a list of jobs or {defaults, jobs}."""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            if not HAS_YAML:
+                raise ValueError(f"Reading {path} needs PyYAML")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    defaults = manifest.get('defaults', {})
+
+    jobs = []
+    for i, entry in enumerate(manifest.get('jobs', []), 1):
+        if isinstance(entry, str):
+            entry = {'inputs': [entry]}
+        job = dict(defaults, **entry)
+        job.setdefault('name', f"job{i}")
+        if isinstance(job.get('inputs'), str):
+            job['inputs'] = [job['inputs']]
+        jobs.append(job)
+    return jobs
+
+
+def resolve_job(job, output_root, base_dir='.'):
+    """
+    A job with its settings checked and its paths resolved: inputs are
+    expanded and output_dir is <output_root>/<name> unless given.
+    """
+    unknown = set(job) - set(JOB_OPTIONS) - {'name', 'inputs', 'output_dir'}
+    if unknown:
+        raise ValueError(f"Job {job['name']}: unknown settings {', '.join(sorted(unknown))}")
+    if not job.get('inputs'):
+        raise ValueError(f"Job {job['name']}: no inputs")
+    if job.get('engine', 'auto') not in ENGINES:
+        raise ValueError(f"Job {job['name']}: unknown engine {job['engine']}")
+
+    resolved = dict(JOB_OPTIONS, **job)
+    if resolved['out_of_core'] and resolved['incremental']:
+        raise ValueError(f"Job {job['name']}: out_of_core and incremental cannot be combined")
+    if resolved['out_of_core'] and not HAS_PYARROW:
+        raise ValueError(f"Job {job['name']}: out_of_core needs pyarrow")
+    if resolved['out_of_core'] and resolved['store']:
+        raise ValueError(f"Job {job['name']}: out_of_core and store cannot be combined")
+    if resolved['out_of_core'] and resolved['dedup']:
+        raise ValueError(f"Job {job['name']}: out_of_core and dedup cannot be combined")
+    if resolved['dedup'] not in (None, *DEDUP_POLICIES):
+        raise ValueError(f"Job {job['name']}: unknown dedup policy {resolved['dedup']}")
+    if resolved['shard_viewer'] not in (None, *SHARD_COLUMNS):
+        raise ValueError(f"Job {job['name']}: unknown shard_viewer {resolved['shard_viewer']}")
+    if resolved['store']:
+        resolved['store'] = os.path.join(base_dir, os.path.expanduser(resolved['store']))
+    resolved['inputs'] = expand_inputs(job['inputs'], base_dir)
+    if 'output_dir' in job:
+        resolved['output_dir'] = os.path.join(base_dir, os.path.expanduser(job['output_dir']))
+    else:
+        resolved['output_dir'] = os.path.join(output_root, job['name'])
+    return resolved
+
+
+def run_job(job, cache_dir, cache_max_bytes):
+    """
+    Run one merge job; its progress output goes to the log file in its
+    output directory. Returns the job's result: name, status ('ok' or
+    'failed'), output_dir, files, rows, overlaps, seconds and, for a
+    failed job, the error; profile is the path of a profiled job's stage
+    timings.
+    """
+    result = {'name': job['name'], 'output_dir': job['output_dir'], 'files': len(job['inputs'])}
+    profile = new_profile() if job['profile'] else None
+    start = time.perf_counter()
+    os.makedirs(job['output_dir'], exist_ok=True)
+    with open(os.path.join(job['output_dir'], LOG_FILE), 'w', encoding='utf-8') as log, redirect_stdout(log):
+        try:
+            with capture(profile):
+                output_path = os.path.join(job['output_dir'], OUTPUT_FILE)
+                if job['out_of_core']:
+                    source_counts, overlapping = merge_out_of_core(
+                        job['inputs'], output_path, job['chunk_rows'], profile=profile
+                    )
+                    rows = sum(source_counts)
+                else:
+                    combined, overlapping = merge_accounting_files(
+                        job['inputs'], output_path, job['engine'],
+                        cache_dir=cache_dir if job['cache'] else None,
+                        cache_max_bytes=cache_max_bytes,
+                        compress_viewer=job['compress_viewer'],
+                        incremental=job['incremental'] and HAS_PYARROW,
+                        workers=job['workers'],
+                        chunk_size=job['chunk_size'],
+                        html_path=os.path.join(job['output_dir'], HTML_FILE),
+                        profile=profile,
+                        store_path=job['store'],
+                        shard_viewer=job['shard_viewer'],
+                        dedup=job['dedup']
+                    )
+                    rows = len(combined)
+            result.update(status='ok', rows=rows, overlaps=len(overlapping))
+            if profile is not None:
+                result['profile'] = os.path.join(job['output_dir'], PROFILE_FILE)
+                write_profile(result['profile'], profile, job=job['name'], files=job['inputs'])
+        except Exception as e:
+            traceback.print_exc(file=log)
+            result.update(status='failed', error=f"{type(e).__name__}: {e}")
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_jobs(jobs, cache_dir=DEFAULT_CACHE_DIR, cache_max_bytes=DEFAULT_MAX_BYTES, max_jobs=1):
+    """
+    Run merge jobs in up to max_jobs processes (0 for one per CPU).
+    Yields the result of each job (see run_job), in job order.
+    """
+    max_jobs = max_jobs or os.cpu_count()
+    if max_jobs <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield run_job(job, cache_dir, cache_max_bytes)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(max_jobs, len(jobs))) as executor:
+        futures = [executor.submit(run_job, job, cache_dir, cache_max_bytes) for job in jobs]
+        for future in futures:
+            yield future.result()
+
+
+def print_report(results, elapsed):
+    """Per-job timing table."""
+    width = max([len(result['name']) for result in results] + [3])
+    print(f"\n{'Job':<{width}}  {'Status':<6}  {'Files':>5}  {'Rows':>8}  {'Overlaps':>8}  {'Seconds':>8}")
+    for result in results:
+        print(f"{result['name']:<{width}}  {result['status']:<6}  {result['files']:>5}  "
+              f"{result.get('rows', ''):>8}  {result.get('overlaps', ''):>8}  {result['seconds']:>8.2f}")
+    failed = [result for result in results if result['status'] != 'ok']
+    print(f"{len(results) - len(failed)} of {len(results)} jobs succeeded in {elapsed:.2f}s")
+    for result in failed:
+        print(f"  {result['name']}: {result['error']} (see {os.path.join(result['output_dir'], LOG_FILE)})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='merge-ledgers',
+        description="Merge accounting ledger workbooks, one job from the command line or many from a manifest."
+    )
+    parser.add_argument('inputs', nargs='*', help="workbooks or glob patterns of one merge job")
+    parser.add_argument('-m', '--manifest', help="JSON or YAML manifest of merge jobs")
+    parser.add_argument('-d', '--output-dir', default='merged',
+                        help="output directory of a command line job; parent of manifest job directories")
+    parser.add_argument('-n', '--name', default='merge', help="name of a command line job")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="jobs run at the same time (0: one per CPU)")
+    parser.add_argument('--report', help="write the job results as JSON to this file")
+    parser.add_argument('--engine', choices=ENGINES, help="Excel reader engine")
+    parser.add_argument('--no-cache', action='store_true', help="parse every workbook, bypassing the ledger cache")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="ledger cache directory")
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="evict least recently used cache entries above this size")
+    parser.add_argument('--compress-viewer', action='store_true', help="gzip the rows embedded in the HTML viewer")
+    parser.add_argument('--incremental', action='store_true',
+                        help="keep the merge state next to the output and only re-read changed workbooks; "
+                             "appended rows are applied to the state, other edits re-read the whole workbook")
+    parser.add_argument('--workers', type=int, help="processes that parse a job's workbooks in parallel")
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="merge through sorted runs spilled to disk, for ledgers larger than memory")
+    parser.add_argument('--profile', action='store_true',
+                        help="save each job's stage timings as profile.json in its output directory")
+    parser.add_argument('--store', metavar='DB', help="load every job's parsed ledgers into this ledger store")
+    parser.add_argument('--dedup', choices=DEDUP_POLICIES,
+                        help="report, mark or drop entries repeated across a job's sources")
+    parser.add_argument('--shard-viewer', choices=sorted(SHARD_COLUMNS),
+                        help="write each job's HTML viewer as an index page plus per-month or per-source row shards")
+    args = parser.parse_args(argv)
+
+    if bool(args.inputs) == bool(args.manifest):
+        parser.error("give either input workbooks or --manifest")
+
+    # Command line settings override the manifest's
+    overrides = {'engine': args.engine, 'workers': args.workers, 'shard_viewer': args.shard_viewer,
+                 'dedup': args.dedup, 'store': os.path.abspath(args.store) if args.store else None}
+    overrides.update({name: True for name in ('compress_viewer', 'incremental', 'profile', 'out_of_core') if getattr(args, name)})
+    if args.no_cache:
+        overrides['cache'] = False
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+
+    try:
+        if args.manifest:
+            base_dir = os.path.dirname(args.manifest)
+            jobs = [resolve_job(dict(job, **overrides), args.output_dir, base_dir)
+                    for job in load_manifest(args.manifest)]
+        else:
+            jobs = [resolve_job(dict(overrides, name=args.name, inputs=args.inputs, output_dir=args.output_dir),
+                                args.output_dir)]
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    names = [job['name'] for job in jobs]
+    directories = [os.path.abspath(job['output_dir']) for job in jobs]
+    if len(set(names)) < len(names) or len(set(directories)) < len(directories):
+        parser.error("job names and output directories must be unique")
+    if not HAS_PYARROW and any(job['incremental'] for job in jobs):
+        print("Incremental merge disabled: pyarrow is not installed")
+
+    start = time.perf_counter()
+    results = []
+    for result in run_jobs(jobs, args.cache_dir, args.cache_size_mb * 1024 * 1024, args.jobs):
+        print(f"{result['name']}: {result['status']} in {result['seconds']:.2f}s -> {result['output_dir']}")
+        results.append(result)
+    elapsed = time.perf_counter() - start
+    print_report(results, elapsed)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': round(elapsed, 3), 'jobs': results}, f, ensure_ascii=False, indent=1)
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
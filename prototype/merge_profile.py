@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Stage timing and memory instrumentation for the merge pipeline.
+
+A profile is a dict that merge_accounting_files fills in stage by stage
+(read, typing, sort, index, store, dedup, overlaps, invoices, xlsx_write,
+json_write, concat, html_write, state_save). Per stage it records:
+- wall and CPU time (CPU time of this process; workbooks parsed in worker
+  processes count as wall time only)
+- how much the stage raised the process's peak RSS
+- rows processed, and so rows per second
+- with trace_memory, the peak of Python allocations during the stage
+  (tracemalloc; slows the merge down noticeably)
+
+A stage that runs once per source adds up over the sources. The report
+(profile_report) is plain JSON with the Python, pandas and platform it
+ran on, so reports of different releases can be compared. capture() can
+also record the whole run with cProfile.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+PROFILE_VERSION = 1
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes; None where unknown."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def new_profile(trace_memory=False):
+    """An empty profile; with trace_memory, stages also record tracemalloc peaks."""
+    return {'trace_memory': trace_memory, 'stages': {}, 'total': None}
+
+
+@contextmanager
+def stage(profile, name, rows=None):
+    """
+    Record a pipeline stage in profile; does nothing if profile is None.
+    Yields the stage's record, where the stage can set 'rows' once it
+    knows them. Stages must not be nested.
+    """
+    record = {'rows': rows}
+    if profile is None:
+        yield record
+        return
+
+    tracing = profile['trace_memory'] and tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        traced_start = tracemalloc.get_traced_memory()[0]
+    rss_start = peak_rss()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        totals = profile['stages'].setdefault(name, {
+            'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': None,
+            'peak_rss_delta_bytes': None, 'traced_peak_bytes': None,
+        })
+        totals['calls'] += 1
+        totals['wall_seconds'] += time.perf_counter() - wall_start
+        totals['cpu_seconds'] += time.process_time() - cpu_start
+        if record['rows'] is not None:
+            totals['rows'] = (totals['rows'] or 0) + record['rows']
+        if rss_start is not None:
+            totals['peak_rss_delta_bytes'] = (totals['peak_rss_delta_bytes'] or 0) + peak_rss() - rss_start
+        if tracing:
+            traced_peak = tracemalloc.get_traced_memory()[1] - traced_start
+            totals['traced_peak_bytes'] = max(totals['traced_peak_bytes'] or 0, traced_peak)
+
+
+@contextmanager
+def capture(profile, cprofile_path=None):
+    """
+    Run a whole merge under the profile: records its total wall and CPU
+    time and peak RSS, traces allocations if the profile asks for it, and
+    with cprofile_path saves cProfile stats there (see pstats).
+    """
+    profiler = cProfile.Profile() if cprofile_path else None
+    started_tracing = profile is not None and profile['trace_memory'] and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if profiler:
+        profiler.enable()
+    try:
+        yield profile
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        if profile is not None:
+            profile['total'] = {
+                'wall_seconds': round(time.perf_counter() - wall_start, 6),
+                'cpu_seconds': round(time.process_time() - cpu_start, 6),
+                'peak_rss_bytes': peak_rss(),
+            }
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def profile_report(profile, **details):
+    """
+    JSON-ready report of a profile: the environment, the totals and one
+    entry per stage in the order the stages first ran, with rows per
+    second. details (e.g. the input files) are added as they are.
+    """
+    stages = []
+    for name, totals in profile['stages'].items():
+        rows = totals['rows']
+        throughput = rows / totals['wall_seconds'] if rows is not None and totals['wall_seconds'] > 0 else None
+        stages.append(dict(
+            {'name': name},
+            **{key: round(value, 6) if isinstance(value, float) else value for key, value in totals.items()},
+            rows_per_second=round(throughput, 1) if throughput is not None else None,
+        ))
+    return dict({
+        'version': PROFILE_VERSION,
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'trace_memory': profile['trace_memory'],
+        'total': profile['total'],
+        'stages': stages,
+    }, **details)
+
+
+def write_profile(path, profile, **details):
+    """Save the profile report (see profile_report) as JSON."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile_report(profile, **details), f, ensure_ascii=False, indent=1)
+
+
+def print_profile(profile):
+    """Stage table of a profile."""
+    print(f"\n{'Stage':<12} {'Calls':>5} {'Wall s':>8} {'CPU s':>8} {'Rows':>9} {'Rows/s':>10} {'RSS +MB':>8}")
+    for entry in profile_report(profile)['stages']:
+        rows = entry['rows'] if entry['rows'] is not None else ''
+        throughput = f"{entry['rows_per_second']:.0f}" if entry['rows_per_second'] is not None else ''
+        rss = f"{entry['peak_rss_delta_bytes'] / 2 ** 20:.1f}" if entry['peak_rss_delta_bytes'] is not None else ''
+        print(f"{entry['name']:<12} {entry['calls']:>5} {entry['wall_seconds']:>8.3f} {entry['cpu_seconds']:>8.3f} "
+              f"{rows:>9} {throughput:>10} {rss:>8}")
+    if profile['total']:
+        print(f"{'total':<12} {'':>5} {profile['total']['wall_seconds']:>8.3f} {profile['total']['cpu_seconds']:>8.3f}")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Saved merge state for incremental re-merges.
+
+The state directory next to the merged workbook keeps one partition per
+source, keyed by the resolved path of its workbook (source_id; two
+inputs may have the same file name): the SHA-256 of its workbook, its date-sorted run with the sheet
+row and a 64-bit fingerprint of every row, its Налог code index entries
+and its summary buckets (see ledger_summary). On the next merge:
+- a workbook with the same hash is not read again
+- a workbook that only has rows appended (the old rows are unchanged, in
+  the same sheet rows) gets the new rows inserted into its run by date
+  and their buckets added to the old ones
+- any other change rebuilds that source's partition: only appends are
+  incremental, and a removed or edited row costs a full re-read of its
+  workbook
+Whenever some source changed, all outputs are written again.
+The state also records the outputs it was saved with, their
+modification times and the options that shape them (viewer compression
+and sharding, duplicate policy), so a re-run where nothing changed does
+not rewrite them; a re-run with other outputs or options does.
+
+Needs pyarrow, like the ledger cache.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ledger_cache import read_frame, write_frame
+from ledger_dates import DATE_DTYPE
+
+STATE_VERSION = 6
+STATE_FILE = 'state.json'
+
+# How a source changed since the saved state
+UNCHANGED = 'unchanged'
+APPENDED = 'appended'
+CHANGED = 'changed'
+ADDED = 'added'
+
+
+def state_dir_for(output_path):
+    """State directory of a merged workbook: <output>.state next to it."""
+    return os.path.splitext(output_path)[0] + '.state'
+
+
+def source_id(path):
+    """Key of a source in the state: the resolved path of its workbook."""
+    return os.path.realpath(path)
+
+
+def date_keys(run):
+    """
+    Date sort keys of a run as int64 microseconds, the unit of
+    ledger_dates.DATE_DTYPE, which holds dates up to 9999; NaT is the
+    smallest, so undated rows sort first.
+    """
+    return run[1].to_numpy(dtype=DATE_DTYPE).view('int64')
+
+
+def row_fingerprints(rows):
+    """64-bit hash of the values of each row; the index is not hashed."""
+    return pd.util.hash_pandas_object(rows, index=False).to_numpy()
+
+
+def diff_rows(previous, fingerprints, sheet_rows):
+    """
+    Compare a source's rows with its saved partition.
+    fingerprints and sheet_rows are in sheet order. Returns (kind,
+    inserted, removed): kind is APPENDED when every saved row is still in
+    its sheet row and the new rows come after them, CHANGED otherwise;
+    inserted and removed count the rows by fingerprint.
+    """
+    old_order = np.argsort(previous['run'].index.to_numpy(), kind='stable')
+    old_fingerprints = previous['fingerprints'][old_order]
+    old_rows = previous['run'].index.to_numpy()[old_order]
+
+    kept = len(old_fingerprints)
+    appended = (
+        len(fingerprints) >= kept
+        and np.array_equal(fingerprints[:kept], old_fingerprints)
+        and np.array_equal(sheet_rows[:kept], old_rows)
+    )
+    if appended:
+        return APPENDED, len(fingerprints) - kept, 0
+
+    # Multiset difference of the fingerprints
+    old_values, old_counts = np.unique(old_fingerprints, return_counts=True)
+    new_values, new_counts = np.unique(fingerprints, return_counts=True)
+    counts = pd.DataFrame({'old': pd.Series(old_counts, index=old_values),
+                           'new': pd.Series(new_counts, index=new_values)}).fillna(0)
+    inserted = int((counts['new'] - counts['old']).clip(lower=0).sum())
+    removed = int((counts['old'] - counts['new']).clip(lower=0).sum())
+    return CHANGED, inserted, removed
+
+
+def insertion_order(run, rows):
+    """
+    Positions that merge date-sorted rows into a date-sorted run: the
+    order of pd.concat([run, rows]) that keeps it sorted. Rows with the
+    same date go after the run's rows, as a stable sort of the sheet puts
+    rows that were appended to it.
+    """
+    positions = np.searchsorted(date_keys(run), date_keys(rows), side='right')
+    return np.insert(np.arange(len(run)), positions, len(run) + np.arange(len(rows)))
+
+
+def json_value(value):
+    """Plain Python value of a numpy scalar, for json.dump."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def outputs_unchanged(outputs):
+    """True if every output path still has the modification time recorded for it."""
+    return bool(outputs) and all(
+        os.path.exists(path) and os.path.getmtime(path) == mtime for path, mtime in outputs.items()
+    )
+
+
+def load_state(state_dir):
+    """
+    Saved partitions by source_id, the recorded outputs as
+    {path: mtime} and the output options; ({}, {}, {}) if there is no
+    usable state.
+    """
+    path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}, {}, {}
+    with open(path, encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        return {}, {}, {}
+
+    partitions = {}
+    for key, saved in state['sources'].items():
+        label = saved['source']
+        base = os.path.join(state_dir, saved['sha256'])
+        run = read_frame(f"{base}.run.arrow")
+        fingerprints = run.pop('fingerprint').to_numpy()
+        run = run.set_index('row').rename_axis(None)
+        with open(f"{base}.codes.json", encoding='utf-8') as f:
+            codes = {code: [(label, row) for row in rows] for code, rows in json.load(f)}
+        partitions[key] = {
+            'source': label,
+            'path': saved['path'],
+            'sha256': saved['sha256'],
+            'doc_type': saved['doc_type'],
+            'company': saved['company'],
+            'run': run,
+            'fingerprints': fingerprints,
+            'codes': codes,
+            'buckets': read_frame(f"{base}.buckets.arrow"),
+        }
+    return partitions, state['outputs'], state['options']
+
+
+def save_state(state_dir, partitions, outputs, options):
+    """
+    Save a list of partitions, the output paths they were written to and
+    the output options (a JSON-able dict) they were written with; files
+    of dropped partitions are deleted.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    sources = {}
+    for partition in partitions:
+        base = os.path.join(state_dir, partition['sha256'])
+        if partition['status'] != UNCHANGED or not os.path.exists(f"{base}.run.arrow"):
+            run = partition['run'].assign(row=partition['run'].index, fingerprint=partition['fingerprints'])
+            write_frame(f"{base}.run.arrow", run.reset_index(drop=True))
+            write_frame(f"{base}.buckets.arrow", partition['buckets'])
+            with open(f"{base}.codes.json", 'w', encoding='utf-8') as f:
+                json.dump([[code, [row for _, row in entries]] for code, entries in partition['codes'].items()],
+                          f, ensure_ascii=False, default=json_value)
+        sources[source_id(partition['path'])] = {
+            'source': partition['source'],
+            'path': partition['path'],
+            'sha256': partition['sha256'],
+            'doc_type': partition['doc_type'],
+            'company': json_value(partition['company']),
+        }
+
+    with open(os.path.join(state_dir, STATE_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': STATE_VERSION,
+            'sources': sources,
+            'outputs': {path: os.path.getmtime(path) for path in outputs},
+            'options': options,
+        }, f, ensure_ascii=False, indent=1)
+
+    keep = {saved['sha256'] for saved in sources.values()}
+    for name in os.listdir(state_dir):
+        if name != STATE_FILE and name.split('.')[0] not in keep:
+            os.remove(os.path.join(state_dir, name))
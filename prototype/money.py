@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Fixed-point money: Долгува and Побарува as int64 cents (denars x 100).
+
+Amounts are parsed once, when a ledger is typed (see ledger_model), into
+a nullable Int64 column of cents, so sums, balances and invoice totals
+are exact integer arithmetic instead of float sums that drift by cents on
+large ledgers. Amounts are converted back to denars only where they are
+written out.
+
+Exports hold amounts as numbers, or as text in the Macedonian format:
+- 1.234.567,89, 1 234 567,89 -> dot or space thousands, decimal comma
+- 1234,5 -> 1234.50; 1.234 -> 1234 (a single dot before 3 digits
+  groups thousands)
+- 1,234,567.89, 1234.56 -> the other way around, when both separators
+  are there or the dot is followed by 1 or 2 digits
+- -1.234,00, 1.234,00-, (1.234,00) -> negative
+- a trailing ден., MKD or МКД is ignored
+Text is parsed with vectorized string operations; digits beyond cents
+are rounded half away from zero.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+CENTS = 100
+MONEY_DTYPE = pd.Int64Dtype()
+
+# Largest amount in cents that stays exact as a float, e.g. in the viewer
+MAX_CENTS = 2 ** 53
+
+# pandas.api.types.infer_dtype kinds of columns without text
+NUMERIC_KINDS = {'empty', 'integer', 'floating', 'mixed-integer-float', 'decimal', 'boolean'}
+
+# Thousands spacing (spaces, no-break and thin spaces, apostrophes) and a
+# trailing currency
+NOISE = re.compile("[\\s\u00a0\u2009\u202f']+|(?:ден\\.?|[Mm][Kk][Dd]|[Мм][Кк][Дд])$")
+
+# Sign, then the number with its last separator split off: the lazy head
+# stops at the last . or , that is followed by digits only
+AMOUNT_PATTERN = re.compile(
+    r'^(?P<open>\()?(?P<sign>[-−+])?(?P<head>\d[\d.,]*?)(?:(?P<sep>[.,])(?P<tail>\d+))?(?P<trailing>-)?(?P<close>\))?$'
+)
+
+
+def parse_money_text(text):
+    """
+    Cents of amounts written as text (a Series of str), as Int64 with NA
+    for text that is not an amount.
+    """
+    parts = text.str.replace(NOISE, '', regex=True).str.extract(AMOUNT_PATTERN)
+    head, sep, tail = parts['head'], parts['sep'], parts['tail'].fillna('')
+    negative = (parts['open'].notna() | parts['sign'].isin(['-', '−']) | parts['trailing'].notna()).to_numpy()
+
+    dots = head.str.count(r'\.')
+    commas = head.str.count(',')
+    same = dots.where(sep == '.', commas)
+    other = commas.where(sep == '.', dots)
+    # The last separator is the decimal one unless it groups thousands
+    decimal = sep.notna() & ((other > 0) | ((same == 0) & ((tail.str.len() != 3) | (sep == ','))))
+    valid = (head.notna() & (decimal | sep.isna() | (tail.str.len() == 3))
+             & (parts['open'].isna() == parts['close'].isna()))
+
+    whole = head.where(decimal, head + sep.fillna('') + tail).str.replace(r'[.,]', '', regex=True)
+    fraction = tail.where(decimal, '') + '000'
+    valid &= whole.str.len() <= 15
+    valid = valid.to_numpy(dtype=bool)
+    whole = whole.where(valid, '0')
+    fraction = fraction.where(valid, '000')
+
+    cents = (whole.astype(np.int64).to_numpy() * CENTS + fraction.str[:2].astype(np.int64).to_numpy()
+             + (fraction.str[2] >= '5').to_numpy(dtype=np.int64))
+    cents = np.where(negative, -cents, cents)
+    return pd.Series(cents, index=text.index).astype(MONEY_DTYPE).where(valid)
+
+
+def parse_money(values):
+    """
+    Cents of a Series of amounts (numbers, numeric text or empty cells),
+    as Int64 with NA for empty cells and values that are not amounts.
+    """
+    values = pd.Series(values)
+    if values.dtype == MONEY_DTYPE:
+        return values
+    # Cells are only checked one by one when some may be text
+    if pd.api.types.infer_dtype(values, skipna=True) in NUMERIC_KINDS:
+        is_text = pd.Series(False, index=values.index)
+    elif isinstance(values.dtype, pd.StringDtype):
+        # Also the columns of a sheet with a header and no rows
+        is_text = values.notna()
+    else:
+        is_text = values.map(type).eq(str)
+
+    numbers = pd.to_numeric(values.mask(is_text), errors='coerce')
+    numbers = numbers.where(numbers.abs() < MAX_CENTS / CENTS).to_numpy(dtype=np.float64, na_value=np.nan)
+    cents = pd.Series(np.rint(numbers * CENTS), index=values.index).astype(MONEY_DTYPE)
+    if is_text.any():
+        # Amounts repeat, so each distinct text is parsed once
+        codes, uniques = pd.factorize(values[is_text])
+        cents[is_text] = parse_money_text(pd.Series(uniques, dtype=str)).to_numpy()[codes]
+    return cents
+
+
+def to_money(values):
+    """Int64 cents of a column, or the values unchanged if some cell is not an amount."""
+    cents = parse_money(values)
+    if cents.notna().sum() != values.notna().sum():
+        return values
+    return cents
+
+
+def to_cents(values):
+    """Cents of an amount column, typed or not, with 0 for empty cells and text."""
+    return parse_money(values).fillna(0).to_numpy(dtype=np.int64)
+
+
+def to_denars(values):
+    """
+    Amounts in denars as float64 with NaN for empty cells, for writing
+    out; columns that are not in cents are returned unchanged.
+    """
+    if values.dtype != MONEY_DTYPE:
+        return values
+    return pd.Series(values.to_numpy(dtype=np.float64, na_value=np.nan) / CENTS, index=values.index)
+
+
+def format_money(cents):
+    """Cents as denars with thousands separators, e.g. -1,234,567.89; exact."""
+    cents = int(cents)
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{abs(cents) // CENTS:,}.{abs(cents) % CENTS:02d}"
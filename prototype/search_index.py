@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Word index for the HTML viewer's free-text search.
+
+Налог, Опис, Затворање and Забелешка are lowercased (Cyrillic and Latin,
+as JavaScript's toLowerCase does) and split into words of letters and
+digits: "F.145/2025" -> f, 145, 2025. The index is the sorted list of
+distinct words and, per word, the rows that contain it.
+
+Postings are stored delta-encoded as varints (7 bits per byte, high bit
+set on all but the last byte), one byte stream for all words plus the
+byte offset where each word's postings start. The viewer finds the words
+that start with each query word by binary search and intersects their
+rows, so search never scans the row text.
+"""
+
+import base64
+
+import numpy as np
+import pandas as pd
+
+SEARCH_COLUMNS = ['Налог', 'Опис', 'Затворање', 'Забелешка']
+
+# Letters and digits of any script; the viewer splits queries with
+# /[\p{L}\p{N}]+/gu
+WORD_PATTERN = r'[^\W_]+'
+
+
+def cell_text(value):
+    """Text of a cell as the viewer shows it: 2200.0 -> '2200', NaN -> ''."""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if np.isnan(value):
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+
+def encode_varints(values):
+    """
+    Varint bytes for non-negative integers. Returns (bytes, starts) with
+    the byte offset of each value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = 1 + sum((values >= 1 << (7 * k)).astype(np.int64) for k in range(1, 5))
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    out = np.zeros(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    for k in range(5):
+        has = sizes > k
+        byte = (values[has] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = (sizes[has] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has] + k] = (byte | more).astype(np.uint8)
+    return out, starts
+
+
+def search_index(data):
+    """
+    Search index for the viewer rows: a dict with terms (sorted words),
+    offsets (base64 Int32Array, the byte offset of each term's postings
+    plus the total length) and postings (base64 varint delta-encoded row
+    numbers).
+    """
+    data = data.reset_index(drop=True)
+    text = None
+    for name in SEARCH_COLUMNS:
+        if name in data.columns:
+            column = data[name]
+            # Text columns (see ledger_model) only need their gaps filled
+            column = column.fillna('') if isinstance(column.dtype, pd.StringDtype) else column.map(cell_text)
+            text = column if text is None else text + ' ' + column
+
+    words = text.str.lower().str.findall(WORD_PATTERN).explode().dropna()
+    pairs = pd.DataFrame({'term': words.to_numpy(dtype=object), 'row': words.index.to_numpy(dtype=np.int64)})
+    pairs = pairs.drop_duplicates().sort_values(['term', 'row'], kind='stable')
+
+    terms = pairs['term'].to_numpy()
+    rows = pairs['row'].to_numpy()
+    first = np.r_[True, terms[1:] != terms[:-1]] if len(terms) else np.zeros(0, dtype=bool)
+
+    # Each term's first row is stored as is, the others as the gap to the previous row
+    deltas = np.where(first, rows, rows - np.r_[0, rows[:-1]])
+    postings, starts = encode_varints(deltas)
+    offsets = np.r_[starts[first], len(postings)].astype('<i4')
+
+    return {
+        'terms': terms[first].tolist(),
+        'offsets': base64.b64encode(offsets.tobytes()).decode('ascii'),
+        'postings': base64.b64encode(postings.tobytes()).decode('ascii'),
+    }
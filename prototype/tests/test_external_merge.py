@@ -0,0 +1,98 @@
+import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import external_merge
+from external_merge import merge_runs, read_ledger_chunks, read_run, spill_run
+from ledger_cache import HAS_PYARROW
+from ledger_layout import parse_ledger
+from ledger_model import type_ledger
+from ledger_reader import read_ledger_sheet
+from merge_excel import merge_sorted_runs, output_rows, sort_ledger_rows
+
+pytestmark = pytest.mark.skipif(not HAS_PYARROW, reason="spilled runs are Arrow files")
+
+SOURCES = ['first', 'second']
+
+
+def day(n):
+    return datetime.datetime(2025, 1, n)
+
+
+# Equal dates within and across the sources, undated rows and a blank row
+ENTRIES = [
+    [('10-0001', day(5), 100, None), ('10-0002', day(3), None, 250), (None, None, None, None),
+     ('10-0003', day(5), 40, None), ('10-0004', None, 1, None), ('10-0005', day(1), None, 7),
+     ('10-0006', day(3), 2, None), ('10-0007', day(9), None, 3)],
+    [('20-0001', day(3), 5, None), ('20-0002', day(5), None, 6), ('20-0003', None, 8, None),
+     ('20-0004', day(3), None, 9), ('20-0005', day(2), 10, None)],
+]
+
+
+def write_card(path, entries):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['2200', 'Добавувачи'])
+    ws.append(['10045', 'ЗУБЕКС ДООЕЛ'])
+    ws.append(['Налог', 'Дата', 'Вал.', 'м.ддв', 'Опис', 'Затворање', 'Забелешка', 'Долгува', 'Побарува'])
+    for code, date, debit, credit in entries:
+        if code is None:
+            ws.append([])
+        else:
+            ws.append([code, date, 0, 1, f'опис {code}', None, None, debit, credit])
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    return [write_card(tmp_path / f'{source}.xlsx', entries) for source, entries in zip(SOURCES, ENTRIES)]
+
+
+def in_memory(workbooks):
+    runs = [sort_ledger_rows(type_ledger(parse_ledger(read_ledger_sheet(path, 'openpyxl'))[1]))
+            for path in workbooks]
+    return list(merge_sorted_runs(runs, SOURCES)), runs
+
+
+def spill(workbooks, tmp_path, chunk_rows):
+    runs = []
+    for source_index, path in enumerate(workbooks):
+        _, chunks = read_ledger_chunks(path, chunk_rows)
+        for i, chunk in enumerate(chunks):
+            run_path = str(tmp_path / f'run-{source_index}-{i}.arrow')
+            spill_run(run_path, sort_ledger_rows(type_ledger(chunk)))
+            runs.append((source_index, run_path))
+    return runs
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 3, 100])
+def test_spilled_merge_matches_the_in_memory_merge(workbooks, tmp_path, monkeypatch, chunk_rows):
+    # Runs are read back one row per batch
+    monkeypatch.setattr(external_merge, 'RUN_BATCH_ROWS', 1)
+    expected, runs = in_memory(workbooks)
+    merged = list(merge_runs(spill(workbooks, tmp_path, chunk_rows),
+                             lambda frame, i: output_rows(frame, SOURCES[i])))
+    assert [(source_index, row) for source_index, _, row in merged] == expected
+
+    sheet_rows = [(source_index, sheet_row) for source_index, sheet_row, _ in merged]
+    assert sorted(sheet_rows) == sorted((i, row) for i, run in enumerate(runs) for row in run.index)
+
+
+def test_order_of_equal_dates(workbooks, tmp_path):
+    merged = list(merge_runs(spill(workbooks, tmp_path, 2), lambda frame, i: output_rows(frame, SOURCES[i])))
+    codes = [row[0] for _, _, row in merged]
+    # Undated first; equal dates by source, then by sheet row
+    assert codes == ['10-0004', '20-0003', '10-0005', '20-0005', '10-0002', '10-0006', '20-0001', '20-0004',
+                     '10-0001', '10-0003', '20-0002', '10-0007']
+
+
+def test_runs_round_trip(workbooks, tmp_path):
+    _, chunks = read_ledger_chunks(workbooks[0], 3)
+    chunk = sort_ledger_rows(type_ledger(next(chunks)))
+    path = str(tmp_path / 'run.arrow')
+    spill_run(path, chunk)
+    frames = list(read_run(path))
+    assert [frame.index.tolist() for frame in frames] == [chunk.index.tolist()]
+    assert [row for frame in frames for row in output_rows(frame, 'first')] == list(output_rows(chunk, 'first'))
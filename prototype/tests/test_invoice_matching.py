@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from invoice_matching import PAID, extract_invoice_numbers, match_invoices
+
+
+def extract(values):
+    return extract_invoice_numbers(pd.Series(values, dtype=object)).tolist()
+
+
+def test_number_year_formats():
+    assert extract(['145/2025', '211/25', 'F.223/25', 'Фактура 121/2025 T 187']) == [
+        '145/2025', '211/2025', '223/2025', '121/2025 T 187'
+    ]
+
+
+def test_month_prefix_is_not_an_invoice():
+    assert pd.isna(extract(['M.01/25'])[0])
+
+
+def test_rk_suffixes_match_across_scripts():
+    assert extract(['509231-RK', '509231-РК', '509231 - rk', '509231-рк']) == ['509231 RK'] * 4
+
+
+def test_pk_suffixes_match_across_scripts():
+    assert extract(['526851-PK', '526851-ПК', 'F.526851-PK PR.79', '526851-пк']) == ['526851 PK'] * 4
+
+
+def test_rk_and_pk_stay_apart():
+    rk, pk = extract(['536167-РК', '536167-ПК'])
+    assert rk == '536167 RK'
+    assert pk == '536167 PK'
+
+
+def test_cyrillic_invoice_pairs_with_latin_payment():
+    rows = pd.DataFrame({
+        4: ['Фактура', 'Плаќање'],
+        5: ['509231-РК', '509231-RK'],
+        6: [None, None],
+        7: [0.0, 500.0],
+        8: [500.0, 0.0],
+    })
+    _, groups = match_invoices(rows, np.array(['a', 'b']))
+    assert groups['invoice_number'].tolist() == ['509231 RK']
+    assert groups['status'].tolist() == [PAID]
+
+
+def test_ledger_without_invoice_numbers():
+    # Balance sheets have account names and codes, no invoice numbers
+    rows = pd.DataFrame({
+        4: ['Добавувачи', 'Почетно салдо'],
+        5: ['2200', None],
+        6: [-1000, None],
+        7: [500.0, 10.0],
+        8: [1500.0, 0.0],
+    })
+    invoice, groups = match_invoices(rows, np.array(['ЗЛ фзо', 'ЗЛ јзу']))
+    assert invoice.isna().all()
+    assert groups.empty
+    assert 'sources' in groups.columns
+    assert match_invoices(rows.iloc[:1])[1].empty
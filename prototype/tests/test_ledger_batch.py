@@ -0,0 +1,48 @@
+import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from ledger_batch import parse_workbooks
+from ledger_cache import HAS_PYARROW
+from ledger_model import type_ledger
+
+
+def write_card(path, entries):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['2200', 'Добавувачи'])
+    ws.append(['10045', 'ЗУБЕКС ДООЕЛ'])
+    ws.append(['Налог', 'Дата', 'Вал.', 'м.ддв', 'Опис', 'Затворање', 'Забелешка', 'Долгува', 'Побарува'])
+    for entry in entries:
+        ws.append(entry)
+    wb.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    return [
+        write_card(tmp_path / 'first.xlsx', [
+            ['10-0001', datetime.datetime(2025, 1, 14), 0, 1, 'Фактура 145/2025', '145/2025', None, None, 1234.5],
+            ['20-0002', datetime.datetime(2025, 1, 14, 10, 15, 30, 250000), 0, 1, 'Извод 12', None, 7, 1234.5, None],
+            [None, None, None, None, 'Вкупно', None, None, 1234.5, 1234.5],
+        ]),
+        write_card(tmp_path / 'second.xlsx', [
+            ['10-0003', '05.03.2025', 0, 3, 'F.536167-PK PR.79', '536167-PK', 'T 12', '1.000,00', None],
+            [2200, 45721, 0, 3, True, None, None, None, 1000],
+        ]),
+    ]
+
+
+@pytest.mark.skipif(not HAS_PYARROW, reason="the worker pool hands rows over as Arrow")
+def test_workers_parse_the_same_ledgers(workbooks):
+    one = list(parse_workbooks(workbooks, 'openpyxl', workers=1))
+    two = list(parse_workbooks(workbooks, 'openpyxl', workers=2))
+    assert len(two) == 2
+    for (layout, data, attrs), (pool_layout, pool_data, pool_attrs) in zip(one, two):
+        assert pool_layout == layout
+        assert pool_attrs['engine'] == attrs['engine']
+        assert pool_data.index.tolist() == data.index.tolist()
+        pd.testing.assert_frame_equal(type_ledger(pool_data), type_ledger(data))
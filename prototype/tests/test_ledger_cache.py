@@ -0,0 +1,72 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger_cache import HAS_PYARROW, frame_to_table, read_cached, read_frame, table_to_frame, write_frame
+
+pytestmark = pytest.mark.skipif(not HAS_PYARROW, reason="needs pyarrow")
+
+CELLS = [
+    None, 'Фактура 145/2025', 7, 1234.5, True, False,
+    datetime.datetime(2025, 1, 14), datetime.datetime(2025, 1, 14, 10, 15, 30, 250000),
+    datetime.datetime(2025, 2, 3, 8, 0, 5), float('nan'), 0, -0.01,
+]
+
+
+def frame():
+    return pd.DataFrame({
+        0: pd.Series(CELLS, dtype=object),
+        1: np.arange(len(CELLS), dtype=np.float64),
+        'Извор': pd.Series(['a'] * len(CELLS), dtype=object),
+    })
+
+
+def assert_same_cells(decoded, original):
+    assert list(decoded.columns) == list(original.columns)
+    for column in original.columns:
+        for got, expected in zip(decoded[column], original[column]):
+            if pd.isna(expected):
+                assert pd.isna(got)
+            else:
+                assert got == expected
+                assert type(got) is type(expected) or isinstance(expected, datetime.datetime)
+
+
+def test_table_round_trip():
+    original = frame()
+    decoded = table_to_frame(frame_to_table(original))
+    assert_same_cells(decoded, original)
+    assert decoded[1].dtype == np.float64
+
+
+def test_dates_of_mixed_precision():
+    dates = pd.Series([datetime.datetime(2025, 1, 14), datetime.datetime(2025, 1, 14, 10, 15, 30, 250000)],
+                      dtype=object)
+    decoded = table_to_frame(frame_to_table(pd.DataFrame({1: dates})))
+    assert decoded[1].tolist() == dates.tolist()
+
+
+def test_file_round_trip(tmp_path):
+    original = frame()
+    path = tmp_path / 'sheet.arrow'
+    write_frame(str(path), original, batch_rows=5)
+    assert_same_cells(read_frame(str(path)), original)
+
+
+def test_cache_hit_skips_the_parse(tmp_path):
+    workbook = tmp_path / 'ledger.xlsx'
+    workbook.write_bytes(b'workbook content')
+    parses = []
+
+    def parse(path):
+        parses.append(path)
+        return frame()
+
+    cache_dir = str(tmp_path / 'cache')
+    first = read_cached(str(workbook), parse, cache_dir)
+    second = read_cached(str(workbook), parse, cache_dir)
+    assert len(parses) == 1
+    assert second.attrs['engine'] == 'cache'
+    assert_same_cells(second, first)
@@ -0,0 +1,68 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from ledger_dates import DATE_DTYPE, count_unparsed, parse_dates
+from ledger_model import type_ledger
+from merge_state import date_keys
+
+
+def dates(*cells):
+    return parse_dates(pd.Series(cells, dtype=object))
+
+
+def test_mixed_cells():
+    parsed = dates(
+        datetime.datetime(2025, 3, 5), 45721, 45721.5, '05.03.2025', '5.3.2025', '05.03.25',
+        '05.03.2025 14:30', '05/03/2025', '2025-03-05', ' 05.03.2025 г. ', '05.03.2025.'
+    )
+    assert parsed.dtype == DATE_DTYPE
+    assert parsed.dt.date.tolist() == [datetime.date(2025, 3, 5)] * 11
+    assert parsed[2] == pd.Timestamp('2025-03-05 12:00')
+    assert parsed[6] == pd.Timestamp('2025-03-05 14:30')
+
+
+def test_day_comes_first():
+    assert dates('01.02.2025', 'x')[0] == pd.Timestamp('2025-02-01')
+
+
+def test_blanks_and_text_are_not_dates():
+    cells = pd.Series([None, '', '   ', 'Почетно салдо', '31.02.2025', 12, True], dtype=object)
+    parsed = parse_dates(cells)
+    assert parsed.isna().all()
+    # Empty and blank cells are not counted; the text, 31 February, the
+    # serial before 1900-03-01 and the bool are
+    assert count_unparsed(cells, parsed) == 4
+
+
+def test_years_past_2262():
+    parsed = dates('05.03.2999', 400000, datetime.datetime(9999, 12, 31), '2025-01-01')
+    assert parsed.tolist() == [pd.Timestamp('2999-03-05'), pd.Timestamp('2995-02-27'),
+                               pd.Timestamp('9999-12-31'), pd.Timestamp('2025-01-01')]
+    keys = date_keys(pd.DataFrame({1: parsed}))
+    assert np.argsort(keys, kind='stable').tolist() == [3, 1, 0, 2]
+
+
+def test_undated_rows_sort_first():
+    keys = date_keys(pd.DataFrame({1: dates('01.01.2025', None)}))
+    assert keys[1] < keys[0]
+
+
+def test_all_empty_column():
+    assert dates(None, None).isna().all()
+
+
+def test_type_ledger_with_datetime64_dates():
+    # The Arrow hand-off of the worker pool gives Дата as datetime64
+    data = pd.DataFrame({
+        0: ['10-0001', '10-0002'],
+        1: pd.to_datetime(['2025-03-05', None]),
+        7: [100.0, None],
+        8: [None, 2.5],
+    })
+    typed = type_ledger(data)
+    assert typed[1].dtype == DATE_DTYPE
+    assert typed[1][0] == pd.Timestamp('2025-03-05')
+    assert typed.attrs['unparsed_dates'] == 0
+    assert typed[7].tolist() == [10000, pd.NA]
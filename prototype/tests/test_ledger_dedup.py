@@ -0,0 +1,68 @@
+import datetime
+import json
+
+import pandas as pd
+
+from ledger_dedup import duplicate_masks, find_duplicates, mark_duplicates, write_duplicate_index
+from ledger_model import type_ledger
+
+
+def run(entries, first_row=4):
+    """Typed run of (Налог, day of March, Опис, Долгува, Побарува)."""
+    return type_ledger(pd.DataFrame(
+        [[code, datetime.datetime(2025, 3, day), 0, 1, description, None, None, debit, credit, None]
+         for code, day, description, debit, credit in entries],
+        index=pd.RangeIndex(first_row, first_row + len(entries)), dtype=object
+    ))
+
+
+PAYMENT = ('20-0004', 5, 'Плаќање фактура 12', 100, None)
+INVOICE = ('10-0005', 3, 'Фактура 12', None, 100)
+
+
+def test_repeated_entry_in_another_source():
+    runs = [run([INVOICE, PAYMENT]), run([('20-0004', 5, 'плаќање,  ФАКТУРА 12.', '100,00', None)])]
+    entries = find_duplicates(runs)
+    assert entries[['source', 'row', 'duplicate', 'first_source', 'first_row']].values.tolist() == [
+        [0, 6, False, 0, 6], [1, 5, True, 0, 6]
+    ]
+    assert [mask.tolist() for mask in duplicate_masks(entries, runs)] == [[False, False], [True]]
+
+
+def test_fields_that_differ_are_not_duplicates():
+    for other in [('20-0005', 5, 'Плаќање фактура 12', 100, None),
+                  ('20-0004', 6, 'Плаќање фактура 12', 100, None),
+                  ('20-0004', 5, 'Плаќање фактура 13', 100, None),
+                  ('20-0004', 5, 'Плаќање фактура 12', None, 100),
+                  ('20-0004', 5, 'Плаќање фактура 12', 101, None)]:
+        assert find_duplicates([run([PAYMENT]), run([other])]).empty
+
+
+def test_repeats_within_a_source_are_kept():
+    # Two equal payments in one source, one of them also in the other
+    runs = [run([PAYMENT, PAYMENT]), run([PAYMENT])]
+    assert find_duplicates([run([PAYMENT, PAYMENT])]).empty
+    masks = duplicate_masks(find_duplicates(runs), runs)
+    assert [mask.tolist() for mask in masks] == [[False, False], [True]]
+
+
+def test_first_source_keeps_each_occurrence():
+    # The n-th copy repeats the n-th copy of the first source that has one
+    runs = [run([PAYMENT]), run([PAYMENT, INVOICE, PAYMENT]), run([PAYMENT, PAYMENT])]
+    masks = duplicate_masks(find_duplicates(runs), runs)
+    assert [mask.tolist() for mask in masks] == [[False], [True, False, False], [True, True]]
+
+
+def test_mark_and_index(tmp_path):
+    runs = [run([INVOICE, PAYMENT]), run([PAYMENT])]
+    sources = ['ФЗО', 'Копија']
+    entries = find_duplicates(runs)
+    assert mark_duplicates(runs[0], 0, entries, sources) is runs[0]
+    marked = mark_duplicates(runs[1], 1, entries, sources)
+    assert marked[6].tolist() == ['Дупликат: ФЗО, ред 6']
+
+    path = tmp_path / 'duplicates.json'
+    write_duplicate_index(path, entries, sources)
+    groups = list(json.loads(path.read_text(encoding='utf-8')).values())
+    assert groups == [[{'source': 'ФЗО', 'row': 6, 'duplicate': False},
+                       {'source': 'Копија', 'row': 5, 'duplicate': True}]]
@@ -0,0 +1,83 @@
+import datetime
+
+import pytest
+from openpyxl import Workbook
+
+from ledger_layout import ACCOUNT_CARD, BALANCE_SHEET, COMPANY_CARD, parse_ledger
+from ledger_reader import read_ledger_sheet
+
+DAY = datetime.datetime(2025, 1, 14)
+
+ACCOUNT_CARD_ROWS = [
+    ['2200', 'Обврски спрема добавувачи'],
+    ['10045', 'ЗУБЕКС ДООЕЛ'],
+    [],
+    ['Налог', 'Дата', 'Вал.', 'м.ддв', 'Опис', 'Заворање', 'Забелешка', 'Долгува', 'Побарува', 'Един'],
+    ['10-0001', DAY, 0, 1, 'Фактура 145/2025', '145/2025', None, None, 500, 'ден'],
+    [],
+    ['20-0002', DAY, 0, 1, 'Извод 12', '145/2025', 'T 3', 500, None, None],
+]
+
+COMPANY_CARD_ROWS = [
+    ['10045', 'ЗУБЕКС ДООЕЛ'],
+    [],
+    ['Конто', 'Име на контото', 'Налог', 'Дата', 'Вал', 'м.ддв', 'Опис', 'Затворање', 'Забелешка',
+     'Долгува', 'Побарува'],
+    ['2200', 'Добавувачи', '10-0001', DAY, 0, 1, 'Фактура 145/2025', '145/2025', None, None, 500],
+    ['2200', 'Добавувачи', '20-0002', DAY, 0, 1, 'Извод 12', '145/2025', 'T 3', 500, None],
+]
+
+BALANCE_SHEET_ROWS = [
+    ['ЗАКЛУЧНА ЛИСТА'],
+    ['Име на конто', 'Конто', 'Долгува', 'Побарува', 'Салдо', 'Дел.един'],
+    ['Добавувачи', '2200', 500, 1500, -1000, '01'],
+    ['Купувачи', '1200', 2000, 0, 2000, None],
+]
+
+
+def workbook(tmp_path, rows):
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    path = tmp_path / 'ledger.xlsx'
+    wb.save(path)
+    return read_ledger_sheet(str(path), 'openpyxl')
+
+
+@pytest.mark.parametrize('rows, doc_type, header_row, account, company, first_row', [
+    (ACCOUNT_CARD_ROWS, ACCOUNT_CARD, 3, ('2200', 'Обврски спрема добавувачи'), ('10045', 'ЗУБЕКС ДООЕЛ'),
+     ['10-0001', DAY, 0, 1, 'Фактура 145/2025', '145/2025', None, None, 500, 'ден']),
+    (COMPANY_CARD_ROWS, COMPANY_CARD, 2, None, ('10045', 'ЗУБЕКС ДООЕЛ'),
+     ['10-0001', DAY, 0, 1, 'Фактура 145/2025', '145/2025', None, None, 500, None]),
+    (BALANCE_SHEET_ROWS, BALANCE_SHEET, 1, None, None,
+     ['2200', None, None, None, 'Добавувачи', '2200', -1000, 500, 1500, '01']),
+])
+def test_layouts(tmp_path, rows, doc_type, header_row, account, company, first_row):
+    layout, data = parse_ledger(workbook(tmp_path, rows))
+    assert layout['doc_type'] == doc_type
+    assert layout['header_row'] == header_row
+    assert layout['account'] == account
+    assert layout['company'] == company
+    assert list(data.columns) == list(range(10))
+    assert len(data) == 2
+    assert [None if value != value else value for value in data.iloc[0]] == first_row
+    # The index is the 0-based sheet row, blank rows are dropped
+    assert data.index[0] == header_row + 1
+
+
+def test_blank_rows_are_dropped(tmp_path):
+    _, data = parse_ledger(workbook(tmp_path, ACCOUNT_CARD_ROWS))
+    assert data.index.tolist() == [4, 6]
+
+
+def test_unknown_layout(tmp_path):
+    df = workbook(tmp_path, [['Извештај'], ['Број', 'Датум', 'Износ'], [1, DAY, 500]])
+    with pytest.raises(ValueError, match='ledger header'):
+        parse_ledger(df)
+
+
+def test_header_past_the_scanned_rows(tmp_path):
+    df = workbook(tmp_path, [['наслов']] * 3 + ACCOUNT_CARD_ROWS)
+    with pytest.raises(ValueError):
+        parse_ledger(df, scan_rows=3)
+    assert parse_ledger(df)[0]['header_row'] == 6
@@ -0,0 +1,56 @@
+import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import ledger_reader
+from ledger_reader import HAS_CALAMINE, read_ledger_sheet, select_engine
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """A small account card with text, numbers, dates and empty cells."""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['2200', 'Обврски спрема добавувачи'])
+    ws.append([])
+    ws.append(['Налог', 'Дата', 'Вал.', 'м.ддв', 'Опис', 'Затворање', 'Забелешка', 'Долгува', 'Побарува'])
+    ws.append(['10-0001', datetime.datetime(2025, 1, 14), 0, 1, 'Фактура 145/2025', '145/2025', None, None, 1234.5])
+    ws.append(['20-0002', datetime.datetime(2025, 2, 3, 10, 15, 30), 0, 2, 'Извод 12', None, 'T 3', 1234.5, None])
+    ws.append(['', '05.03.2025', None, None, 'Вкупно', None, None, 1234.5, 1234.5])
+    path = tmp_path / 'ledger.xlsx'
+    wb.save(path)
+    return str(path)
+
+
+@pytest.mark.skipif(not HAS_CALAMINE, reason="needs python-calamine")
+def test_engines_read_the_same_frame(workbook):
+    calamine = read_ledger_sheet(workbook, 'calamine')
+    openpyxl = read_ledger_sheet(workbook, 'openpyxl')
+    assert calamine.attrs['engine'] == 'calamine'
+    assert openpyxl.attrs['engine'] == 'openpyxl'
+    pd.testing.assert_frame_equal(calamine, openpyxl)
+
+
+def test_parse_time_is_recorded(workbook):
+    df = read_ledger_sheet(workbook, 'openpyxl')
+    assert df.attrs['parse_seconds'] >= 0
+    assert df.shape == (6, 9)
+
+
+def test_auto_engine_by_size(workbook, monkeypatch):
+    assert select_engine(workbook) == 'openpyxl'
+    monkeypatch.setattr(ledger_reader, 'CALAMINE_MIN_BYTES', 0)
+    assert select_engine(workbook) == ('calamine' if HAS_CALAMINE else 'openpyxl')
+    monkeypatch.setattr(ledger_reader, 'HAS_CALAMINE', False)
+    assert select_engine(workbook) == 'openpyxl'
+    assert select_engine(workbook, 'openpyxl') == 'openpyxl'
+
+
+def test_unknown_or_missing_engine(workbook, monkeypatch):
+    with pytest.raises(ValueError):
+        select_engine(workbook, 'xlrd')
+    monkeypatch.setattr(ledger_reader, 'HAS_CALAMINE', False)
+    with pytest.raises(ImportError):
+        select_engine(workbook, 'calamine')
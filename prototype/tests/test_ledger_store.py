@@ -0,0 +1,45 @@
+import datetime
+
+from openpyxl import Workbook
+
+from ledger_store import load_ledgers, open_store, query_overlaps, query_records, query_totals
+
+
+def write_card(path, entries):
+    """Account card workbook of (Налог, day of January, Долгува, Побарува) rows."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['2200', 'Добавувачи'])
+    ws.append(['10045', 'ЗУБЕКС ДООЕЛ'])
+    ws.append(['Налог', 'Дата', 'Вал.', 'м.ддв', 'Опис', 'Затворање', 'Забелешка', 'Долгува', 'Побарува'])
+    for code, day, debit, credit in entries:
+        ws.append([code, datetime.datetime(2025, 1, day), 0, 1, 'опис', None, None, debit, credit])
+    wb.save(path)
+    return str(path)
+
+
+def test_workbooks_with_the_same_file_name(tmp_path):
+    first = write_card(tmp_path / 'a' / 'ledger.xlsx', [('10-0001', 5, 100, None), ('10-0002', 3, None, 250)])
+    second = write_card(tmp_path / 'b' / 'ledger.xlsx', [('10-0001', 4, None, 7)])
+    conn = open_store(str(tmp_path / 'ledger.db'))
+    try:
+        assert load_ledgers(conn, [first, second]) == {'ledger': 3}
+        records = query_records(conn)
+        assert records['nalog'].tolist() == ['10-0002', '10-0001', '10-0001']
+        assert records['sheet_row'].tolist() == [5, 4, 4]
+        assert query_totals(conn)[['count', 'dolguja', 'pobaruva']].values.tolist() == [[3, 10000, 25700]]
+        assert query_totals(conn, 'all')[['all', 'count', 'saldo']].values.tolist() == [['all', 3, 15700]]
+        assert query_overlaps(conn) == {'10-0001': [('ledger', 4), ('ledger', 4)]}
+
+        # Reloading either workbook unchanged keeps both
+        assert load_ledgers(conn, [second, first]) == {'ledger': 0}
+        assert len(query_records(conn)) == 3
+
+        # A changed workbook replaces only its own records
+        write_card(tmp_path / 'b' / 'ledger.xlsx', [('10-0003', 6, 1, None), ('10-0004', 7, 2, None)])
+        assert load_ledgers(conn, [first, second]) == {'ledger': 2}
+        assert query_records(conn)['nalog'].tolist() == ['10-0002', '10-0001', '10-0003', '10-0004']
+        assert conn.execute('SELECT COUNT(*) FROM files').fetchone()[0] == 2
+    finally:
+        conn.close()
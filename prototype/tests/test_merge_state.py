@@ -0,0 +1,110 @@
+import datetime
+
+import pandas as pd
+from openpyxl import Workbook
+
+from merge_excel import build_partition, merge_accounting_files
+from merge_state import APPENDED, CHANGED, UNCHANGED, diff_rows, load_state, source_id, state_dir_for
+
+LAYOUT = {'doc_type': 'account_card', 'company': []}
+ATTRS = {'engine': 'test', 'parse_seconds': 0.0}
+
+
+def ledger(entries):
+    """Raw ledger data rows of (Налог, day of January, Долгува, Побарува)."""
+    return pd.DataFrame(
+        [[code, datetime.datetime(2025, 1, day), None, None, 'опис', None, None, debit, credit, None]
+         for code, day, debit, credit in entries],
+        index=pd.RangeIndex(4, 4 + len(entries)), dtype=object
+    )
+
+
+def partition(data, previous=None):
+    return build_partition('ledger.xlsx', 'ledger', (LAYOUT, data, ATTRS), sha256='sha', previous=previous)
+
+
+def diff(old_entries, new_entries):
+    previous = partition(ledger(old_entries))
+    current = partition(ledger(new_entries))
+    # Fingerprints and sheet rows in sheet order, as build_partition passes them
+    order = current['run'].index.argsort(kind='stable')
+    return diff_rows(previous, current['fingerprints'][order], current['run'].index.to_numpy()[order])
+
+
+OLD = [('10-0001', 5, 100, 0), ('10-0002', 3, 0, 250), ('10-0003', 9, 40, 0)]
+
+
+def test_appended_rows():
+    assert diff(OLD, OLD + [('10-0004', 1, 10, 0), ('10-0001', 2, 5, 0)]) == (APPENDED, 2, 0)
+
+
+def test_unchanged_rows_are_appended_nothing():
+    assert diff(OLD, OLD) == (APPENDED, 0, 0)
+
+
+def test_modified_row():
+    assert diff(OLD, [OLD[0], ('10-0002', 3, 0, 260), OLD[2]]) == (CHANGED, 1, 1)
+
+
+def test_deleted_row():
+    assert diff(OLD, [OLD[0], OLD[2]]) == (CHANGED, 0, 1)
+
+
+def test_row_inserted_between_old_rows():
+    assert diff(OLD, [OLD[0], ('10-0005', 4, 1, 0), OLD[1], OLD[2]]) == (CHANGED, 1, 0)
+
+
+def test_append_matches_full_build():
+    # Appended rows dated before the old ones, with an old and a new code
+    new = OLD + [('10-0001', 1, 7, 0), ('10-0009', 2, 8, 0)]
+    appended = partition(ledger(new), previous=partition(ledger(OLD)))
+    full = partition(ledger(new))
+    assert appended['status'] == APPENDED
+    pd.testing.assert_frame_equal(appended['run'], full['run'])
+    assert (appended['fingerprints'] == full['fingerprints']).all()
+    assert list(appended['codes'].items()) == list(full['codes'].items())
+
+
+def test_removed_row_rebuilds_the_partition():
+    new = [OLD[0], OLD[2]]
+    rebuilt = partition(ledger(new), previous=partition(ledger(OLD)))
+    full = partition(ledger(new))
+    assert rebuilt['status'] == CHANGED
+    pd.testing.assert_frame_equal(rebuilt['run'], full['run'])
+    assert list(rebuilt['codes'].items()) == list(full['codes'].items())
+    pd.testing.assert_frame_equal(rebuilt['buckets'], full['buckets'])
+
+
+def write_card(path, entries):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['2200', 'Добавувачи'])
+    ws.append(['10045', 'ЗУБЕКС ДООЕЛ'])
+    ws.append(['Налог', 'Дата', 'Вал.', 'м.ддв', 'Опис', 'Затворање', 'Забелешка', 'Долгува', 'Побарува'])
+    for code, day, debit, credit in entries:
+        ws.append([code, datetime.datetime(2025, 1, day), 0, 1, 'опис', None, None, debit, credit])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    wb.save(path)
+    return str(path)
+
+
+def test_inputs_with_the_same_file_name(tmp_path, capsys):
+    inputs = [write_card(tmp_path / 'a' / 'ledger.xlsx', OLD),
+              write_card(tmp_path / 'b' / 'ledger.xlsx', [('10-0001', 7, 0, 100)])]
+    output = str(tmp_path / 'out' / 'merged.xlsx')
+    (tmp_path / 'out').mkdir()
+    for _ in range(2):
+        combined, _ = merge_accounting_files(inputs, output, incremental=True)
+    assert 'is up to date' in capsys.readouterr().out
+    assert len(combined) == 4
+
+    saved, _, _ = load_state(state_dir_for(output))
+    assert list(saved) == [source_id(path) for path in inputs]
+    assert [len(partition['run']) for partition in saved.values()] == [3, 1]
+
+    # Removing a row of one of them only rebuilds that one
+    write_card(tmp_path / 'b' / 'ledger.xlsx', [])
+    write_card(tmp_path / 'a' / 'ledger.xlsx', OLD[:2])
+    combined, _ = merge_accounting_files(inputs, output, incremental=True)
+    assert 'changed since last merge: 0 rows inserted, 1 removed' in capsys.readouterr().out
+    assert len(combined) == 2
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from money import format_money, parse_money, parse_money_text, to_money
+
+
+def cents(*texts):
+    parsed = parse_money_text(pd.Series(texts, dtype=str))
+    return [None if pd.isna(value) else int(value) for value in parsed]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1.234.567,89', 123456789),
+    ('1 234 567,89', 123456789),
+    ('1 234,50', 123450),
+    ("1'234,50", 123450),
+    ('1,234,567.89', 123456789),
+    ('1234.56', 123456),
+    ('1234,5', 123450),
+    ('1.234', 123400),
+    ('1,234', 123),
+    ('1.23', 123),
+    ('0,01', 1),
+    ('1.234,00 ден.', 123400),
+    ('500 MKD', 50000),
+    ('500 МКД', 50000),
+])
+def test_separators(text, expected):
+    assert cents(text) == [expected]
+
+
+@pytest.mark.parametrize('text', ['-1.234,00', '1.234,00-', '(1.234,00)', '−1.234,00'])
+def test_negative_amounts(text):
+    assert cents(text) == [-123400]
+
+
+def test_extra_digits_round_half_away_from_zero():
+    assert cents('0,005', '0,004', '-0,005') == [1, 0, -1]
+
+
+@pytest.mark.parametrize('text', ['', 'abc', '12-34', '(1.234,00', '1.234,00)', '1234567890123456'])
+def test_text_that_is_not_an_amount(text):
+    assert cents(text) == [None]
+
+
+def test_mixed_cells():
+    parsed = parse_money(pd.Series([1234.5, '1.234,50', None, 7], dtype=object))
+    assert parsed.tolist() == [123450, 123450, pd.NA, 700]
+
+
+def test_floats_are_exact_cents():
+    parsed = parse_money(pd.Series([0.1, 0.2, 0.3]))
+    assert parsed.sum() == 60
+
+
+def test_column_with_text_is_kept():
+    values = pd.Series([100, 'види забелешка'], dtype=object)
+    assert to_money(values) is values
+
+
+def test_format_money():
+    assert format_money(-123456789) == '-1,234,567.89'
+    assert format_money(np.int64(5)) == '0.05'
+
+
+def test_text_columns():
+    # A sheet with a header and no rows reads as empty str columns
+    assert parse_money(pd.Series([], dtype='str')).tolist() == []
+    assert parse_money(pd.Series(['1.234,50', None, 'x'], dtype='str')).tolist() == [123450, pd.NA, pd.NA]
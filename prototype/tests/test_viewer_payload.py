@@ -0,0 +1,167 @@
+import base64
+import gzip
+import json
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from search_index import WORD_PATTERN, encode_varints
+from viewer_payload import columnar_payload, payload_parts, script_literal, shard_rows, sort_ranks
+
+CODE_DTYPES = {'uint8': '<u1', 'uint16': '<u2', 'int32': '<i4'}
+
+SOURCES = ['Hami stam', 'Зубекс']
+
+
+def viewer_rows():
+    """Viewer rows with text, repeated values, empty cells and text amounts."""
+    return pd.DataFrame({
+        'Налог': ['10-0001', '20-0002', '10-0003', None, '10-0001'],
+        'Дата': ['2025-02-14', '2025-01-03', None, '2025-01-03', '2025-03-01'],
+        'Вал': [0, 0, 0, 0, 0],
+        'м_ддв': [2, 1, None, 1, 3],
+        'Опис': ['Фактура 145/2025', 'Извод 12', 'F.145/2025 плаќање', 'Почетно салдо', 'ФАКТУРА бр. 7'],
+        'Затворање': ['145/2025', None, '145/2025', None, '509231-RK'],
+        'Забелешка': [None, 'T 3', None, None, 'Ажурирано'],
+        'Долгува': [None, 500, 123456, 'види', 0.05],
+        'Побарува': [1234.5, None, None, 0, None],
+        'Извор': ['Hami stam', 'Зубекс', 'Зубекс', 'Hami stam', 'Зубекс'],
+    })
+
+
+def decode_array(text, dtype):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype)
+
+
+def decode_column(entry):
+    """A payload column as the viewer decodes it."""
+    if entry['kind'] == 'number':
+        return [None if np.isnan(value) else value for value in decode_array(entry['data'], '<f8')]
+    if entry['kind'] == 'dictionary':
+        return [entry['values'][code] for code in decode_array(entry['codes'], CODE_DTYPES[entry['type']])]
+    return entry['values']
+
+
+def decode_varints(data):
+    values = []
+    value = shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+def search(index, query):
+    """Rows that have, for each query word, a word starting with it."""
+    postings = decode_array(index['postings'], np.uint8)
+    offsets = decode_array(index['offsets'], '<i4')
+    found = None
+    for word in re.findall(WORD_PATTERN, query.lower()):
+        rows = set()
+        for i, term in enumerate(index['terms']):
+            if term.startswith(word):
+                rows.update(np.cumsum(decode_varints(postings[offsets[i]:offsets[i + 1]])).tolist())
+        found = rows if found is None else found & rows
+    return sorted(found)
+
+
+def cell(value):
+    return None if pd.isna(value) else value
+
+
+def test_columns_decode_to_the_rows():
+    data = viewer_rows()
+    payload = columnar_payload(data)
+    assert payload['length'] == len(data)
+    columns = {name: decode_column(entry) for name, entry in payload['columns'].items()}
+    for name in ['Налог', 'Дата', 'Вал', 'м_ддв', 'Опис', 'Затворање', 'Забелешка', 'Извор']:
+        assert columns[name] == [cell(value) for value in data[name]], name
+    assert payload['columns']['Извор']['kind'] == 'dictionary'
+    # Amounts are cents; text that is not an amount is empty
+    assert columns['Долгува'] == [None, 50000, 12345600, None, 5]
+    assert columns['Побарува'] == [123450, None, None, 0, None]
+
+
+def test_ranks_sort_the_rows():
+    data = viewer_rows()
+    ranks = {name: decode_array(rank, '<i4') for name, rank in columnar_payload(data)['ranks'].items()}
+    by_rank = {name: np.argsort(rank).tolist() for name, rank in ranks.items()}
+    # Stable, empty values first; amounts that are not numbers count as 0
+    assert by_rank['Дата'] == [2, 1, 3, 0, 4]
+    assert by_rank['Долгува'] == [0, 3, 4, 1, 2]
+    assert by_rank['Побарува'] == [1, 2, 3, 4, 0]
+    assert sorted(ranks['Дата'].tolist()) == list(range(len(data)))
+
+
+@pytest.mark.parametrize('query, rows', [
+    ('фактура', [0, 4]),
+    ('ФАКТ', [0, 4]),
+    ('145', [0, 2]),
+    ('145/2025 плаќање', [2]),
+    ('10-0001', [0, 4]),
+    ('ажур', [4]),
+    ('rk', [4]),
+    ('t 3', [1]),
+    ('нема', []),
+])
+def test_search_index(query, rows):
+    assert search(columnar_payload(viewer_rows())['search'], query) == rows
+
+
+def test_varints():
+    values = [0, 1, 127, 128, 300, 2 ** 21, 2 ** 31 - 1]
+    data, starts = encode_varints(values)
+    assert decode_varints(data) == values
+    assert starts.tolist() == [0, 1, 2, 3, 5, 7, 11]
+
+
+def test_empty_ledger():
+    data = viewer_rows().iloc[:0]
+    payload = columnar_payload(data)
+    assert payload['length'] == 0
+    assert all(decode_column(entry) == [] for entry in payload['columns'].values())
+    assert payload['search']['terms'] == []
+    assert decode_array(payload['search']['offsets'], '<i4').tolist() == [0]
+    parts = list(payload_parts(data))
+    assert len(parts) == 1
+    assert json.loads(parts[0])['length'] == 0
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_parts_join_to_the_whole(compress):
+    data = viewer_rows()
+    whole = columnar_payload(data)
+    parts = []
+    for literal in payload_parts(data, compress, part_rows=2):
+        value = json.loads(literal)
+        parts.append(json.loads(gzip.decompress(base64.b64decode(value))) if compress else value)
+    assert [part['length'] for part in parts] == [2, 2, 1]
+    for name, entry in whole['columns'].items():
+        assert sum((decode_column(part['columns'][name]) for part in parts), []) == decode_column(entry)
+    for name, rank in whole['ranks'].items():
+        joined = np.concatenate([decode_array(part['ranks'][name], '<i4') for part in parts])
+        assert joined.tolist() == decode_array(rank, '<i4').tolist()
+    # Each part's index has its own row numbers
+    assert search(parts[2]['search'], 'фактура') == [0]
+
+
+def test_script_literal_cannot_end_the_script():
+    assert '</script>' not in script_literal({'Опис': '</script><b>'})
+
+
+def test_shards():
+    data = viewer_rows()
+    months = shard_rows(data, SOURCES, 'month')
+    # By first date; rows without a month last
+    assert [(key, rows.tolist()) for key, rows in months] == [(1, [1, 3]), (2, [0]), (3, [4]), (None, [2])]
+    sources = shard_rows(data, SOURCES, 'source')
+    assert [(key, rows.tolist()) for key, rows in sources] == [(0, [0, 3]), (1, [1, 2, 4])]
+    rows = np.concatenate([rows for _, rows in sources])
+    ranks = {name: rank[rows] for name, rank in sort_ranks(data).items()}
+    shard = columnar_payload(data.iloc[rows].reset_index(drop=True), ranks, rows)
+    assert decode_array(shard['rows'], '<i4').tolist() == [0, 3, 1, 2, 4]
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Columnar data payload for the HTML viewer.
+
+Instead of one JSON object per row (which repeats every column name on
+every row), the viewer gets one entry per column:
+- number: Долгува and Побарува in cents (see money) as a little-endian
+  Float64Array in base64, with NaN for empty cells and text; whole cents
+  are exact in a float64, so the viewer's sums are exact too
+- dictionary: the distinct values plus one code per row (Uint8Array,
+  Uint16Array or Int32Array in base64), for Извор, Вал, м_ддв and any
+  column where values repeat
+- plain: a JSON array of the values
+
+For Дата, Долгува and Побарува the payload also has each row's rank in
+the ascending order of all rows (Int32Array in base64, stable, empty
+values first), so the viewer sorts by them without comparing rows, by
+putting every row in its rank's slot. The free-text search index (see
+search_index) is part of the payload too.
+
+The payload is made in parts of up to PART_ROWS rows, each with its own
+columns, ranks and search index, so it is encoded and written out one
+part at a time (see payload_parts) and the viewer joins the parts when
+it decodes them. Each part can also be gzip compressed and base64
+encoded; the viewer then unpacks it with DecompressionStream before
+decoding.
+
+A sharded viewer splits the rows by month (м.ддв) or by source (see
+shard_rows). Its parts also have the row number of each row in all
+rows, so the viewer keeps the merged order of whichever shards it has
+loaded.
+"""
+
+import base64
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+
+from money import parse_money, to_cents
+from search_index import search_index
+
+NUMBER_COLUMNS = ['Долгува', 'Побарува']
+DICTIONARY_COLUMNS = ['Извор', 'Вал', 'м_ддв']
+
+# Columns with a precomputed sort order
+SORTED_COLUMNS = ['Дата', 'Долгува', 'Побарува']
+
+# Rows per payload part
+PART_ROWS = 20000
+
+# Viewer column each kind of shard splits the rows by
+SHARD_COLUMNS = {'month': 'м_ддв', 'source': 'Извор'}
+
+CODE_TYPES = [(2 ** 8, 'uint8', '<u1'), (2 ** 16, 'uint16', '<u2'), (2 ** 31, 'int32', '<i4')]
+
+
+def encode_array(values, dtype):
+    """Base64 of a numpy array in the given little-endian dtype."""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+def json_values(series):
+    """Values of a Series as JSON types, with NaN/NaT as None."""
+    return json.loads(series.to_json(orient='values', force_ascii=False))
+
+
+def encode_column(series, name):
+    """Payload entry for one column."""
+    if name in NUMBER_COLUMNS:
+        cents = parse_money(series).to_numpy(dtype=np.float64, na_value=np.nan)
+        return {'kind': 'number', 'data': encode_array(cents, '<f8')}
+
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    if name in DICTIONARY_COLUMNS or len(uniques) * 2 <= len(series):
+        code_type, dtype = next((code_type, dtype) for limit, code_type, dtype in CODE_TYPES if len(uniques) <= limit)
+        return {
+            'kind': 'dictionary',
+            'values': json_values(pd.Series(uniques, dtype=object)),
+            'type': code_type,
+            'codes': encode_array(codes, dtype),
+        }
+
+    return {'kind': 'plain', 'values': json_values(series)}
+
+
+def sort_order(series, name):
+    """
+    Row numbers in ascending order of a column; stable, empty values first.
+    Amounts that are not numbers sort as 0, as in the viewer.
+    """
+    if name in NUMBER_COLUMNS:
+        series = pd.Series(to_cents(series), index=series.index)
+    ordered = series.reset_index(drop=True).sort_values(kind='stable', na_position='first')
+    return ordered.index.to_numpy()
+
+
+def sort_ranks(data):
+    """Rank of each row in the sort order (see sort_order) of each sorted column."""
+    ranks = {}
+    for name in SORTED_COLUMNS:
+        if name in data.columns:
+            order = sort_order(data[name], name)
+            ranks[name] = np.empty(len(order), dtype=np.int64)
+            ranks[name][order] = np.arange(len(order))
+    return ranks
+
+
+def columnar_payload(data, ranks=None, rows=None):
+    """
+    Viewer payload for a frame: row count, one entry per column, the
+    rank of each row for each sorted column and the search index. ranks
+    are the ranks to use instead, e.g. a part's slice of the ranks in
+    all rows; rows are the row numbers of the frame's rows in all rows,
+    for a shard.
+    """
+    if ranks is None:
+        ranks = sort_ranks(data)
+    payload = {
+        'length': len(data),
+        'columns': {name: encode_column(data[name], name) for name in data.columns},
+        'ranks': {name: encode_array(rank, '<i4') for name, rank in ranks.items()},
+        'search': search_index(data),
+    }
+    if rows is not None:
+        payload['rows'] = encode_array(rows, '<i4')
+    return payload
+
+
+def script_literal(value, compress=False):
+    """
+    JavaScript literal of a value to embed in a <script> block: JSON, or
+    with compress a base64 string of the gzipped JSON.
+    """
+    text = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    if compress:
+        return json.dumps(base64.b64encode(gzip.compress(text.encode('utf-8'))).decode('ascii'))
+    # A "</script>" inside a value would end the script block
+    return text.replace('</', '<\\/')
+
+
+def payload_parts(data, compress=False, part_rows=PART_ROWS, ranks=None, rows=None):
+    """
+    Script literals (see script_literal) of the payload parts of a frame,
+    made one at a time: part i covers rows i * part_rows up to the next
+    part. Ranks are over all rows, computed here unless given for a
+    shard, with its rows (see columnar_payload); each part has its slice
+    of them. A frame without rows has one empty part.
+    """
+    if ranks is None:
+        ranks = sort_ranks(data)
+    for start in range(0, max(len(data), 1), part_rows):
+        part = data.iloc[start:start + part_rows]
+        part_ranks = {name: rank[start:start + part_rows] for name, rank in ranks.items()}
+        part_numbers = None if rows is None else rows[start:start + part_rows]
+        yield script_literal(columnar_payload(part, part_ranks, part_numbers), compress)
+
+
+def shard_rows(data, sources, by):
+    """
+    Shards of viewer rows by month (м.ддв) or source, as (key, row
+    numbers) pairs. The key of a month shard is its month as in the
+    summary buckets (see ledger_summary), that of a source shard the
+    index of the source in sources. Month shards come in order of their
+    first Дата, those without a date or month last; source shards in
+    source order.
+    """
+    column = data[SHARD_COLUMNS[by]]
+    if by == 'source':
+        codes = column.map({source: i for i, source in enumerate(sources)}).to_numpy(dtype=np.int64)
+        keys = list(range(len(sources)))
+    else:
+        codes, uniques = pd.factorize(column, use_na_sentinel=False)
+        keys = json_values(pd.Series(uniques, dtype=object))
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(keys) + 1))
+    shards = [(key, order[bounds[i]:bounds[i + 1]]) for i, key in enumerate(keys) if bounds[i + 1] > bounds[i]]
+    if by == 'month':
+        first_days = data['Дата'].groupby(codes).min()
+        first_day = {key: first_days.get(i) for i, key in enumerate(keys)}
+        shards.sort(key=lambda shard: (shard[0] is None or pd.isna(first_day[shard[0]]), str(first_day[shard[0]])))
+    return shards